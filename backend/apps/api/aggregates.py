@@ -0,0 +1,59 @@
+# старшие таймфреймы, которые строит timescaledb (continuous aggregates)
+# из базового таймфрейма вместо отдельной загрузки с биржи.
+# представления создает миграция 0004_ohlcv_continuous_aggregates
+import logging
+from typing import Optional
+from django.conf import settings
+from django.db import connection
+from . import layout
+
+logger = logging.getLogger(__name__)
+
+BASE_TIMEFRAME = "1m"
+# таймфрейм -> (длительность свечи в мс, интервал свечи, окно обновления
+# политики, период запуска политики). по этой таблице строит агрегаты миграция
+AGGREGATES = {
+    "5m": (300_000, "5 minutes", "1 day", "1 minute"),
+    "15m": (900_000, "15 minutes", "2 days", "5 minutes"),
+    "1h": (3_600_000, "1 hour", "3 days", "15 minutes"),
+    "4h": (14_400_000, "4 hours", "7 days", "1 hour"),
+    "1d": (86_400_000, "1 day", "30 days", "1 hour"),
+}
+# таймфрейм -> длительность свечи в мс
+AGGREGATE_TIMEFRAMES = {timeframe: spec[0] for timeframe, spec in AGGREGATES.items()}
+
+
+def enabled() -> bool:
+    # представления построены по ohlcv, в компактной раскладке их нет
+    if layout.compact():
+        return False
+    return getattr(settings, "CANDLE_AGGREGATES", {}).get("ENABLED", False)
+
+
+def view_name(timeframe: str) -> str:
+    return f"ohlcv_{timeframe}"
+
+
+def source_table(timeframe: str) -> Optional[str]:
+    """представление, из которого читается таймфрейм, или None — читать ohlcv"""
+    if enabled() and timeframe in AGGREGATE_TIMEFRAMES:
+        return view_name(timeframe)
+    return None
+
+
+def refresh(start_ms: int, end_ms: int) -> None:
+    """
+    материализует агрегаты за [start_ms, end_ms] после загрузки истории
+    базового таймфрейма: политики обновляют только недавнее окно.
+    CALL нельзя выполнять внутри транзакции
+    """
+    with connection.cursor() as cursor:
+        for timeframe, width in AGGREGATE_TIMEFRAMES.items():
+            start = start_ms - start_ms % width
+            end = end_ms - end_ms % width + width
+            cursor.execute(
+                "CALL refresh_continuous_aggregate("
+                "%s, to_timestamp(%s / 1000.0), to_timestamp(%s / 1000.0));",
+                [view_name(timeframe), start, end],
+            )
+    logger.info(f"Агрегаты {BASE_TIMEFRAME} обновлены за {start_ms} — {end_ms} мс")
@@ -0,0 +1,216 @@
+# локальный архив закрытых свечей для исследований и бэктестов без БД.
+# на каждую пару (symbol, timeframe) — каталог с колонками фиксированной
+# ширины (candle_time.i8, open.f8, ...) и index.json: число строк и границы.
+# файлы дописываются (последняя строка может перезаписаться при сверке с БД),
+# читаются через np.memmap без копирования
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from django.conf import settings
+from apps.trading_tools.resample import resample_arrays, timeframe_ms
+from .readers import BUCKET_ORIGIN, CANDLE_FIELDS, CandleColumns, OHLCVReader
+
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+VERSION = 1
+
+
+def _empty() -> CandleColumns:
+    return CandleColumns(
+        **{name: np.empty(0, dtype=kind) for name, kind in CANDLE_FIELDS}
+    )
+
+
+class CandleArchive:
+    """
+    колоночный архив свечей в файлах. index.json — единственная точка
+    фиксации: запись сначала дописывает колонки, потом атомарно заменяет
+    индекс, поэтому читатель видит только полностью записанные строки,
+    а хвост после сбоя отбрасывается при следующей записи. исключение —
+    последняя строка: сверка с БД перезаписывает ее на месте
+    """
+
+    def __init__(self, root=None) -> None:
+        if root is None:
+            root = getattr(settings, "CANDLE_ARCHIVE", {}).get("PATH", "candle_archive")
+        self.root = Path(root)
+
+    def path(self, symbol: str, timeframe: str) -> Path:
+        return self.root / symbol.replace("/", "-") / timeframe
+
+    def index(self, symbol: str, timeframe: str) -> Dict:
+        try:
+            with open(self.path(symbol, timeframe) / INDEX_FILE) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"version": VERSION, "count": 0, "first": None, "last": None}
+
+    def timeframes(self, symbol: str) -> List[str]:
+        directory = self.root / symbol.replace("/", "-")
+        if not directory.is_dir():
+            return []
+        return sorted(p.name for p in directory.iterdir() if (p / INDEX_FILE).exists())
+
+    def open(self, symbol: str, timeframe: str) -> CandleColumns:
+        """все свечи пары: представления memmap только для чтения"""
+        count = self.index(symbol, timeframe)["count"]
+        if not count:
+            return _empty()
+        directory = self.path(symbol, timeframe)
+        return CandleColumns(
+            **{
+                name: np.memmap(
+                    directory / f"{name}.{kind}", dtype=kind, mode="r", shape=(count,)
+                )
+                for name, kind in CANDLE_FIELDS
+            }
+        )
+
+    def read(
+        self,
+        symbol: str,
+        timeframe: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> CandleColumns:
+        """
+        свечи в [start, end] (мс) без копирования. таймфрейм, которого нет
+        в архиве, собирается из самого крупного архивного, на который делится
+        """
+        stored = self.timeframes(symbol)
+        if timeframe in stored or not stored:
+            columns = self.open(symbol, timeframe)
+        else:
+            width = timeframe_ms(timeframe)
+            bases = [
+                (timeframe_ms(tf), tf) for tf in stored if width % timeframe_ms(tf) == 0
+            ]
+            if not bases:
+                raise ValueError(f"таймфрейм {timeframe} не выводится из архива {stored}")
+            # крайние интервалы диапазона берутся целиком
+            if start is not None:
+                start -= (start - BUCKET_ORIGIN) % width
+            if end is not None:
+                end += width - 1 - (end - BUCKET_ORIGIN) % width
+            base = self.read(symbol, max(bases)[1], start, end)
+            return CandleColumns(
+                *resample_arrays(
+                    base.candle_time,
+                    base.open,
+                    base.high,
+                    base.low,
+                    base.close,
+                    base.volume,
+                    width,
+                    BUCKET_ORIGIN,
+                )
+            )
+        lo = int(np.searchsorted(columns.candle_time, start)) if start is not None else 0
+        hi = (
+            int(np.searchsorted(columns.candle_time, end, side="right"))
+            if end is not None
+            else len(columns)
+        )
+        return columns[lo:hi]
+
+    @contextmanager
+    def _locked(self, directory: Path):
+        """
+        межпроцессный замок пары: одновременные append читали бы один индекс
+        и обрезали бы колонки друг друга
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / LOCK_FILE, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, symbol: str, timeframe: str, columns: CandleColumns) -> int:
+        """
+        дописывает свечи новее последней архивной; свеча с временем последней
+        архивной заменяет ее (сверка с БД). возвращает число новых строк
+        """
+        directory = self.path(symbol, timeframe)
+        with self._locked(directory):
+            return self._append(symbol, timeframe, directory, columns)
+
+    def _append(
+        self, symbol: str, timeframe: str, directory: Path, columns: CandleColumns
+    ) -> int:
+        index = self.index(symbol, timeframe)
+        count = index["count"]
+        start = count
+        if index["last"] is not None:
+            fresh = np.searchsorted(columns.candle_time, index["last"], side="left")
+            columns = columns[int(fresh) :]
+            if len(columns) and int(columns.candle_time[0]) == index["last"]:
+                start = count - 1
+        if not len(columns):
+            return 0
+
+        for name, kind in CANDLE_FIELDS:
+            path = directory / f"{name}.{kind}"
+            with open(path, "r+b" if path.exists() else "wb") as file:
+                itemsize = np.dtype(kind).itemsize
+                # хвост незафиксированной записи (сбой до замены индекса).
+                # короче count файл не становится: читатели держат memmap
+                # на count строк, и обращение за концом файла уронило бы их
+                file.truncate(count * itemsize)
+                file.seek(start * itemsize)
+                values = np.ascontiguousarray(getattr(columns, name), dtype=kind)
+                file.write(values.tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+
+        if index["first"] is None:
+            index["first"] = int(columns.candle_time[0])
+        index.update(
+            version=VERSION,
+            count=start + len(columns),
+            last=int(columns.candle_time[-1]),
+        )
+        temporary = directory / f"{INDEX_FILE}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(index, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, directory / INDEX_FILE)
+        return start + len(columns) - count
+
+    def sync(
+        self,
+        symbol: str,
+        timeframe: str,
+        reader: Optional[OHLCVReader] = None,
+        batch_size: int = 500_000,
+    ) -> int:
+        """
+        дописывает из БД закрытые свечи новее архивных. формирующаяся
+        свеча (не закончилась к моменту синхронизации) не попадает в архив.
+        последняя архивная свеча читается заново и перезаписывается: при
+        прошлой синхронизации в БД могла лежать ее неокончательная версия
+        """
+        reader = reader or OHLCVReader()
+        closed_before = int(time.time() * 1000) - timeframe_ms(timeframe)
+        last = self.index(symbol, timeframe)["last"]
+        after = last - 1 if last is not None else None
+        total = 0
+        while True:
+            columns = reader.read(
+                symbol,
+                timeframe,
+                limit=batch_size,
+                after=after,
+                before=closed_before + 1,
+            )
+            total += self.append(symbol, timeframe, columns)
+            if len(columns) < batch_size:
+                return total
+            after = int(columns.candle_time[-1])
@@ -0,0 +1,196 @@
+# выгрузка и загрузка истории свечей в Arrow IPC (stream) и Parquet.
+# выгрузка идет пачками keyset-чтений OHLCVReader: память сервера ограничена
+# одной пачкой, ответ отдается клиенту по мере чтения
+from datetime import datetime
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, List, Optional
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from . import aggregates
+from .readers import CANDLE_FIELDS, CandleColumns, OHLCVReader
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow из requirements.txt не установлен
+    pa = pq = None
+
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+PARQUET_MAGIC = b"PAR1"
+BATCH_SIZE = 250_000
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImproperlyConfigured("для выгрузки Arrow/Parquet нужен пакет pyarrow")
+
+
+def importable_timeframes() -> List[str]:
+    """
+    таймфреймы, которые хранятся в таблице свечей. с агрегатами старшие
+    читаются из представлений, поэтому загружается только базовый
+    """
+    timeframes = list(settings.CANDLE_TIMEFRAMES)
+    if aggregates.enabled():
+        timeframes = [
+            tf for tf in timeframes if tf not in aggregates.AGGREGATE_TIMEFRAMES
+        ]
+        timeframes.append(aggregates.BASE_TIMEFRAME)
+    return timeframes
+
+
+def candle_schema(symbol: str, timeframe: str):
+    """время свечи — timestamp[ms, UTC], цены и объем — float64"""
+    _require_pyarrow()
+    fields = [pa.field("candle_time", pa.timestamp("ms", tz="UTC"), nullable=False)]
+    fields += [pa.field(name, pa.float64(), nullable=False) for name, _ in CANDLE_FIELDS[1:]]
+    return pa.schema(fields, metadata={"symbol": symbol, "timeframe": timeframe})
+
+
+def to_record_batch(columns: CandleColumns, schema):
+    """колонки numpy в пачку Arrow без копирования данных"""
+    arrays = [pa.array(columns.candle_time, type=pa.int64()).cast(schema.field(0).type)]
+    arrays += [pa.array(getattr(columns, name)) for name, _ in CANDLE_FIELDS[1:]]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def read_batches(
+    symbol: str,
+    timeframe: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = BATCH_SIZE,
+    reader: Optional[OHLCVReader] = None,
+) -> Iterator[CandleColumns]:
+    """свечи диапазона пачками по возрастанию времени (поиск по индексу)"""
+    reader = reader or OHLCVReader()
+    after = None
+    while True:
+        columns = reader.read(
+            symbol, timeframe, start=start, end=end, limit=batch_size, after=after
+        )
+        if len(columns):
+            yield columns
+        if len(columns) < batch_size:
+            return
+        after = int(columns.candle_time[-1])
+
+
+class _Chunks:
+    """файл для писателей pyarrow: записанное забирается кусками через drain"""
+
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # писатель Parquet запоминает смещения row group для футера
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def stream_export(
+    symbol: str,
+    timeframe: str,
+    output: str = "arrow",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[bytes]:
+    """
+    байты файла Arrow IPC или Parquet по мере чтения пачек: одна пачка
+    чтения — один record batch (row group у Parquet)
+    """
+    schema = candle_schema(symbol, timeframe)
+    sink = _Chunks()
+    if output == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for columns in read_batches(symbol, timeframe, start, end, batch_size):
+        batch = to_record_batch(columns, schema)
+        if output == "parquet":
+            writer.write_batch(batch, row_group_size=len(columns))
+        else:
+            writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+async def async_chunks(chunks: Iterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    выгрузка для ASGI: синхронный итератор Django под ASGI сначала
+    дочитывает целиком, асинхронный отдается по пачке (чтение БД — в потоке)
+    """
+    iterator = iter(chunks)
+    done = object()
+    while True:
+        chunk = await sync_to_async(next, thread_sensitive=True)(iterator, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def _record_batches(source: BinaryIO, batch_size: int):
+    head = source.read(len(PARQUET_MAGIC))
+    source.seek(0)
+    if head == PARQUET_MAGIC:
+        # Parquet читается по row group: нужен файл с произвольным доступом
+        yield from pq.ParquetFile(source).iter_batches(batch_size=batch_size)
+        return
+    for batch in pa.ipc.open_stream(source):
+        for offset in range(0, batch.num_rows, batch_size):
+            yield batch.slice(offset, batch_size)
+
+
+def import_batches(
+    source: BinaryIO, batch_size: int = BATCH_SIZE
+) -> Iterator[np.ndarray]:
+    """
+    пачки загружаемого файла (Arrow IPC stream или Parquet, по сигнатуре)
+    в виде матриц (свечи × 6) для CopyIngestor.ingest_arrays
+    """
+    _require_pyarrow()
+    for batch in _record_batches(source, batch_size):
+        times = batch.column("candle_time").cast(pa.int64()).to_numpy()
+        yield np.column_stack(
+            [times.astype(np.float64)]
+            + [
+                batch.column(name).to_numpy().astype(np.float64)
+                for name, _ in CANDLE_FIELDS[1:]
+            ]
+        )
+
+
+def file_metadata(source: BinaryIO) -> dict:
+    """symbol/timeframe из метаданных схемы файла выгрузки"""
+    _require_pyarrow()
+    head = source.read(len(PARQUET_MAGIC))
+    source.seek(0)
+    if head == PARQUET_MAGIC:
+        schema = pq.ParquetFile(source).schema_arrow
+    else:
+        schema = pa.ipc.open_stream(source).schema
+    source.seek(0)
+    metadata = schema.metadata or {}
+    return {key.decode(): value.decode() for key, value in metadata.items()}
@@ -0,0 +1,330 @@
+import logging
+import re
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from django.conf import settings
+from .readers import CANDLE_FIELDS, CandleColumns, OHLCVReader
+
+logger = logging.getLogger(__name__)
+
+# заголовок буфера: seq (seqlock), count, head (следующая ячейка), last_ts,
+# complete (в буфере вся история пары — в БД меньше свечей, чем capacity),
+# updated (время последней записи, мс) — по нему читатели видят отставание
+HEADER_SLOTS = 6
+VALUE_COLUMNS = [name for name, _ in CANDLE_FIELDS[1:]]
+
+
+class CandleRingBuffer:
+    """
+    кольцевой буфер последних capacity свечей одной пары.
+    все данные лежат в одном непрерывном блоке памяти, поэтому буфер
+    можно разместить в shared memory и читать из других процессов.
+    согласованность чтения обеспечивает seqlock (seq нечетный — идет запись)
+    """
+
+    def __init__(self, capacity: int, memory=None) -> None:
+        self.capacity = capacity
+        if memory is None:
+            memory = bytearray(self.nbytes(capacity))
+        self.header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=memory)
+        self.times = np.ndarray(
+            (capacity,), dtype=np.int64, buffer=memory, offset=HEADER_SLOTS * 8
+        )
+        self.values = np.ndarray(
+            (len(VALUE_COLUMNS), capacity),
+            dtype=np.float64,
+            buffer=memory,
+            offset=(HEADER_SLOTS + capacity) * 8,
+        )
+        # запись из realtime-пути и прогрев могут идти из разных потоков
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def nbytes(capacity: int) -> int:
+        return (HEADER_SLOTS + capacity * (1 + len(VALUE_COLUMNS))) * 8
+
+    def __len__(self) -> int:
+        return int(self.header[1])
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        return int(self.header[3]) if self.header[1] else None
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.header[4])
+
+    @property
+    def updated(self) -> float:
+        """время последней записи (unix, с); общее для всех процессов сегмента"""
+        return int(self.header[5]) / 1000
+
+    def update(self, ohlcv_data: Sequence[Sequence[float]]) -> None:
+        """
+        применяет свечи ccxt [ts, open, high, low, close, volume]:
+        та же свеча перезаписывается, более новая добавляется, старые пропускаются
+        """
+        with self._write_lock:
+            self.header[0] += 1
+            try:
+                self._apply(ohlcv_data)
+                self.header[5] = int(time.time() * 1000)
+            finally:
+                self.header[0] += 1
+
+    def _apply(self, ohlcv_data: Sequence[Sequence[float]]) -> None:
+        header = self.header
+        for data in ohlcv_data:
+            ts = int(data[0])
+            count, head, last_ts = int(header[1]), int(header[2]), int(header[3])
+            if count and ts == last_ts:
+                slot = (head - 1) % self.capacity
+            elif not count or ts > last_ts:
+                slot = head
+                header[2] = (head + 1) % self.capacity
+                header[1] = min(count + 1, self.capacity)
+                header[3] = ts
+            else:
+                continue
+            self.times[slot] = ts
+            self.values[:, slot] = data[1:6]
+
+    def load(self, columns: CandleColumns, complete: bool = False) -> None:
+        """
+        заполняет буфер последними свечами из колонок (прогрев из БД).
+        свечи буфера новее последней из БД пришли уже после чтения — они
+        применяются поверх, а не теряются
+        """
+        count = min(len(columns), self.capacity)
+        with self._write_lock:
+            newer = self.latest()
+            if count:
+                last_ts = columns.candle_time[-1]
+                newer = newer[
+                    int(np.searchsorted(newer.candle_time, last_ts, side="right")) :
+                ]
+            header = self.header
+            header[0] += 1
+            try:
+                if count:
+                    self.times[:count] = columns.candle_time[-count:]
+                    for row, name in enumerate(VALUE_COLUMNS):
+                        self.values[row, :count] = getattr(columns, name)[-count:]
+                    header[3] = columns.candle_time[-1]
+                header[1] = count
+                header[2] = count % self.capacity
+                self._apply(
+                    np.column_stack(
+                        [newer.candle_time]
+                        + [getattr(newer, name) for name in VALUE_COLUMNS]
+                    ).tolist()
+                )
+                header[4] = int(complete and len(columns) + len(newer) <= self.capacity)
+                header[5] = int(time.time() * 1000)
+            finally:
+                header[0] += 1
+
+    def latest(self, n: Optional[int] = None) -> CandleColumns:
+        """последние n свечей (все, если n не задан) по возрастанию времени"""
+        while True:
+            seq = int(self.header[0])
+            if seq % 2:
+                time.sleep(0)  # идет запись — уступаем писателю
+                continue
+            count = int(self.header[1])
+            take = count if n is None else min(n, count)
+            slots = (int(self.header[2]) - take + np.arange(take)) % self.capacity
+            times = self.times[slots]
+            values = self.values[:, slots]
+            if int(self.header[0]) == seq:
+                break
+        return CandleColumns(
+            candle_time=times,
+            **{name: values[row] for row, name in enumerate(VALUE_COLUMNS)},
+        )
+
+
+class SharedCandleRingBuffer(CandleRingBuffer):
+    """
+    кольцевой буфер в multiprocessing.shared_memory: процесс загрузки
+    создает и пишет, веб-процессы подключаются по имени и только читают
+    """
+
+    def __init__(self, name: str, capacity: int, create: bool = False) -> None:
+        size = self.nbytes(capacity)
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # сегмент остался от прошлого запуска — переиспользуем,
+                # если он того же размера (capacity не менялась)
+                self.shm = shared_memory.SharedMemory(name=name)
+                if self.shm.size != size:
+                    self.shm.close()
+                    self.shm.unlink()
+                    self.shm = shared_memory.SharedMemory(
+                        name=name, create=True, size=size
+                    )
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # читатель не должен удалять сегмент при выходе
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+            if self.shm.size < size:
+                # писатель еще не пересоздал сегмент под новую capacity
+                self.shm.close()
+                raise FileNotFoundError(name)
+        super().__init__(capacity, memory=self.shm.buf)
+        if create:
+            self.header[:] = 0
+
+    def __del__(self) -> None:
+        # представления numpy держат буфер сегмента: сначала отпускаем их
+        self.header = self.times = self.values = None
+        try:
+            self.shm.close()
+        except (AttributeError, BufferError):
+            pass
+
+
+class CandleCache:
+    """
+    последние свечи по каждой паре (symbol, timeframe) в памяти процесса
+    (или в shared memory). горячие чтения «последнего окна» идут из буфера
+    без обращения к БД; промах прогревает буфер из гипертаблицы
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1000,
+        shared_memory: bool = False,
+        writer: bool = False,
+        stale_after: float = 60.0,
+    ) -> None:
+        self.capacity = capacity
+        self.shared_memory = shared_memory
+        self.writer = writer
+        # буфер, который давно не обновлялся, считается устаревшим
+        self.stale_after = stale_after
+        self.buffers: Dict[Tuple[str, str], CandleRingBuffer] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # по замку на пару: одновременные промахи прогревают буфер один раз
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+        self.reader = OHLCVReader()
+
+    def _segment_name(self, symbol: str, timeframe: str) -> str:
+        return "candles_" + re.sub(r"[^A-Za-z0-9]", "_", f"{symbol}_{timeframe}")
+
+    def _buffer(self, symbol: str, timeframe: str, create: bool) -> Optional[CandleRingBuffer]:
+        key = (symbol, timeframe)
+        buffer = self.buffers.get(key)
+        if buffer is not None:
+            return buffer
+        with self._lock:
+            buffer = self.buffers.get(key)
+            if buffer is not None:
+                return buffer
+            if self.shared_memory:
+                name = self._segment_name(symbol, timeframe)
+                try:
+                    buffer = SharedCandleRingBuffer(
+                        name, self.capacity, create=create and self.writer
+                    )
+                except FileNotFoundError:
+                    return None
+            elif create:
+                buffer = CandleRingBuffer(self.capacity)
+            else:
+                return None
+            self.buffers[key] = buffer
+            return buffer
+
+    def update(self, symbol: str, timeframe: str, ohlcv_data) -> None:
+        """обновление из realtime-пути записи"""
+        if self.shared_memory and not self.writer:
+            return
+        buffer = self._buffer(symbol, timeframe, create=True)
+        if buffer is not None:
+            buffer.update(ohlcv_data)
+
+    def warm(self, symbol: str, timeframe: str) -> CandleRingBuffer:
+        """заполняет буфер последними свечами из гипертаблицы"""
+        columns = self.reader.read(symbol, timeframe, limit=self.capacity, latest=True)
+        if self.shared_memory and not self.writer:
+            # читатель не пишет в shared memory и не хранит свой буфер: его бы
+            # никто не обновлял, а сегмент писателя не подключился бы поверх.
+            # прогретые данные нужны только на этот ответ
+            buffer = CandleRingBuffer(self.capacity)
+        else:
+            buffer = self._buffer(symbol, timeframe, create=True)
+        buffer.load(columns, complete=len(columns) < self.capacity)
+        return buffer
+
+    def peek(self, symbol: str, timeframe: str, n: int) -> Optional[CandleColumns]:
+        """последние n свечей, если они есть в буфере; иначе None"""
+        buffer = self._buffer(symbol, timeframe, create=False)
+        if buffer is None or not len(buffer):
+            return None
+        # буфер без свежих обновлений мог отстать от БД. сегмент shared memory
+        # перестает обновляться, когда писатель перезапустился и создал новый:
+        # такой отключаем, следующее чтение подключится к сегменту заново
+        if time.time() - buffer.updated > self.stale_after:
+            if isinstance(buffer, SharedCandleRingBuffer) and not self.writer:
+                with self._lock:
+                    if self.buffers.get((symbol, timeframe)) is buffer:
+                        del self.buffers[(symbol, timeframe)]
+            return None
+        if len(buffer) < n and not buffer.complete:
+            return None
+        return buffer.latest(n)
+
+    def invalidate(self, symbol: str) -> None:
+        """
+        история пары изменилась задним числом (догрузка, импорт): буферы
+        пары перечитываются. сегменты shared memory читают другие процессы,
+        поэтому писатель прогревает их сразу, остальные — при следующем чтении
+        """
+        with self._lock:
+            keys = [key for key in self.buffers if key[0] == symbol]
+        for key in keys:
+            if self.writer:
+                self.warm(*key)
+            else:
+                with self._lock:
+                    self.buffers.pop(key, None)
+
+    def _loading_lock(self, symbol: str, timeframe: str) -> threading.Lock:
+        with self._lock:
+            return self._loading.setdefault((symbol, timeframe), threading.Lock())
+
+    def get_latest(self, symbol: str, timeframe: str, n: int) -> CandleColumns:
+        columns = self.peek(symbol, timeframe, n)
+        if columns is not None:
+            self.hits += 1
+            return columns
+        # при массовом переподключении клиентов в БД идет один запрос на пару,
+        # остальные дожидаются прогрева и читают из буфера
+        with self._loading_lock(symbol, timeframe):
+            columns = self.peek(symbol, timeframe, n)
+            if columns is not None:
+                self.hits += 1
+                return columns
+            self.misses += 1
+            if n > self.capacity:
+                return self.reader.read(symbol, timeframe, limit=n, latest=True)
+            return self.warm(symbol, timeframe).latest(n)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "streams": len(self.buffers)}
+
+
+_config = getattr(settings, "CANDLE_CACHE", {})
+candle_cache = CandleCache(
+    capacity=_config.get("CAPACITY", 1000),
+    shared_memory=_config.get("SHARED_MEMORY", False),
+    stale_after=_config.get("STALE_AFTER", 60.0),
+)
@@ -0,0 +1,78 @@
+# раскладка таблицы свечей. ohlcv — исходная: symbol/timeframe varchar и цены
+# numeric в каждой строке. ohlcv_compact — компактная: smallint id пары из
+# словаря ohlcv_series, цены float8 и один первичный ключ вместо четырех индексов.
+# таблицы создает миграция 0005_ohlcv_compact, историю переносит
+# manage.py migrate_ohlcv_compact
+import threading
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from django.db import connection
+
+LEGACY_TABLE = "ohlcv"
+COMPACT_TABLE = "ohlcv_compact"
+SERIES_TABLE = "ohlcv_series"
+
+# условия отбора одной пары; параметры в обоих случаях [symbol, timeframe]
+LEGACY_FILTER = "symbol = %s AND timeframe = %s"
+COMPACT_FILTER = (
+    f"series_id = (SELECT id FROM {SERIES_TABLE} WHERE symbol = %s AND timeframe = %s)"
+)
+
+_series_ids: Dict[Tuple[str, str], int] = {}
+_lock = threading.Lock()
+
+
+def compact() -> bool:
+    return getattr(settings, "CANDLE_STORAGE", {}).get("COMPACT", False)
+
+
+def candle_table() -> str:
+    return COMPACT_TABLE if compact() else LEGACY_TABLE
+
+
+def series_filter() -> str:
+    return COMPACT_FILTER if compact() else LEGACY_FILTER
+
+
+class CandleTable:
+    """
+    таблица, с которой работает читатель или загрузчик свечей. по умолчанию
+    раскладка берется из CANDLE_STORAGE при каждом обращении; явные table и
+    compact нужны бенчмарку и переносу истории
+    """
+
+    def __init__(self, table: Optional[str] = None, compact: Optional[bool] = None) -> None:
+        self._table = table
+        self._compact = compact
+
+    @property
+    def compact(self) -> bool:
+        return compact() if self._compact is None else self._compact
+
+    @property
+    def table(self) -> str:
+        if self._table is not None:
+            return self._table
+        return COMPACT_TABLE if self.compact else LEGACY_TABLE
+
+
+def series_id(symbol: str, timeframe: str) -> int:
+    """id пары в словаре ohlcv_series; новая пара добавляется"""
+    key = (symbol, timeframe)
+    cached = _series_ids.get(key)
+    if cached is not None:
+        return cached
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SERIES_TABLE} (symbol, timeframe) VALUES (%s, %s) "
+            "ON CONFLICT (symbol, timeframe) DO NOTHING;",
+            [symbol, timeframe],
+        )
+        cursor.execute(
+            f"SELECT id FROM {SERIES_TABLE} WHERE symbol = %s AND timeframe = %s;",
+            [symbol, timeframe],
+        )
+        (value,) = cursor.fetchone()
+    with _lock:
+        _series_ids[key] = value
+    return value
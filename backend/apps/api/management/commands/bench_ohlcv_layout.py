@@ -0,0 +1,127 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+from ... import layout
+from ...readers import OHLCVReader, stored_timeframes
+from ....data_scrape.storage import CopyIngestor
+from ....trading_tools.resample import timeframe_ms
+from .bench_wire_format import best_of, generate_columns
+
+# раскладка: (таблица бенчмарка, таблица-образец, segmentby для сжатия)
+LAYOUTS = {
+    False: ("bench_ohlcv_legacy", layout.LEGACY_TABLE, "symbol, timeframe"),
+    True: ("bench_ohlcv_compact", layout.COMPACT_TABLE, "series_id"),
+}
+BENCH_SYMBOL = "BENCH{}/USDT"
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает ohlcv и ohlcv_compact: скорость вставки, размер до и после "
+        "сжатия чанков и скорость чтения диапазона. Таблицы-копии создаются "
+        "с индексами образцов и удаляются после замера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--series", type=int, default=4)
+        parser.add_argument("--candles", type=int, default=100_000, help="свечей на пару")
+        parser.add_argument("--scan-rows", type=int, default=5_000)
+        parser.add_argument("--scans", type=int, default=20)
+
+    def handle(self, *args, **options):
+        symbols = [BENCH_SYMBOL.format(i) for i in range(options["series"])]
+        # самый мелкий хранимый таймфрейм: читатель не станет его пересобирать
+        timeframe = min(stored_timeframes(), key=timeframe_ms)
+        columns = generate_columns(options["candles"])
+        columns.candle_time = columns.candle_time[0] + (
+            np.arange(len(columns), dtype=np.int64) * timeframe_ms(timeframe)
+        )
+        rows = np.column_stack(
+            [columns.candle_time.astype(np.float64)]
+            + [getattr(columns, name) for name in ("open", "high", "low", "close", "volume")]
+        ).tolist()
+        rnd = np.random.default_rng(1)
+        span = len(columns) - options["scan_rows"]
+        starts = columns.candle_time[rnd.integers(0, max(span, 1), options["scans"])]
+
+        try:
+            for compact, (table, template, segmentby) in LAYOUTS.items():
+                self.create_table(table, template, segmentby)
+                ingestor = CopyIngestor(table=table, compact=compact)
+                reader = OHLCVReader(table=table, compact=compact)
+
+                started = time.perf_counter()
+                for symbol in symbols:
+                    ingestor.ingest(symbol, timeframe, rows)
+                inserted = time.perf_counter() - started
+                raw_size = self.table_size(table)
+                raw_scan = self.scan(reader, symbols[0], timeframe, starts, options["scan_rows"])
+
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT count(compress_chunk(c, if_not_compressed => true)) "
+                        "FROM show_chunks(%s) c;",
+                        [table],
+                    )
+                compressed_size = self.table_size(table)
+                compressed_scan = self.scan(
+                    reader, symbols[0], timeframe, starts, options["scan_rows"]
+                )
+
+                total = len(rows) * len(symbols)
+                self.stdout.write(f"{template} ({len(symbols)} пар {timeframe})")
+                self.stdout.write(
+                    f"  вставка: {total} свечей за {inserted:.2f} с ({total / inserted:.0f} строк/с)"
+                )
+                self.stdout.write(
+                    f"  размер: {raw_size / 2**20:.1f} МБ, после сжатия {compressed_size / 2**20:.1f} МБ"
+                )
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"  чтение {options['scan_rows']} свечей: {raw_scan * 1000:.2f} мс, "
+                        f"из сжатых чанков {compressed_scan * 1000:.2f} мс"
+                    )
+                )
+        finally:
+            with connection.cursor() as cursor:
+                for table, _, _ in LAYOUTS.values():
+                    cursor.execute(f"DROP TABLE IF EXISTS {table};")
+                cursor.execute(
+                    f"DELETE FROM {layout.SERIES_TABLE} WHERE symbol = ANY(%s);", [symbols]
+                )
+
+    @staticmethod
+    def create_table(table: str, template: str, segmentby: str) -> None:
+        """копия таблицы-образца с теми же индексами и настройками сжатия"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table};")
+            cursor.execute(f"CREATE TABLE {table} (LIKE {template} INCLUDING ALL);")
+            cursor.execute(
+                "SELECT create_hypertable(%s, 'candle_time', "
+                "chunk_time_interval => INTERVAL '7 days', create_default_indexes => false);",
+                [table],
+            )
+            cursor.execute(
+                f"ALTER TABLE {table} SET (timescaledb.compress, "
+                f"timescaledb.compress_segmentby = '{segmentby}', "
+                "timescaledb.compress_orderby = 'candle_time DESC');"
+            )
+
+    @staticmethod
+    def table_size(table: str) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT hypertable_size(%s);", [table])
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def scan(
+        reader: OHLCVReader, symbol: str, timeframe: str, starts: np.ndarray, count: int
+    ) -> float:
+        """среднее время чтения count свечей с разных мест истории"""
+        total = 0.0
+        for start in starts.tolist():
+            total += best_of(
+                1, lambda: reader.read(symbol, timeframe, limit=count, after=int(start) - 1)
+            )
+        return total / len(starts)
@@ -0,0 +1,114 @@
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from ...readers import CandleColumns, format_candle
+from ...wire import decode_candles, decode_rows, encode_candles, encode_rows
+
+
+def generate_columns(count: int, volatility: float = 0.003, seed: int = 1):
+    """синтетические свечи в колоночном виде (как их отдает OHLCVReader)"""
+    rnd = np.random.default_rng(seed)
+    close = 100.0 * np.cumprod(1 + rnd.normal(0, volatility, count))
+    open_price = np.concatenate(([100.0], close[:-1]))
+    spread = np.abs(rnd.normal(0, volatility / 3, count))
+    return CandleColumns(
+        candle_time=1_700_000_000_000 + np.arange(count, dtype=np.int64) * 60_000,
+        open=open_price,
+        high=np.maximum(open_price, close) * (1 + spread),
+        low=np.minimum(open_price, close) * (1 - spread),
+        close=close,
+        volume=rnd.uniform(1, 100, count),
+    )
+
+
+def best_of(repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Сравнивает размер и скорость json и бинарного формата свечей (apps.api.wire)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--candles", type=int, default=10_000)
+        parser.add_argument("--updates", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        symbol, timeframe = "BTC/USDT", "1m"
+        columns = generate_columns(options["candles"])
+        repeat = options["repeat"]
+
+        # загрузка графика: страница истории целиком
+        def json_encode():
+            return json.dumps({"ohlcv": columns.to_records(symbol, timeframe)})
+
+        def json_decode(payload):
+            records = json.loads(payload)["ohlcv"]
+            return [
+                [float(r[name]) for name in ("open", "high", "low", "close", "volume")]
+                for r in records
+            ]
+
+        json_payload = json_encode().encode()
+        binary_payload = encode_candles(columns)
+        self.report(
+            f"история, {len(columns)} свечей",
+            len(json_payload),
+            len(binary_payload),
+            best_of(repeat, json_encode),
+            best_of(repeat, lambda: encode_candles(columns)),
+            best_of(repeat, lambda: json_decode(json_payload)),
+            best_of(repeat, lambda: decode_candles(binary_payload)),
+        )
+
+        # поток обновлений: по одной свече на сообщение
+        rows = np.column_stack(
+            [columns.candle_time.astype(np.float64)]
+            + [getattr(columns, name) for name in ("open", "high", "low", "close", "volume")]
+        )[: options["updates"]].tolist()
+
+        def json_updates():
+            return [
+                json.dumps(
+                    {"type": "candle_update", "candle": format_candle(symbol, timeframe, row)}
+                )
+                for row in rows
+            ]
+
+        def binary_updates():
+            return [encode_rows([row]) for row in rows]
+
+        json_messages = json_updates()
+        binary_messages = binary_updates()
+        self.report(
+            f"обновления, {len(rows)} сообщений",
+            sum(len(m.encode()) for m in json_messages),
+            sum(len(m) for m in binary_messages),
+            best_of(repeat, json_updates),
+            best_of(repeat, binary_updates),
+            best_of(repeat, lambda: [json.loads(m) for m in json_messages]),
+            best_of(repeat, lambda: [decode_rows(m) for m in binary_messages]),
+        )
+
+    def report(self, title, json_size, binary_size, json_enc, bin_enc, json_dec, bin_dec):
+        self.stdout.write(title)
+        self.stdout.write(
+            f"  размер: json {json_size / 1024:.1f} КБ, бинарный {binary_size / 1024:.1f} КБ "
+            f"(в {json_size / binary_size:.1f} раза меньше)"
+        )
+        self.stdout.write(
+            f"  кодирование: json {json_enc * 1000:.2f} мс, бинарный {bin_enc * 1000:.2f} мс "
+            f"(в {json_enc / bin_enc:.1f} раза быстрее)"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  декодирование: json {json_dec * 1000:.2f} мс, бинарный {bin_dec * 1000:.2f} мс "
+                f"(в {json_dec / bin_dec:.1f} раза быстрее)"
+            )
+        )
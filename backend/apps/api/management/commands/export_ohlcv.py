@@ -0,0 +1,51 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from ... import arrow
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает свечи пары в файл Arrow IPC (.arrow) или Parquet (.parquet): "
+        "формат определяется расширением, чтение идет пачками без загрузки "
+        "всего диапазона в память."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("symbol")
+        parser.add_argument("timeframe")
+        parser.add_argument("path", help="файл выгрузки: *.arrow или *.parquet")
+        parser.add_argument("--start", help="начало диапазона, ISO 8601")
+        parser.add_argument("--end", help="конец диапазона, ISO 8601")
+        parser.add_argument("--batch-size", type=int, default=arrow.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        output = "parquet" if path.suffix == ".parquet" else "arrow"
+        bounds = []
+        for name in ("start", "end"):
+            value = options[name]
+            if value:
+                parsed = parse_datetime(value)
+                if parsed is None:
+                    raise CommandError(f"неверная дата --{name}: {value}")
+                if timezone.is_naive(parsed):
+                    parsed = timezone.make_aware(parsed)
+                value = parsed
+            bounds.append(value or None)
+
+        size = 0
+        with open(path, "wb") as file:
+            for chunk in arrow.stream_export(
+                options["symbol"],
+                options["timeframe"],
+                output,
+                *bounds,
+                batch_size=options["batch_size"],
+            ):
+                file.write(chunk)
+                size += len(chunk)
+        self.stdout.write(
+            self.style.SUCCESS(f"{path}: {output}, {size / 1024 / 1024:.1f} МБ")
+        )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.data_scrape.storage import CopyIngestor, after_ingest
+from ... import arrow
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает файл Arrow IPC или Parquet (выгрузку export_ohlcv) в таблицу "
+        "свечей через COPY. Пара и таймфрейм по умолчанию берутся из метаданных файла."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--symbol")
+        parser.add_argument("--timeframe")
+        parser.add_argument("--batch-size", type=int, default=arrow.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with open(options["path"], "rb") as source:
+            metadata = arrow.file_metadata(source)
+            symbol = options["symbol"] or metadata.get("symbol")
+            timeframe = options["timeframe"] or metadata.get("timeframe")
+            if not symbol or not timeframe:
+                raise CommandError("в файле нет метаданных: укажите --symbol и --timeframe")
+            # --symbol/--timeframe только дополняют метаданные, а не переписывают их
+            for name, value in (("symbol", symbol), ("timeframe", timeframe)):
+                if metadata.get(name, value) != value:
+                    raise CommandError(f"в файле {name}={metadata[name]}, указано {value}")
+            if timeframe not in arrow.importable_timeframes():
+                raise CommandError(
+                    f"таймфрейм {timeframe} не загружается, допустимо: "
+                    f"{', '.join(arrow.importable_timeframes())}"
+                )
+            stats = CopyIngestor().ingest_arrays(
+                symbol,
+                timeframe,
+                arrow.import_batches(source, batch_size=options["batch_size"]),
+            )
+        if stats.first_ts is not None:
+            after_ingest(symbol, timeframe, stats.first_ts, stats.last_ts)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{symbol} {timeframe}: {stats.rows} строк за {stats.seconds:.2f} с "
+                f"({stats.rows_per_sec:.0f} строк/с)"
+            )
+        )
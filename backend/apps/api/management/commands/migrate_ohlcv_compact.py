@@ -0,0 +1,78 @@
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from ... import layout
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит историю из ohlcv в компактную раскладку ohlcv_compact окнами "
+        "по времени. Повторный запуск безопасен (ON CONFLICT DO NOTHING): "
+        "после переключения CANDLE_STORAGE['COMPACT'] его можно запустить с "
+        "--since, чтобы забрать свечи, записанные в ohlcv во время переноса."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--window-days", type=int, default=7)
+        parser.add_argument("--since", help="начало переноса (ISO 8601), по умолчанию вся история")
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {layout.SERIES_TABLE} (symbol, timeframe)
+                SELECT DISTINCT symbol, timeframe FROM {layout.LEGACY_TABLE}
+                ON CONFLICT (symbol, timeframe) DO NOTHING;
+            """
+            )
+            cursor.execute(f"SELECT min(candle_time), max(candle_time) FROM {layout.LEGACY_TABLE};")
+            first, last = cursor.fetchone()
+        if first is None:
+            self.stdout.write("ohlcv пуста, переносить нечего")
+            return
+        if options["since"]:
+            since = datetime.fromisoformat(options["since"])
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            first = max(first, since)
+
+        window = timedelta(days=options["window_days"])
+        started = time.perf_counter()
+        total = 0
+        # окно — отдельная транзакция: прерванный перенос продолжается с --since
+        while first <= last:
+            until = first + window
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {layout.COMPACT_TABLE}
+                        (series_id, candle_time, open, high, low, close, volume)
+                    SELECT s.id, o.candle_time, o.open::float8, o.high::float8,
+                           o.low::float8, o.close::float8, o.volume::float8
+                    FROM {layout.LEGACY_TABLE} o
+                    JOIN {layout.SERIES_TABLE} s
+                      ON s.symbol = o.symbol AND s.timeframe = o.timeframe
+                    WHERE o.candle_time >= %s AND o.candle_time < %s
+                    ON CONFLICT (series_id, candle_time) DO NOTHING;
+                """,
+                    [first, until],
+                )
+                copied = cursor.rowcount
+            total += copied
+            self.stdout.write(f"{first:%Y-%m-%d} — {until:%Y-%m-%d}: {copied} свечей")
+            first = until
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {layout.LEGACY_TABLE};")
+            (legacy,) = cursor.fetchone()
+            cursor.execute(f"SELECT count(*) FROM {layout.COMPACT_TABLE};")
+            (compact,) = cursor.fetchone()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"перенесено {total} свечей за {time.perf_counter() - started:.1f} с; "
+                f"в ohlcv {legacy}, в ohlcv_compact {compact}. "
+                "дальше: CANDLE_STORAGE['COMPACT'] = True"
+            )
+        )
@@ -1,9 +1,17 @@
 from django.core.management.base import BaseCommand
 import asyncio
 import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from ... import aggregates
+from ...cache import candle_cache
 from ....data_scrape.fetcher import RestAPIFetcher, WebSocketDataFetcher
 from ....data_scrape.storage import DatabaseStorage
 from ....data_scrape.processor import DataProcessor
+from ....data_scrape.planner import BackfillPlanner
+from ....trading_tools.pivots import pivot_store
+from ....trading_tools.tracker import ZigZagTracker
+from ....websocket.publisher import CandlePublisher
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -16,10 +24,26 @@ logging.basicConfig(
 class Command(BaseCommand):
     help = "Запускает процессор данных для загрузки исторических и реалтайм данных."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--derive",
+            action="store_true",
+            help=(
+                "загружать с биржи только базовый таймфрейм, старшие строит "
+                "timescaledb (CANDLE_AGGREGATES)"
+            ),
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Запуск команды..."))
+        if options["derive"] and not aggregates.enabled():
+            self.stdout.write(
+                self.style.WARNING(
+                    "CANDLE_AGGREGATES выключены: старшие таймфреймы не будут читаться из агрегатов"
+                )
+            )
         try:
-            asyncio.run(self.main())
+            asyncio.run(self.main(derive=options["derive"]))
         except KeyboardInterrupt:
             logger.warning("Программа принудительно завершена пользователем")
             self.stdout.write(self.style.WARNING("Программа завершена пользователем."))
@@ -27,23 +51,60 @@ class Command(BaseCommand):
             logger.error(f"Произошла ошибка: {e}", exc_info=True)
             self.stdout.write(self.style.ERROR(f"Ошибка: {e}"))
 
-    async def main(self):
+    async def main(self, derive: bool = False):
         logger.info("Инициализация компонентов...")
-        storage = DatabaseStorage()
+        # в режиме shared memory этот процесс — единственный писатель кеша свечей
+        shared_cache = candle_cache.shared_memory
+        candle_cache.writer = shared_cache
+        storage = DatabaseStorage(
+            publisher=CandlePublisher(feed_cache=not shared_cache),
+            cache=candle_cache if shared_cache else None,
+        )
         historical_fetcher = RestAPIFetcher("binance")
         realtime_fetcher = WebSocketDataFetcher("binance")  # Используем WebSocket
-        processor = DataProcessor(fetcher=historical_fetcher, storage=storage)
 
-        # Загрузка исторических данных
         symbols = ["BTC/USDT", "ETH/USDT"]
-        timeframes = ["1h", "15m"]
+        # таймфреймы, которые отдает api и websocket
+        served = list(settings.CANDLE_TIMEFRAMES)
+        timeframes = served
+        derived = {}
+        if derive:
+            # с биржи качается только базовый: историю 15m и 1h строят агрегаты,
+            # в реальном времени их свечи сворачиваются из базовых тиков
+            timeframes = [aggregates.BASE_TIMEFRAME]
+            derived = {
+                aggregates.BASE_TIMEFRAME: [
+                    tf for tf in served if tf != aggregates.BASE_TIMEFRAME
+                ]
+            }
+
+        processor = DataProcessor(
+            fetcher=historical_fetcher,
+            storage=storage,
+            zigzag_tracker=ZigZagTracker(
+                deviation=0.01, store=pivot_store, timeframes=served
+            ),
+            planner=BackfillPlanner(storage),
+            derived=derived,
+        )
+
+        # Загрузка исторических данных
 
         logger.info(f"Начало загрузки исторических данных: {symbols}, TF: {timeframes}")
         await processor.process_historical_data(symbols, timeframes)
         logger.info("Исторические данные успешно загружены.")
 
+        if shared_cache:
+            for symbol in symbols:
+                for timeframe in served:
+                    await sync_to_async(candle_cache.warm)(symbol, timeframe)
+            logger.info("Кеш свечей в shared memory прогрет.")
+
         # Загрузка данных в реальном времени
         logger.info("Переключение на WebSocket для реального времени...")
         processor.fetcher = realtime_fetcher  # Меняем fetcher на WebSocket
         logger.info("Запуск реального времени (WS)...")
-        await processor.process_realtime_data(symbols, timeframes)
+        try:
+            await processor.process_realtime_data(symbols, timeframes)
+        finally:
+            await storage.close()
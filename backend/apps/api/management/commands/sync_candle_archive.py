@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ...archive import CandleArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Дописывает в локальный архив (CANDLE_ARCHIVE) закрытые свечи из БД, "
+        "которых в нем еще нет. Архив читается бэктестами без БД."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--symbols", default="BTC/USDT,ETH/USDT")
+        parser.add_argument("--timeframes", default=",".join(settings.CANDLE_TIMEFRAMES))
+        parser.add_argument("--path", help="каталог архива вместо CANDLE_ARCHIVE['PATH']")
+        parser.add_argument("--batch-size", type=int, default=500_000)
+
+    def handle(self, *args, **options):
+        archive = CandleArchive(options["path"])
+        for symbol in options["symbols"].split(","):
+            for timeframe in options["timeframes"].split(","):
+                added = archive.sync(symbol, timeframe, batch_size=options["batch_size"])
+                index = archive.index(symbol, timeframe)
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{symbol} {timeframe}: +{added}, в архиве {index['count']} свечей"
+                    )
+                )
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_create_ohlcv_hypertable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchCursor',
+            fields=[
+                ('pk', models.CompositePrimaryKey('symbol', 'timeframe', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('symbol', models.CharField(max_length=20)),
+                ('timeframe', models.CharField(max_length=10)),
+                ('last_ts', models.BigIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'fetch_cursor',
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django
+
+from django.db import migrations
+
+from apps.api.aggregates import AGGREGATES, BASE_TIMEFRAME, view_name
+
+
+def create_aggregate(timeframe, width, bucket, start_offset, schedule):
+    view = view_name(timeframe)
+    return [
+        migrations.RunSQL(
+            sql=f"""
+                CREATE MATERIALIZED VIEW IF NOT EXISTS {view}
+                WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+                SELECT symbol,
+                       time_bucket(INTERVAL '{bucket}', candle_time) AS candle_time,
+                       first(open, candle_time) AS open,
+                       max(high) AS high,
+                       min(low) AS low,
+                       last(close, candle_time) AS close,
+                       sum(volume) AS volume
+                FROM ohlcv
+                WHERE timeframe = '{BASE_TIMEFRAME}'
+                GROUP BY symbol, time_bucket(INTERVAL '{bucket}', candle_time)
+                WITH NO DATA;
+            """,
+            reverse_sql=f"DROP MATERIALIZED VIEW IF EXISTS {view};",
+        ),
+        # незавершенная последняя свеча считается на лету (materialized_only = false)
+        migrations.RunSQL(
+            sql=f"""
+                SELECT add_continuous_aggregate_policy(
+                    '{view}',
+                    start_offset => INTERVAL '{start_offset}',
+                    end_offset => INTERVAL '{bucket}',
+                    schedule_interval => INTERVAL '{schedule}',
+                    if_not_exists => true
+                );
+            """,
+            reverse_sql=f"SELECT remove_continuous_aggregate_policy('{view}', if_exists => true);",
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+    # представления и политики создаются независимо от CANDLE_AGGREGATES:
+    # выключенная настройка только не читает из них. политики обновляют
+    # лишь недавнее окно, поэтому их фоновая работа ограничена.
+    # continuous aggregate нельзя создать внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("api", "0003_fetchcursor"),
+    ]
+
+    operations = [
+        operation
+        for timeframe, options in AGGREGATES.items()
+        for operation in create_aggregate(timeframe, *options)
+    ]
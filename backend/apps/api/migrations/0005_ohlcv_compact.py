@@ -0,0 +1,71 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_ohlcv_continuous_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandleSeries',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('symbol', models.CharField(max_length=20)),
+                ('timeframe', models.CharField(max_length=10)),
+            ],
+            options={
+                'db_table': 'ohlcv_series',
+                'constraints': [models.UniqueConstraint(fields=('symbol', 'timeframe'), name='ohlcv_series_symbol_timeframe_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CompactOHLCV',
+            fields=[
+                ('pk', models.CompositePrimaryKey('series', 'candle_time', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('candle_time', models.DateTimeField()),
+                ('open', models.FloatField()),
+                ('high', models.FloatField()),
+                ('low', models.FloatField()),
+                ('close', models.FloatField()),
+                ('volume', models.FloatField()),
+                ('series', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, to='api.candleseries')),
+            ],
+            options={
+                'db_table': 'ohlcv_compact',
+            },
+        ),
+        # гипертаблица без индексов по умолчанию: все выборки идут по ключу
+        migrations.RunSQL(
+            sql="""
+                SELECT create_hypertable(
+                    'ohlcv_compact',
+                    'candle_time',
+                    chunk_time_interval => INTERVAL '7 days',
+                    create_default_indexes => false,
+                    if_not_exists => true
+                );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE ohlcv_compact SET (
+                    timescaledb.compress,
+                    timescaledb.compress_segmentby = 'series_id',
+                    timescaledb.compress_orderby = 'candle_time DESC'
+                );
+            """,
+            reverse_sql="ALTER TABLE ohlcv_compact RESET (timescaledb.compress);",
+        ),
+        migrations.RunSQL(
+            sql="""
+                SELECT add_compression_policy('ohlcv_compact', compress_after => INTERVAL '7 days');
+            """,
+            reverse_sql="SELECT remove_compression_policy('ohlcv_compact', if_exists => true);",
+        ),
+    ]
@@ -21,3 +21,64 @@ class OHLCV(models.Model):
 
     def __str__(self):
         return f"монета:{self.symbol} таймфрейм:{self.timeframe} время свечи: {self.candle_time}"
+
+
+class FetchCursor(models.Model):
+    """курсор загрузки истории: до какой свечи (мс) история уже сохранена"""
+
+    pk = models.CompositePrimaryKey("symbol", "timeframe")
+    symbol = models.CharField(max_length=20)
+    timeframe = models.CharField(max_length=10)
+    last_ts = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "fetch_cursor"
+
+    def __str__(self):
+        return f"курсор монета:{self.symbol} таймфрейм:{self.timeframe} до: {self.last_ts}"
+
+
+class CandleSeries(models.Model):
+    """словарь пар для ohlcv_compact: symbol/timeframe хранятся один раз"""
+
+    id = models.SmallAutoField(primary_key=True)
+    symbol = models.CharField(max_length=20)
+    timeframe = models.CharField(max_length=10)
+
+    class Meta:
+        db_table = "ohlcv_series"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["symbol", "timeframe"], name="ohlcv_series_symbol_timeframe_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"пара {self.id}: {self.symbol} {self.timeframe}"
+
+
+class CompactOHLCV(models.Model):
+    """
+    свеча в компактной раскладке (apps.api.layout): цены float8, пара — smallint.
+    первичный ключ (series_id, candle_time) — единственный индекс таблицы
+    """
+
+    pk = models.CompositePrimaryKey("series", "candle_time")
+    # без FK-проверки и отдельного индекса на каждую вставку: словарь ведет приложение
+    series = models.ForeignKey(
+        CandleSeries, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False
+    )
+    candle_time = models.DateTimeField()
+
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.FloatField()
+
+    class Meta:
+        db_table = "ohlcv_compact"
+
+    def __str__(self):
+        return f"пара:{self.series_id} время свечи: {self.candle_time}"
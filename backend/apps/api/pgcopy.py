@@ -0,0 +1,71 @@
+# кодек бинарного формата COPY postgres для колонок фиксированной ширины
+import struct
+from typing import Dict, Sequence, Tuple
+import numpy as np
+
+SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+HEADER_SIZE = len(SIGNATURE) + 8  # подпись + флаги + длина расширения
+TRAILER = struct.pack(">h", -1)
+# timestamptz в бинарном формате — микросекунды от 2000-01-01 UTC
+PG_EPOCH_MS = 946_684_800_000
+
+
+def ms_to_pg_timestamp(milliseconds: np.ndarray) -> np.ndarray:
+    """переводит unix-время в мс в бинарное представление timestamptz"""
+    return (np.asarray(milliseconds, dtype=np.int64) - PG_EPOCH_MS) * 1000
+
+
+def _row_dtype(fields: Sequence[Tuple[str, str]]) -> np.dtype:
+    """
+    dtype одной строки COPY: число полей и для каждого поля длина + значение.
+    все типы big-endian, как того требует протокол
+    """
+    layout = [("field_count", ">i2")]
+    for name, kind in fields:
+        layout.append((f"{name}_len", ">i4"))
+        layout.append((name, ">" + kind))
+    return np.dtype(layout)
+
+
+def decode_binary_copy(
+    buffer: bytes, fields: Sequence[Tuple[str, str]]
+) -> Dict[str, np.ndarray]:
+    """
+    разбирает вывод COPY ... TO STDOUT WITH (FORMAT binary) в колонки numpy.
+
+    :param fields: пары (имя, numpy-тип), например ("time", "i8"), ("close", "f8")
+    :return: словарь колонок в нативном порядке байт
+    """
+    view = memoryview(buffer)
+    if bytes(view[: len(SIGNATURE)]) != SIGNATURE:
+        raise ValueError("неверная подпись бинарного COPY")
+    (extension_size,) = struct.unpack_from(">i", view, len(SIGNATURE) + 4)
+    offset = HEADER_SIZE + extension_size
+
+    dtype = _row_dtype(fields)
+    body = len(view) - offset - len(TRAILER)
+    if body % dtype.itemsize:
+        raise ValueError("строки COPY не фиксированной ширины (есть NULL?)")
+    rows = np.frombuffer(view, dtype=dtype, count=body // dtype.itemsize, offset=offset)
+    for name, kind in fields:
+        if (rows[f"{name}_len"] != np.dtype(kind).itemsize).any():
+            raise ValueError(f"поле {name} содержит NULL или другой тип")
+
+    return {name: rows[name].astype(kind) for name, kind in fields}
+
+
+def encode_binary_copy(
+    columns: Dict[str, np.ndarray], fields: Sequence[Tuple[str, str]]
+) -> bytes:
+    """
+    собирает поток для COPY ... FROM STDIN WITH (FORMAT binary) из колонок
+    одинаковой длины без NULL
+    """
+    dtype = _row_dtype(fields)
+    count = len(columns[fields[0][0]])
+    rows = np.empty(count, dtype=dtype)
+    rows["field_count"] = len(fields)
+    for name, kind in fields:
+        rows[f"{name}_len"] = np.dtype(kind).itemsize
+        rows[name] = columns[name]
+    return SIGNATURE + struct.pack(">ii", 0, 0) + rows.tobytes() + TRAILER
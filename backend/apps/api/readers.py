@@ -0,0 +1,302 @@
+import io
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from apps.trading_tools.resample import resample_arrays, timeframe_ms
+from . import aggregates, layout
+from .pgcopy import decode_binary_copy
+
+# колонки выборки: время в мс UTC и цены/объем как float8
+CANDLE_FIELDS = (
+    ("candle_time", "i8"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+)
+UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# начало отсчета интервалов как у time_bucket в timescaledb (понедельник)
+BUCKET_ORIGIN = 946_857_600_000
+
+
+def stored_timeframes() -> List[str]:
+    """таймфреймы, которые есть в БД: загруженные с биржи и агрегаты"""
+    timeframes = list(getattr(settings, "CANDLE_TIMEFRAMES", []))
+    if aggregates.enabled():
+        timeframes += [aggregates.BASE_TIMEFRAME, *aggregates.AGGREGATE_TIMEFRAMES]
+    return timeframes
+
+
+def resample_base(timeframe: str, stored: Optional[List[str]] = None) -> str:
+    """
+    хранимый таймфрейм, из которого читается timeframe: он сам или самый
+    крупный из тех, на длительность которых он делится. ValueError — никакой
+    """
+    stored = stored_timeframes() if stored is None else stored
+    if timeframe in stored:
+        return timeframe
+    width = timeframe_ms(timeframe)
+    bases = [(timeframe_ms(tf), tf) for tf in stored if width % timeframe_ms(tf) == 0]
+    if not bases:
+        raise ValueError(f"таймфрейм {timeframe} не выводится из {stored}")
+    return max(bases)[1]
+
+
+def ms_to_datetime(milliseconds: int) -> datetime:
+    """время в мс UTC в aware datetime без потери точности float"""
+    return UNIX_EPOCH + timedelta(milliseconds=int(milliseconds))
+
+
+def iso_times(milliseconds: np.ndarray) -> np.ndarray:
+    """время в мс UTC строками в формате OHLCVSerializer (%Y-%m-%dT%H:%M:%S%z)"""
+    seconds = np.datetime_as_string(
+        np.asarray(milliseconds, dtype=np.int64).astype("datetime64[ms]"), unit="s"
+    )
+    return np.char.add(seconds, "+0000")
+
+
+def format_candle(symbol: str, timeframe: str, data: Sequence[float]) -> Dict:
+    """
+    свеча ccxt [ts, open, high, low, close, volume] в формате OHLCVSerializer
+    (с той же оговоркой о точности float, что и CandleColumns.to_records)
+    """
+    candle_time = datetime.fromtimestamp(data[0] / 1000, tz=timezone.utc)
+    return {
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "candle_time": candle_time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "open": f"{data[1]:.8f}",
+        "high": f"{data[2]:.8f}",
+        "low": f"{data[3]:.8f}",
+        "close": f"{data[4]:.8f}",
+        "volume": f"{data[5]:.8f}",
+    }
+
+
+@dataclass
+class CandleColumns:
+    """свечи одной пары в колоночном виде (время в мс UTC, цены float64)"""
+
+    candle_time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.candle_time)
+
+    def __getitem__(self, index: slice) -> "CandleColumns":
+        return CandleColumns(
+            **{name: getattr(self, name)[index] for name, _ in CANDLE_FIELDS}
+        )
+
+    def reversed(self) -> "CandleColumns":
+        return CandleColumns(
+            **{name: getattr(self, name)[::-1].copy() for name, _ in CANDLE_FIELDS}
+        )
+
+    def iso_times(self) -> np.ndarray:
+        return iso_times(self.candle_time)
+
+    def to_records(self, symbol: str, timeframe: str) -> List[Dict]:
+        """
+        словари в том же виде, что отдавал OHLCVSerializer
+        (цены строками с 8 знаками после запятой).
+        значения прошли через float8: у чисел numeric(20, 8) длиннее ~15
+        значащих цифр (крупные объемы) последние знаки могут отличаться
+        от сериализатора — 98765432109.87654321 станет 98765432109.87654114
+        """
+        columns = [self.iso_times().tolist()] + [
+            [f"{value:.8f}" for value in getattr(self, name).tolist()]
+            for name, _ in CANDLE_FIELDS[1:]
+        ]
+        return [
+            {
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "candle_time": candle_time,
+                "open": open_price,
+                "high": high,
+                "low": low,
+                "close": close,
+                "volume": volume,
+            }
+            for candle_time, open_price, high, low, close, volume in zip(*columns)
+        ]
+
+
+class OHLCVReader(layout.CandleTable):
+    """
+    читает свечи из гипертаблицы ohlcv (или ohlcv_compact) сразу в массивы numpy через
+    COPY (SELECT ...) TO STDOUT в бинарном формате, минуя ORM и сериализатор
+    """
+
+    def _source(self, timeframe: str) -> str:
+        """
+        таблица для таймфрейма: производные таймфреймы читаются из
+        continuous aggregates, если они включены (apps.api.aggregates)
+        """
+        if self.compact:
+            return self.table
+        return aggregates.source_table(timeframe) or self.table
+
+    def _where(
+        self,
+        symbol: str,
+        timeframe: Optional[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+    ):
+        # в агрегатах нет колонки timeframe: одно представление — один таймфрейм
+        if timeframe is None:
+            conditions, params = ["symbol = %s"], [symbol]
+        else:
+            series = layout.COMPACT_FILTER if self.compact else layout.LEGACY_FILTER
+            conditions, params = [series], [symbol, timeframe]
+        if start is not None:
+            conditions.append("candle_time >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append("candle_time <= %s")
+            params.append(end)
+        # строгие границы keyset-пагинации (мс UTC)
+        if after is not None:
+            conditions.append("candle_time > %s")
+            params.append(ms_to_datetime(after))
+        if before is not None:
+            conditions.append("candle_time < %s")
+            params.append(ms_to_datetime(before))
+        return " AND ".join(conditions), params
+
+    def read(
+        self,
+        symbol: str,
+        timeframe: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        latest: bool = False,
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+    ) -> CandleColumns:
+        """
+        возвращает свечи по возрастанию времени.
+        latest=True берет последние limit свечей диапазона,
+        after/before — строгие границы по времени свечи в мс.
+        таймфрейм, которого нет в БД, собирается из хранимого (resample)
+        """
+        stored = stored_timeframes()
+        if timeframe not in stored:
+            return self._read_resampled(
+                symbol, timeframe, stored, start, end, limit, offset, latest, after, before
+            )
+        table = self._source(timeframe)
+        where, params = self._where(
+            symbol,
+            timeframe if table == self.table else None,
+            start,
+            end,
+            after,
+            before,
+        )
+        query = (
+            "SELECT (extract(epoch FROM candle_time) * 1000)::int8, "
+            "open::float8, high::float8, low::float8, close::float8, volume::float8 "
+            f"FROM {table} WHERE {where} "
+            f"ORDER BY candle_time {'DESC' if latest else 'ASC'}"
+        )
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(int(limit))
+        if offset:
+            query += " OFFSET %s"
+            params.append(int(offset))
+
+        buffer = io.BytesIO()
+        with connection.cursor() as cursor:
+            sql = cursor.mogrify(query, params)
+            if isinstance(sql, bytes):
+                sql = sql.decode()
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT binary)", buffer)
+
+        columns = CandleColumns(**decode_binary_copy(buffer.getbuffer(), CANDLE_FIELDS))
+        return columns.reversed() if latest else columns
+
+    def _read_resampled(
+        self,
+        symbol: str,
+        timeframe: str,
+        stored: List[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        limit: Optional[int],
+        offset: int,
+        latest: bool,
+        after: Optional[int],
+        before: Optional[int],
+    ) -> CandleColumns:
+        """
+        свечи произвольного интервала из самого крупного хранимого
+        таймфрейма, на который он делится. границы по свечам интервала
+        переводятся в границы по базовым свечам, выборка сворачивается reduceat
+        """
+        base = resample_base(timeframe, stored)
+        width = timeframe_ms(timeframe)
+        ratio = width // timeframe_ms(base)
+
+        def floor(ms: int) -> int:
+            return ms - (ms - BUCKET_ORIGIN) % width
+
+        def ceil(ms: int) -> int:
+            return floor(ms + width - 1)
+
+        lower, upper = [], []
+        if start is not None:
+            lower.append(ceil(int(start.timestamp() * 1000)) - 1)
+        if after is not None:
+            lower.append(floor(after) + width - 1)
+        if end is not None:
+            upper.append(floor(int(end.timestamp() * 1000)) + width)
+        if before is not None:
+            upper.append(floor(before - 1) + width)
+
+        # в интервале не больше ratio базовых свечей: count + 1 интервалов
+        # заведомо покрывают count полных, крайний может быть обрезан лимитом
+        count = limit + offset if limit is not None else None
+        base_limit = (count + 1) * ratio if count is not None else None
+        columns = self.read(
+            symbol,
+            base,
+            limit=base_limit,
+            latest=latest,
+            after=max(lower) if lower else None,
+            before=min(upper) if upper else None,
+        )
+        bars = CandleColumns(
+            *resample_arrays(
+                columns.candle_time,
+                columns.open,
+                columns.high,
+                columns.low,
+                columns.close,
+                columns.volume,
+                width,
+                BUCKET_ORIGIN,
+            )
+        )
+        if base_limit is not None and len(columns) == base_limit:
+            bars = bars[1:] if latest else bars[:-1]
+        if count is None:
+            return bars[offset:] if not latest else bars[: len(bars) - offset]
+        if latest:
+            return bars[max(len(bars) - count, 0) : len(bars) - offset]
+        return bars[offset:count]
@@ -1,3 +1,287 @@
-from django.test import TestCase
+import io
+import tempfile
+import time
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from django.test import SimpleTestCase
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from apps.trading_tools.resample import resample_arrays
+from . import arrow
+from .archive import CandleArchive
+from .cache import CandleCache
+from .management.commands.bench_wire_format import generate_columns
+from .readers import BUCKET_ORIGIN, CANDLE_FIELDS
+from .views import OHLCVPagination
+from .wire import (
+    KIND_SNAPSHOT,
+    CandleBinaryRenderer,
+    decode_candles,
+    decode_rows,
+    encode_candles,
+    encode_rows,
+)
 
-# Create your tests here.
+
+class FakeReader:
+    """OHLCVReader.read по колонкам в памяти (без БД)"""
+
+    def __init__(self, columns) -> None:
+        self.columns = columns
+
+    def read(
+        self,
+        symbol,
+        timeframe,
+        start=None,
+        end=None,
+        limit=None,
+        offset=0,
+        latest=False,
+        after=None,
+        before=None,
+    ):
+        times = self.columns.candle_time
+        mask = np.ones(len(times), dtype=bool)
+        if after is not None:
+            mask &= times > after
+        if before is not None:
+            mask &= times < before
+        rows = np.flatnonzero(mask)
+        if limit is not None:
+            rows = rows[-limit:] if latest else rows[:limit]
+        return self.columns[rows]
+
+
+def assert_columns_equal(first, second) -> None:
+    for name, _ in CANDLE_FIELDS:
+        np.testing.assert_array_equal(getattr(first, name), getattr(second, name))
+
+
+class WireFormatTests(SimpleTestCase):
+    def test_candles_round_trip(self):
+        columns = generate_columns(1000)
+        meta = {"mode": "snapshot", "zigzag": [{"time": 1, "price": 2.5}]}
+        kind, decoded, decoded_meta = decode_candles(
+            encode_candles(columns, KIND_SNAPSHOT, meta)
+        )
+        self.assertEqual(kind, KIND_SNAPSHOT)
+        self.assertEqual(decoded_meta, meta)
+        assert_columns_equal(decoded, columns)
+
+    def test_empty_candles_round_trip(self):
+        _, decoded, meta = decode_candles(encode_candles(generate_columns(0)))
+        self.assertEqual(len(decoded), 0)
+        self.assertEqual(meta, {})
+
+    def test_rows_round_trip(self):
+        rows = [
+            [1_700_000_000_000, 1.5, 2.0, 1.0, 1.75, 10.0],
+            [1_700_000_060_000, 1.75, 2.5, 1.5, 2.25, 0.125],
+        ]
+        _, decoded = decode_rows(encode_rows(rows))
+        self.assertEqual(decoded, rows)
+        # кадр обновления читается и общим декодером
+        _, columns, _ = decode_candles(encode_rows(rows))
+        self.assertEqual(columns.close.tolist(), [1.75, 2.25])
+
+    def test_error_rendered_as_json(self):
+        class ErrorView(APIView):
+            renderer_classes = [CandleBinaryRenderer]
+
+            def get(self, request):
+                return Response({"detail": "нет"}, status=404)
+
+        response = ErrorView.as_view()(APIRequestFactory().get("/"))
+        response.render()
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.content.decode(), '{"detail":"нет"}')
+
+
+class CandleCacheTests(SimpleTestCase):
+    def rows(self, columns):
+        return np.column_stack(
+            [columns.candle_time] + [getattr(columns, n) for n, _ in CANDLE_FIELDS[1:]]
+        ).tolist()
+
+    def test_warm_keeps_updates_newer_than_db(self):
+        columns = generate_columns(300)
+        cache = CandleCache(capacity=200)
+        cache.reader = FakeReader(columns[:290])
+        # пока шло чтение из БД, из realtime-пути пришли более новые свечи
+        cache.update("BTC/USDT", "1m", self.rows(columns[285:]))
+        buffer = cache.warm("BTC/USDT", "1m")
+        assert_columns_equal(buffer.latest(), columns[-200:])
+        self.assertFalse(buffer.complete)
+
+    def test_complete_history(self):
+        columns = generate_columns(150)
+        cache = CandleCache(capacity=200)
+        cache.reader = FakeReader(columns[:120])
+        cache.update("BTC/USDT", "1m", self.rows(columns[100:]))
+        buffer = cache.warm("BTC/USDT", "1m")
+        assert_columns_equal(buffer.latest(), columns)
+        self.assertTrue(buffer.complete)
+
+
+class CandleArchiveTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive = CandleArchive(directory.name)
+        self.columns = generate_columns(1000)
+
+    def test_append_skips_known_and_overwrites_last(self):
+        archive, columns = self.archive, self.columns
+        self.assertEqual(archive.append("BTC/USDT", "1m", columns[:600]), 600)
+        # последняя архивная свеча пришла в окончательном виде
+        update = columns[599:800]
+        update.close = update.close.copy()
+        update.close[0] += 1
+        self.assertEqual(archive.append("BTC/USDT", "1m", columns[:300]), 0)
+        self.assertEqual(archive.append("BTC/USDT", "1m", update), 200)
+        stored = archive.read("BTC/USDT", "1m")
+        np.testing.assert_array_equal(stored.candle_time, columns.candle_time[:800])
+        np.testing.assert_array_equal(stored.close[599:], update.close)
+        np.testing.assert_array_equal(stored.close[:599], columns.close[:599])
+        self.assertEqual(
+            archive.index("BTC/USDT", "1m")["last"], int(columns.candle_time[799])
+        )
+
+    def test_torn_tail_truncated(self):
+        archive, columns = self.archive, self.columns
+        archive.append("BTC/USDT", "1m", columns[:500])
+        directory = archive.path("BTC/USDT", "1m")
+        # сбой после записи колонок, до замены индекса
+        for name, kind in CANDLE_FIELDS:
+            with open(directory / f"{name}.{kind}", "ab") as file:
+                file.write(b"\xff" * 13)
+        assert_columns_equal(archive.read("BTC/USDT", "1m"), columns[:500])
+        archive.append("BTC/USDT", "1m", columns[500:700])
+        assert_columns_equal(archive.read("BTC/USDT", "1m"), columns[:700])
+        for name, kind in CANDLE_FIELDS:
+            size = (directory / f"{name}.{kind}").stat().st_size
+            self.assertEqual(size, 700 * np.dtype(kind).itemsize)
+
+    def test_resampled_read(self):
+        archive, columns = self.archive, self.columns
+        archive.append("BTC/USDT", "1m", columns)
+        width = 15 * 60_000
+        expected = np.column_stack(
+            resample_arrays(
+                columns.candle_time,
+                columns.open,
+                columns.high,
+                columns.low,
+                columns.close,
+                columns.volume,
+                width,
+                BUCKET_ORIGIN,
+            )
+        )
+        stored = archive.read("BTC/USDT", "15m")
+        rows = np.column_stack([getattr(stored, n) for n, _ in CANDLE_FIELDS])
+        np.testing.assert_array_equal(rows, expected)
+        # границы диапазона расширяются до целых интервалов
+        start, end = int(expected[3, 0]) + 60_000, int(expected[10, 0]) + 60_000
+        window = archive.read("BTC/USDT", "15m", start, end)
+        np.testing.assert_array_equal(window.candle_time, expected[3:11, 0])
+        with self.assertRaises(ValueError):
+            archive.read("BTC/USDT", "90s")
+
+    def test_sync_skips_forming_candle(self):
+        columns = generate_columns(50)
+        # последняя свеча — текущая минута, она еще формируется
+        now = int(time.time() * 1000) // 60_000 * 60_000
+        columns.candle_time = columns.candle_time - columns.candle_time[-1] + now
+        reader = FakeReader(columns)
+        self.assertEqual(self.archive.sync("BTC/USDT", "1m", reader, batch_size=20), 49)
+        self.assertEqual(self.archive.sync("BTC/USDT", "1m", reader), 0)
+
+
+class OHLCVPaginationTests(SimpleTestCase):
+    def setUp(self):
+        self.columns = generate_columns(257)
+        self.reader = FakeReader(self.columns)
+        self.factory = APIRequestFactory()
+
+    def page(self, url):
+        request = Request(self.factory.get(url))
+        paginator = OHLCVPagination()
+        columns = paginator.paginate_reader(
+            self.reader, "BTC/USDT", "1m", None, None, request
+        )
+        return columns, paginator.get_next_link(), paginator.get_previous_link()
+
+    def path(self, link):
+        parsed = urlparse(link)
+        return f"{parsed.path}?{parsed.query}"
+
+    def test_forward_pages_cover_history(self):
+        pages = []
+        url = "/candles/?limit=50"
+        while url:
+            columns, next_link, _ = self.page(url)
+            pages.append(columns.candle_time)
+            url = next_link and self.path(next_link)
+        self.assertEqual([len(page) for page in pages], [50] * 5 + [7])
+        np.testing.assert_array_equal(np.concatenate(pages), self.columns.candle_time)
+
+    def test_backward_pages_cover_history(self):
+        url = "/candles/?limit=100"
+        while True:
+            _, next_link, _ = self.page(url)
+            if next_link is None:
+                break
+            url = self.path(next_link)
+        pages = []
+        while url:
+            columns, _, previous_link = self.page(url)
+            pages.insert(0, columns.candle_time)
+            url = previous_link and self.path(previous_link)
+        np.testing.assert_array_equal(np.concatenate(pages), self.columns.candle_time)
+
+    def test_limit_is_clamped(self):
+        paginator = OHLCVPagination()
+        for query, expected in (
+            ("", 100),
+            ("limit=abc", 100),
+            ("limit=-5", 100),
+            ("limit=20", 20),
+            ("limit=100000", paginator.max_limit),
+        ):
+            request = Request(self.factory.get(f"/candles/?{query}"))
+            self.assertEqual(paginator.get_limit(request), expected)
+
+    def test_cursor_encodes_edge_candle(self):
+        _, next_link, previous_link = self.page("/candles/?limit=10")
+        self.assertIsNone(previous_link)
+        cursor = parse_qs(urlparse(next_link).query)["cursor"][0]
+        columns, _, previous_link = self.page(f"/candles/?limit=10&cursor={cursor}")
+        self.assertEqual(columns.candle_time[0], self.columns.candle_time[10])
+        self.assertIsNotNone(previous_link)
+
+
+@unittest.skipIf(arrow.pa is None, "pyarrow не установлен")
+class ArrowRoundTripTests(SimpleTestCase):
+    def test_export_import_round_trip(self):
+        columns = generate_columns(1200)
+        for output in arrow.FORMATS:
+            with mock.patch.object(arrow, "OHLCVReader", lambda: FakeReader(columns)):
+                payload = b"".join(
+                    arrow.stream_export("BTC/USDT", "1m", output, batch_size=500)
+                )
+            source = io.BytesIO(payload)
+            self.assertEqual(
+                arrow.file_metadata(source), {"symbol": "BTC/USDT", "timeframe": "1m"}
+            )
+            rows = np.concatenate(list(arrow.import_batches(source, batch_size=300)))
+            expected = np.column_stack(
+                [columns.candle_time.astype(np.float64)]
+                + [getattr(columns, name) for name, _ in CANDLE_FIELDS[1:]]
+            )
+            np.testing.assert_array_equal(rows, expected)
@@ -1,6 +1,6 @@
 # определяет url маршруты для приложения zzBot
 from django.urls import path, include
-from .views import OHLCVAPIView, CoinListView
+from .views import OHLCVAPIView, OHLCVExportView, CoinListView, CandleCacheStatsView
 
 app_name = "api"
 
@@ -10,6 +10,12 @@ urlpatterns = [
         OHLCVAPIView.as_view(),
         name="ohlcv-data",
     ),
+    path(
+        "export/<str:symbol_encoded>/<str:timeframe>/",
+        OHLCVExportView.as_view(),
+        name="ohlcv-export",
+    ),
     path("coins/", CoinListView.as_view(), name="coin-list"),
+    path("cache/stats/", CandleCacheStatsView.as_view(), name="cache-stats"),
     path("ws/", include("apps.websocket.urls")),
 ]
@@ -1,11 +1,28 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+import base64
+import tempfile
 from datetime import datetime
-from .models import OHLCV
-from .serializers import OHLCVSerializer
-from apps.trading_tools.indicators.zigzag import ZigZagCalculator
+from typing import Optional, Tuple
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from apps.data_scrape.storage import CopyIngestor, after_ingest
+from . import arrow, layout
+from .models import OHLCV, CandleSeries
+from .cache import candle_cache
+from .readers import CandleColumns, OHLCVReader, resample_base
+from .wire import CandleBinaryRenderer
+from apps.trading_tools.pivots import pivot_cache
 from apps.trading_tools.patterns.head_and_shoulders import HeadAndShouldersDetector
 from apps.trading_tools.strategies.simple_strategy import SimpleStrategy
 
@@ -14,16 +31,248 @@ class CoinListView(APIView):
     """возвращает список уникальных монет"""
 
     def get(self, request):
-        coins = OHLCV.objects.values_list("symbol", flat=True).distinct()
+        if layout.compact():
+            # в компактной раскладке пары перечислены в словаре ohlcv_series
+            coins = CandleSeries.objects.values_list("symbol", flat=True).distinct()
+        else:
+            coins = OHLCV.objects.values_list("symbol", flat=True).distinct()
         return Response(list(coins))
 
 
-class OHLCVPagination(LimitOffsetPagination):
+class OHLCVPagination(BasePagination):
+    """
+    keyset-пагинация по candle_time: курсор хранит время крайней свечи
+    страницы, следующая страница читается через индекс
+    (symbol, timeframe, candle_time DESC) без OFFSET и COUNT
+    """
+
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
     default_limit = 100
     max_limit = 1000
 
+    def get_limit(self, request) -> int:
+        """limit из запроса, не больше max_limit; неверный — по умолчанию"""
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit <= 0:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+    def decode_cursor(self, request) -> Optional[Tuple[str, int]]:
+        """курсор "a:<мс>" — свечи после времени, "b:<мс>" — до него"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, position = base64.urlsafe_b64decode(encoded).decode().split(":")
+            if direction not in ("a", "b"):
+                raise ValueError(direction)
+            return direction, int(position)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound("Неверный курсор")
+
+    def encode_cursor(self, direction: str, position: int) -> str:
+        token = base64.urlsafe_b64encode(f"{direction}:{position}".encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, token
+        )
+
+    def paginate_reader(
+        self, reader, symbol, timeframe, start, end, request
+    ) -> CandleColumns:
+        """
+        читает страницу; лишняя (limit + 1) свеча показывает,
+        есть ли страница дальше, вместо COUNT по всему диапазону
+        """
+        self.request = request
+        limit = self.get_limit(request)
+        cursor = self.decode_cursor(request)
+        self.has_cursor = cursor is not None
+        if cursor is None or cursor[0] == "a":
+            columns = reader.read(
+                symbol,
+                timeframe,
+                start,
+                end,
+                limit=limit + 1,
+                after=cursor[1] if cursor else None,
+            )
+            self.has_next = len(columns) > limit
+            self.has_previous = cursor is not None
+            self.columns = columns[:limit]
+        else:
+            columns = reader.read(
+                symbol,
+                timeframe,
+                start,
+                end,
+                limit=limit + 1,
+                latest=True,
+                before=cursor[1],
+            )
+            self.has_next = True
+            self.has_previous = len(columns) > limit
+            self.columns = columns[-limit:]
+        return self.columns
+
+    def paginate_latest(self, columns: CandleColumns, request) -> CandleColumns:
+        """страница последних свечей (из кеша): назад можно, вперед — нет"""
+        self.request = request
+        self.has_cursor = False
+        self.has_next = False
+        self.has_previous = bool(len(columns))
+        self.columns = columns
+        return columns
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next or not len(self.columns):
+            return None
+        return self.encode_cursor("a", int(self.columns.candle_time[-1]))
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous or not len(self.columns):
+            return None
+        return self.encode_cursor("b", int(self.columns.candle_time[0]))
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+
+class CandleCacheStatsView(APIView):
+    """счетчики попаданий/промахов кеша последних свечей"""
+
+    def get(self, request):
+        return Response(candle_cache.stats())
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class OHLCVExportView(APIView):
+    """
+    GET — выгрузка диапазона свечей потоком Arrow IPC (?output=arrow) или
+    Parquet (?output=parquet); POST — загрузка такого файла в гипертаблицу.
+    вне ATOMIC_REQUESTS: после загрузки обновляются агрегаты (CALL нельзя
+    выполнять в транзакции), а выгрузка не держит транзакцию на весь поток
+    """
+
+    def get_permissions(self):
+        # загрузка пишет в БД, выгрузка открыта как и остальной api
+        if self.request.method == "POST":
+            return [IsAdminUser()]
+        return [AllowAny()]
+
+    def perform_content_negotiation(self, request, force=False):
+        # ответ не проходит через рендереры: Accept с типом Arrow не дает 406
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, symbol_encoded: str, timeframe: str):
+        symbol = symbol_encoded.replace("-", "/")
+        output = request.query_params.get("output", "arrow")
+        if output not in arrow.FORMATS:
+            return Response(
+                {"detail": f"Неверный output. Допустимо: {', '.join(arrow.FORMATS)}"},
+                status=400,
+            )
+        try:
+            resample_base(timeframe)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        bounds = []
+        for name in ("start_date", "end_date"):
+            value = request.query_params.get(name)
+            if value:
+                try:
+                    value = datetime.fromisoformat(value)
+                except ValueError:
+                    return Response(
+                        {"detail": "Неверный формат даты. Используйте ISO 8601."},
+                        status=400,
+                    )
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+            bounds.append(value or None)
+
+        try:
+            chunks = arrow.stream_export(symbol, timeframe, output, *bounds)
+            # схема пишется до первой пачки: без pyarrow ошибка будет здесь
+            first = next(chunks)
+        except ImproperlyConfigured as e:
+            return Response({"detail": str(e)}, status=501)
+
+        def body():
+            yield first
+            yield from chunks
+
+        content = body()
+        if isinstance(request._request, ASGIRequest):
+            content = arrow.async_chunks(content)
+        content_type, extension = arrow.FORMATS[output]
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="{symbol_encoded}_{timeframe}.{extension}"'
+        )
+        return response
+
+    def post(self, request, symbol_encoded: str, timeframe: str) -> Response:
+        symbol = symbol_encoded.replace("-", "/")
+        if timeframe not in arrow.importable_timeframes():
+            return Response(
+                {
+                    "detail": f"Таймфрейм {timeframe} не загружается. "
+                    f"Допустимо: {', '.join(arrow.importable_timeframes())}"
+                },
+                status=400,
+            )
+        # тело копируется во временный файл: Parquet читается с произвольным доступом
+        with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as source:
+            for chunk in iter(lambda: request.stream.read(1024 * 1024), b""):
+                source.write(chunk)
+            source.seek(0)
+            try:
+                metadata = arrow.file_metadata(source)
+                # файл другой пары или таймфрейма не загружается под этим адресом
+                for name, expected in (("symbol", symbol), ("timeframe", timeframe)):
+                    if metadata.get(name, expected) != expected:
+                        detail = f"В файле {name}={metadata[name]}, ожидается {expected}"
+                        return Response({"detail": detail}, status=400)
+                stats = CopyIngestor().ingest_arrays(
+                    symbol, timeframe, arrow.import_batches(source)
+                )
+            except ImproperlyConfigured as e:
+                return Response({"detail": str(e)}, status=501)
+            except (ValueError, KeyError, OSError) as e:
+                # ArrowInvalid — подкласс ValueError, нет колонки — KeyError
+                return Response({"detail": f"Не удалось прочитать файл: {e}"}, status=400)
+        if stats.first_ts is not None:
+            after_ingest(symbol, timeframe, stats.first_ts, stats.last_ts)
+        return Response(
+            {
+                "rows": stats.rows,
+                "first_ts": stats.first_ts,
+                "last_ts": stats.last_ts,
+                "seconds": round(stats.seconds, 3),
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+# ограничение ?deviations=: каждое отклонение — отдельный ряд в кеше точек
+MAX_DEVIATIONS = 8
+
 
 class OHLCVAPIView(APIView):
+    # ?format=ohlcv или Accept: application/x-ohlcv — компактный бинарный ответ
+    renderer_classes = [JSONRenderer, CandleBinaryRenderer]
+
     def get(self, request, symbol_encoded: str, timeframe: str) -> Response:
         # Просто заменяем дефис на слэш — НИКАКОГО BASE64!
         symbol = symbol_encoded.replace("-", "/")
@@ -31,9 +280,61 @@ class OHLCVAPIView(APIView):
         start_date = request.query_params.get("start_date")
         end_date = request.query_params.get("end_date")
 
-        queryset = OHLCV.objects.filter(symbol=symbol, timeframe=timeframe).order_by(
-            "candle_time"
-        )
+        try:
+            # любой интервал, который собирается из хранимых таймфреймов
+            resample_base(timeframe)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        try:
+            deviation = float(request.query_params.get("deviation", 0.01))
+            deviations = [
+                float(d)
+                for d in request.query_params.get("deviations", "").split(",")
+                if d
+            ]
+        except ValueError:
+            return Response(
+                {"detail": "Неверный формат deviation. Используйте число, например 0.01"},
+                status=400,
+            )
+        if len(deviations) > MAX_DEVIATIONS:
+            return Response(
+                {"detail": f"Не больше {MAX_DEVIATIONS} значений в deviations"},
+                status=400,
+            )
+        if not all(0 < d < 1 for d in [deviation, *deviations]):
+            return Response(
+                {"detail": "deviation задается долей: 0 < deviation < 1"},
+                status=400,
+            )
+
+        latest = request.query_params.get("latest")
+        cursor = request.query_params.get(OHLCVPagination.cursor_query_param)
+        if latest and not (start_date and end_date) and not cursor:
+            # последние N свечей — горячий путь, отдается из кеша без БД
+            try:
+                latest = int(latest)
+            except ValueError:
+                latest = 0
+            if latest <= 0:
+                return Response(
+                    {"detail": "Неверный формат latest. Используйте целое число > 0"},
+                    status=400,
+                )
+            columns = candle_cache.get_latest(symbol, timeframe, latest)
+            if not len(columns):
+                return Response(
+                    {"detail": f"Данные для {symbol} {timeframe} не найдены"},
+                    status=404,
+                )
+            paginator = OHLCVPagination()
+            paginator.paginate_latest(columns, request)
+            return paginator.get_paginated_response(
+                self.build_results(
+                    request, symbol, timeframe, columns, deviation, deviations
+                )
+            )
 
         if start_date and end_date:
             if start_date > end_date:
@@ -41,55 +342,77 @@ class OHLCVAPIView(APIView):
             try:
                 start_date = datetime.fromisoformat(start_date)
                 end_date = datetime.fromisoformat(end_date)
-                queryset = queryset.filter(candle_time__range=(start_date, end_date))
             except ValueError:
                 return Response(
                     {"detail": "Неверный формат даты. Используйте ISO 8601."},
                     status=400,
                 )
+            if timezone.is_naive(start_date):
+                start_date = timezone.make_aware(start_date)
+            if timezone.is_naive(end_date):
+                end_date = timezone.make_aware(end_date)
+        else:
+            start_date = end_date = None
 
-        if not queryset.exists():
+        # страница по курсору; пустая первая страница заменяет проверку exists()
+        paginator = OHLCVPagination()
+        columns = paginator.paginate_reader(
+            OHLCVReader(), symbol, timeframe, start_date, end_date, request
+        )
+        if not len(columns) and not paginator.has_cursor:
             return Response(
                 {"detail": f"Данные для {symbol} {timeframe} не найдены"},
                 status=404,
             )
+        response_data = self.build_results(
+            request, symbol, timeframe, columns, deviation, deviations
+        )
 
-        paginator = OHLCVPagination()
-        result_page = paginator.paginate_queryset(queryset, request)
-        serializer = OHLCVSerializer(result_page, many=True)
-
-        candles = [
-            {
-                "candle_time": item["candle_time"],
-                "open": item["open"],
-                "high": item["high"],
-                "low": item["low"],
-                "close": item["close"],
-            }
-            for item in serializer.data
-        ]
+        # Возвращаем пагинированный ответ
+        return paginator.get_paginated_response(response_data)
 
+    @staticmethod
+    def build_results(
+        request,
+        symbol: str,
+        timeframe: str,
+        columns: CandleColumns,
+        deviation: float,
+        deviations: list,
+    ) -> dict:
+        """свечи страницы, zigzag и сигналы в формате поля results"""
+        # точки zigzag считаются по всей истории пары, а не по странице:
+        # окно получает свои точки и точку, с которой zigzag в него входит
+        start, end = int(columns.candle_time[0]), int(columns.candle_time[-1])
         try:
-            zigzag_calculator = ZigZagCalculator(deviation=0.01)
-            zigzag_points = zigzag_calculator.calculate(candles)
+            # все отклонения строятся одним проходом по свечам в одной записи кеша
+            windows = pivot_cache.windows(
+                symbol, timeframe, [deviation, *deviations], start, end
+            )
+            zigzag_points = windows[deviation]
+            sweep = windows if deviations else None
             pattern_detector = HeadAndShouldersDetector()
             pattern_detected = pattern_detector.detect(zigzag_points)
             strategy_executor = SimpleStrategy()
             signal = strategy_executor.execute(zigzag_points)
         except Exception as e:
             zigzag_points = []
+            sweep = None
             pattern_detected = False
             signal = None
 
-        # Создаем ответ вручную, используя пагинацию
+        binary = isinstance(request.accepted_renderer, CandleBinaryRenderer)
         response_data = {
-            "ohlcv": serializer.data,
+            # бинарный рендерер сам упаковывает колонки, словари не нужны
+            "ohlcv": columns if binary else columns.to_records(symbol, timeframe),
             "zigzag": zigzag_points,
             "signals": {
                 "pattern": "head and shoulders" if pattern_detected else None,
                 "trade_signal": signal,
             },
         }
-
-        # Возвращаем пагинированный ответ
-        return paginator.get_paginated_response(response_data)
+        if sweep is not None:
+            response_data["zigzag_sweep"] = {
+                str(dev): points for dev, points in sweep.items()
+            }
+        return response_data
@@ -0,0 +1,126 @@
+# компактный бинарный формат свечей для REST и WebSocket.
+#
+# кадр: заголовок 16 байт, метаданные json, затем колонки little-endian
+#   magic "OHLC" | version u8 | kind u8 | columns u16 | rows u32 | meta_len u32
+#   метаданные (json utf-8), дополненные пробелами до кратного 8 байтам
+#   candle_time int64[rows] (мс UTC), open/high/low/close/volume float64[rows]
+# колонки выровнены по 8 байтам, поэтому в браузере читаются без копирования
+# через new BigInt64Array / Float64Array поверх того же ArrayBuffer
+import json
+import struct
+from typing import Dict, Optional, Tuple
+import numpy as np
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .readers import CANDLE_FIELDS, CandleColumns
+
+MAGIC = b"OHLC"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHII")
+
+# вид кадра
+KIND_HISTORY = 0  # страница истории REST
+KIND_SNAPSHOT = 1  # снимок при подписке
+KIND_UPDATE = 2  # обновление свечей в реальном времени
+
+MEDIA_TYPE = "application/x-ohlcv"
+# подпротокол WebSocket для бинарных кадров
+SUBPROTOCOL = "ohlcv.binary.v1"
+
+
+def encode_candles(
+    columns: CandleColumns, kind: int = KIND_HISTORY, meta: Optional[Dict] = None
+) -> bytes:
+    meta_bytes = b""
+    if meta:
+        meta_bytes = json.dumps(meta, separators=(",", ":")).encode()
+        meta_bytes += b" " * (-len(meta_bytes) % 8)
+    rows = len(columns)
+    values = np.empty((len(CANDLE_FIELDS) - 1, rows), dtype="<f8")
+    for row, (name, _) in enumerate(CANDLE_FIELDS[1:]):
+        values[row] = getattr(columns, name)
+    header = HEADER.pack(MAGIC, VERSION, kind, len(CANDLE_FIELDS), rows, len(meta_bytes))
+    return (
+        header
+        + meta_bytes
+        + columns.candle_time.astype("<i8").tobytes()
+        + values.tobytes()
+    )
+
+
+def encode_rows(ohlcv_data, kind: int = KIND_UPDATE) -> bytes:
+    """
+    свечи ccxt [ts, open, high, low, close, volume] одним кадром.
+    для потока обновлений по одной-две свечи struct быстрее numpy
+    """
+    rows = len(ohlcv_data)
+    columns = list(zip(*ohlcv_data)) if rows else [()] * len(CANDLE_FIELDS)
+    return HEADER.pack(
+        MAGIC, VERSION, kind, len(CANDLE_FIELDS), rows, 0
+    ) + struct.pack(
+        f"<{rows}q{rows * (len(CANDLE_FIELDS) - 1)}d",
+        *map(int, columns[0]),
+        *[value for column in columns[1:] for value in column],
+    )
+
+
+def decode_rows(payload: bytes) -> Tuple[int, list]:
+    """кадр обновления в строки [ts, open, high, low, close, volume]"""
+    magic, version, kind, column_count, rows, meta_len = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("неизвестный формат кадра свечей")
+    values = struct.unpack_from(
+        f"<{rows}q{rows * (column_count - 1)}d", payload, HEADER.size + meta_len
+    )
+    return kind, [list(values[i::rows]) for i in range(rows)]
+
+
+def decode_candles(payload: bytes) -> Tuple[int, CandleColumns, Dict]:
+    """обратная операция: (kind, колонки, метаданные)"""
+    view = memoryview(payload)
+    magic, version, kind, column_count, rows, meta_len = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("неизвестный формат кадра свечей")
+    if column_count != len(CANDLE_FIELDS):
+        raise ValueError(f"ожидалось {len(CANDLE_FIELDS)} колонок, получено {column_count}")
+    offset = HEADER.size + meta_len
+    meta = json.loads(bytes(view[HEADER.size : offset])) if meta_len else {}
+    times = np.frombuffer(view, dtype="<i8", count=rows, offset=offset)
+    values = np.frombuffer(
+        view, dtype="<f8", count=(column_count - 1) * rows, offset=offset + rows * 8
+    ).reshape(column_count - 1, rows)
+    columns = CandleColumns(
+        candle_time=times,
+        **{name: values[row] for row, (name, _) in enumerate(CANDLE_FIELDS[1:])},
+    )
+    return kind, columns, meta
+
+
+class CandleBinaryRenderer(BaseRenderer):
+    """
+    рендерер DRF для ?format=ohlcv или Accept: application/x-ohlcv.
+    ждет в data колонки под ключом "ohlcv", остальное уходит в метаданные
+    """
+
+    media_type = MEDIA_TYPE
+    format = "ohlcv"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        results = data.get("results", data)
+        columns = results.get("ohlcv") if isinstance(results, dict) else None
+        if not isinstance(columns, CandleColumns):
+            # ошибки (400/404) отдаются json даже в бинарном режиме — и с типом
+            # json: Content-Type ответа уже выставлен по этому рендереру
+            json_renderer = JSONRenderer()
+            response = (renderer_context or {}).get("response")
+            if response is not None:
+                response["Content-Type"] = json_renderer.media_type
+            return json_renderer.render(data)
+        meta = {key: value for key, value in results.items() if key != "ohlcv"}
+        if results is not data:
+            # поля пагинации (count, next, previous) рядом с results
+            meta.update({key: value for key, value in data.items() if key != "results"})
+        return encode_candles(columns, KIND_HISTORY, meta)
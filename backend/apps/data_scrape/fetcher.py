@@ -1,8 +1,9 @@
 import asyncio
 import ccxt.pro as ccxt
 from datetime import datetime
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Tuple
 from .interfaces import IDataFetcher
+from .scheduler import PRIORITY_HISTORY, RequestScheduler
 import logging
 
 logging.basicConfig(
@@ -11,36 +12,73 @@ logging.basicConfig(
 
 
 class RestAPIFetcher(IDataFetcher):
-    def __init__(self, exchange_name: str = "binance") -> None:
+    def __init__(
+        self,
+        exchange_name: str = "binance",
+        max_concurrency: int = 4,
+        ohlcv_weight: float = 1,
+    ) -> None:
         if exchange_name not in ccxt.exchanges:
             raise ValueError(f"Exchange '{exchange_name}' is not supported by ccxt.")
         self.exchange = getattr(ccxt, exchange_name)()
+        self.max_retries = 5
+        # лимиты соблюдает общий планировщик биржи, а не каждый цикл отдельно
+        self.scheduler = RequestScheduler.for_exchange(self.exchange, max_concurrency)
+        self.exchange.enableRateLimit = False
+        self.ohlcv_weight = ohlcv_weight
 
     async def fetch_historical_data(
         self, symbol: str, timeframe: str, start_date: int, end_date: int
     ) -> List[List[float]]:
         all_candles = []
+        async for page in self.iter_historical_data(
+            symbol, timeframe, start_date, end_date
+        ):
+            all_candles.extend(page)
+        return all_candles
+
+    async def iter_historical_data(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_date: int,
+        end_date: int,
+        priority: int = PRIORITY_HISTORY,
+    ) -> AsyncIterator[List[List[float]]]:
+        """
+        Отдает историю постранично по мере загрузки. Ошибки повторяются с
+        задержкой, а после max_retries пробрасываются, а не обрывают историю молча.
+        """
         since = start_date
+        retries = 0
 
         logging.info(f"Загрузка истории для {symbol}...")
 
         while since < end_date:
             try:
-                ohlcv_list = await self.exchange.fetch_ohlcv(symbol, timeframe, since)
-
-                if not ohlcv_list:
-                    break
-
-                all_candles.extend(ohlcv_list)
-                since = ohlcv_list[-1][0] + 1
-
-                await asyncio.sleep(self.exchange.rateLimit / 1000)
-
+                async with self.scheduler.slot(self.ohlcv_weight, priority):
+                    ohlcv_list = await self.exchange.fetch_ohlcv(
+                        symbol, timeframe, since
+                    )
             except Exception as e:
-                logging.error(f"Ошибка при получении истории {symbol}: {e}")
+                retries += 1
+                logging.error(
+                    f"Ошибка при получении истории {symbol}: {e}. Попытка {retries}/{self.max_retries}"
+                )
+                if retries > self.max_retries:
+                    raise
+                await asyncio.sleep(min(retries * 5, 60))
+                continue
+
+            retries = 0
+            if not ohlcv_list:
                 break
 
-        return all_candles
+            since = ohlcv_list[-1][0] + 1
+            # страница может выйти за конец интервала (например, при догрузке дыры)
+            ohlcv_list = [c for c in ohlcv_list if c[0] < end_date]
+            if ohlcv_list:
+                yield ohlcv_list
 
     async def fetch_realtime_data(self, symbol, timeframe):
         raise NotImplementedError("RestAPIFetcher не поддерживает real-time данные")
@@ -66,6 +104,73 @@ class WebSocketDataFetcher(IDataFetcher):
     async def fetch_historical_data(self, *args, **kwargs):
         raise NotImplementedError("WebSocketFetcher не поддерживает историю.")
 
+    @property
+    def supports_multiplex(self) -> bool:
+        return bool(self.exchange.has.get("watchOHLCVForSymbols"))
+
+    async def watch_many(
+        self, pairs: List[Tuple[str, str]], batch_size: int = 200
+    ) -> AsyncIterator[Tuple[str, str, List[List[float]]]]:
+        """
+        Подписывается сразу на много пар (symbol, timeframe) через
+        watch_ohlcv_for_symbols: одна задача на пачку подписок вместо задачи
+        на каждую пару. Отдает (symbol, timeframe, свечи) по мере обновлений,
+        включая обновления формирующейся свечи.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=10_000)
+        tasks = [
+            asyncio.create_task(
+                self._watch_batch(pairs[i : i + batch_size], queue)
+            )
+            for i in range(0, len(pairs), batch_size)
+        ]
+        logging.info(
+            f"Мультиплексированная подписка: {len(pairs)} пар в {len(tasks)} пачках"
+        )
+        try:
+            while True:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _watch_batch(
+        self, batch: List[Tuple[str, str]], queue: asyncio.Queue
+    ) -> None:
+        subscriptions = [[symbol, timeframe] for symbol, timeframe in batch]
+        retry_delay = 5
+        max_retries = 10
+        retries = 0
+
+        while True:
+            try:
+                update = await self.exchange.watch_ohlcv_for_symbols(subscriptions)
+                retries = 0
+                retry_delay = 5
+            except Exception as e:
+                retries += 1
+                logging.error(f"Ошибка мультиплексированной подписки OHLCV: {e}")
+                if retries > max_retries:
+                    logging.error("Превышено количество попыток для пачки подписок.")
+                    await queue.put(e)
+                    return
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60)
+                continue
+
+            for symbol, by_timeframe in update.items():
+                for timeframe, ohlcv_list in by_timeframe.items():
+                    key = f"{symbol}_{timeframe}"
+                    last_ts = self.last_saved.get(key, -1)
+                    # >= : обновление текущей свечи тоже передается дальше
+                    candles = [c for c in ohlcv_list if c[0] >= last_ts]
+                    if candles:
+                        self.last_saved[key] = candles[-1][0]
+                        await queue.put((symbol, timeframe, candles))
+
     async def fetch_realtime_data(
         self, symbol: str, timeframe: str
     ) -> List[List[float]]:
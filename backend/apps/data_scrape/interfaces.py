@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 
 
 class IDataFetcher(ABC):
@@ -10,6 +10,19 @@ class IDataFetcher(ABC):
         """Абстрактный метод для получения исторических данных."""
         pass
 
+    async def iter_historical_data(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_date: int,
+        end_date: int,
+        priority: int = 0,
+    ) -> AsyncIterator[List[List[float]]]:
+        """Постраничная загрузка истории; по умолчанию одна страница целиком."""
+        data = await self.fetch_historical_data(symbol, timeframe, start_date, end_date)
+        if data:
+            yield data
+
     @abstractmethod
     async def fetch_realtime_data(
         self, symbol: str, timeframe: str
@@ -26,9 +39,54 @@ class IDataStorage(ABC):
         """Абстрактный метод для сохранения исторических данных."""
         pass
 
+    @abstractmethod
+    async def finish_historical_data(
+        self, symbol: str, timeframe: str, first_ts: int, last_ts: int
+    ) -> None:
+        """Абстрактный метод: вызывается один раз после загрузки интервала истории."""
+        pass
+
     @abstractmethod
     async def save_realtime_data(
         self, symbol: str, timeframe: str, ohlcv_data: List[List[float]]
     ) -> None:
         """Абстрактный метод для сохранения данных в реальном времени."""
         pass
+
+    @abstractmethod
+    async def publish_realtime_data(
+        self, symbol: str, timeframe: str, ohlcv_data: List[List[float]]
+    ) -> None:
+        """Абстрактный метод: рассылка свечей подписчикам без записи в БД."""
+        pass
+
+    @abstractmethod
+    async def load_recent_data(
+        self, symbol: str, timeframe: str, since: int
+    ) -> List[List[float]]:
+        """Абстрактный метод: сохраненные свечи начиная с since (мс)."""
+        pass
+
+    @abstractmethod
+    async def get_fetch_cursor(self, symbol: str, timeframe: str) -> Optional[int]:
+        """Абстрактный метод: время (мс) последней сохраненной исторической свечи."""
+        pass
+
+    @abstractmethod
+    async def set_fetch_cursor(self, symbol: str, timeframe: str, last_ts: int) -> None:
+        """Абстрактный метод: запоминает время последней сохраненной свечи."""
+        pass
+
+    @abstractmethod
+    async def get_coverage(
+        self, symbol: str, timeframe: str, start_date: int, end_date: int
+    ) -> Tuple[Optional[int], Optional[int], int]:
+        """Абстрактный метод: первая и последняя свеча (мс) в [start, end) и их число."""
+        pass
+
+    @abstractmethod
+    async def find_gaps(
+        self, symbol: str, timeframe: str, first: int, last: int, step: int
+    ) -> List[Tuple[int, int]]:
+        """Абстрактный метод: соседние свечи в [first, last], между которыми больше step мс."""
+        pass
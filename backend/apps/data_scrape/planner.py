@@ -0,0 +1,48 @@
+import logging
+from typing import List, Tuple
+import ccxt
+from .interfaces import IDataStorage
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillPlanner:
+    """
+    сравнивает нужный диапазон истории с тем, что уже лежит в хранилище,
+    и возвращает только недостающие интервалы [start, end) в мс
+    """
+
+    def __init__(self, storage: IDataStorage) -> None:
+        self.storage = storage
+
+    async def plan(
+        self, symbol: str, timeframe: str, start_date: int, end_date: int
+    ) -> List[Tuple[int, int]]:
+        step = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+        # сначала дешевая сводка: границы покрытия и число свечей
+        first, last, count = await self.storage.get_coverage(
+            symbol, timeframe, start_date, end_date
+        )
+        if not count:
+            return [(start_date, end_date)]
+
+        missing = []
+        if first - start_date >= step:
+            missing.append((start_date, first))
+
+        # внутренние дыры ищем, только если свечей меньше, чем должно быть
+        if count < (last - first) // step + 1:
+            gaps = await self.storage.find_gaps(symbol, timeframe, first, last, step)
+            missing.extend((prev_ms + step, next_ms) for prev_ms, next_ms in gaps)
+
+        if end_date - last >= step:
+            # последняя свеча могла сохраниться еще формирующейся: она
+            # скачивается заново и перезаписывается (история пишется upsert)
+            missing.append((last, end_date))
+
+        logger.info(
+            f"План догрузки {symbol} {timeframe}: {len(missing)} интервалов, "
+            f"в базе {count} свечей"
+        )
+        return missing
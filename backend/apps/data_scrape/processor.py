@@ -1,23 +1,52 @@
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
+import ccxt
 from .interfaces import IDataFetcher, IDataStorage
+from .planner import BackfillPlanner
+from .scheduler import PRIORITY_HISTORY, PRIORITY_REALTIME
+from ..api.readers import BUCKET_ORIGIN
+from ..trading_tools.resample import IncrementalResampler, timeframe_ms
+from ..trading_tools.tracker import ZigZagTracker
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
 
 class DataProcessor:
-    def __init__(self, fetcher: IDataFetcher, storage: IDataStorage) -> None:
+    def __init__(
+        self,
+        fetcher: IDataFetcher,
+        storage: IDataStorage,
+        zigzag_tracker: Optional[ZigZagTracker] = None,
+        planner: Optional[BackfillPlanner] = None,
+        batch_rows: int = 10_000,
+        max_pending_pages: int = 4,
+        recent_window_ms: int = 24 * 60 * 60 * 1000,
+        derived: Optional[Dict[str, List[str]]] = None,
+    ) -> None:
         self.fetcher = fetcher
         self.storage = storage
+        self.zigzag_tracker = zigzag_tracker
+        self.planner = planner
+        self.batch_rows = batch_rows
+        self.max_pending_pages = max_pending_pages
+        self.recent_window_ms = recent_window_ms
+        # загружаемый таймфрейм -> старшие, которые в реальном времени
+        # сворачиваются из него (в БД их строят агрегаты)
+        self.derived = derived or {}
+        self.resamplers: Dict[Tuple[str, str], IncrementalResampler] = {}
+        # пары, в которые догружены свечи старше учтенных zigzag
+        self.stale_pivots: Set[Tuple[str, str]] = set()
 
     async def process_historical_data(
         self, symbols: List[str], timeframes: List[str]
     ) -> None:
         """
         Загружает и сохраняет исторические данные за последний год (на текущий 2026 год).
+        С планировщиком запрашиваются только интервалы, которых нет в базе.
         """
         now = datetime.now()
         one_year_ago = int((now - timedelta(days=365)).timestamp() * 1000)
@@ -35,37 +64,173 @@ class DataProcessor:
         if tasks:
             await asyncio.gather(*tasks)
 
+        scheduler = getattr(self.fetcher, "scheduler", None)
+        if scheduler:
+            logger.info(f"Метрики планировщика запросов: {scheduler.metrics()}")
+
     async def _process_historical_single(
         self, symbol: str, timeframe: str, start_date: int, end_date: int
     ) -> None:
         try:
-            logger.info(
-                f"Запуск загрузки истории: {symbol} {timeframe} (start_date={start_date}, end_date={end_date})"
-            )
-            data = await self.fetcher.fetch_historical_data(
-                symbol, timeframe, start_date, end_date
-            )
+            if self.planner:
+                # качаем только то, чего нет в базе. планировщик заменяет
+                # курсор загрузки: покрытие он берет из самих свечей, поэтому
+                # курсор с ним не читается и не пишется
+                ranges = await self.planner.plan(symbol, timeframe, start_date, end_date)
+            else:
+                cursor = await self.storage.get_fetch_cursor(symbol, timeframe)
+                if cursor is not None and cursor >= start_date:
+                    # продолжаем с последней сохраненной свечи, а не качаем год заново
+                    start_date = cursor + 1
+                ranges = [(start_date, end_date)]
+
+            # интервалы пары идут по времени: потоковый zigzag принимает свечи
+            # только вперед. свежие дыры опережают глубокую историю через
+            # приоритет в планировщике запросов (между парами)
+            recent = end_date - self.recent_window_ms
+            ranges.sort()
 
-            if data:
-                await self.storage.save_historical_data(symbol, timeframe, data)
+            saved = 0
+            try:
+                for range_start, range_end in ranges:
+                    logger.info(
+                        f"Запуск загрузки истории: {symbol} {timeframe} (start_date={range_start}, end_date={range_end})"
+                    )
+                    priority = (
+                        PRIORITY_REALTIME if range_end >= recent else PRIORITY_HISTORY
+                    )
+                    saved += await self._fetch_range(
+                        symbol, timeframe, range_start, range_end, priority
+                    )
+            finally:
+                # старые свечи zigzag пропустил: точки пары строятся заново
+                # один раз после всех интервалов (и после ошибки — что успели)
+                if (symbol, timeframe) in self.stale_pivots:
+                    self.stale_pivots.discard((symbol, timeframe))
+                    await self.zigzag_tracker.rebuild(symbol, timeframe)
+
+            if saved:
                 logger.info(
-                    f"Сохранено {len(data)} исторических свечей для {symbol} {timeframe}"
+                    f"Сохранено {saved} исторических свечей для {symbol} {timeframe}"
                 )
             else:
-                logger.warning(
-                    f"Данные не найдены для {symbol} {timeframe}. Повторная попытка через 5 секунд..."
-                )
-                await asyncio.sleep(5)
+                logger.warning(f"Новых данных нет для {symbol} {timeframe}")
 
         except Exception as e:
             logger.error(f"Ошибка при обработке истории {symbol} {timeframe}: {e}")
 
+    async def _fetch_range(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_date: int,
+        end_date: int,
+        priority: int = PRIORITY_HISTORY,
+    ) -> int:
+        # ограниченная очередь страниц: загрузка ждет, пока запись не догонит
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending_pages)
+        producer = asyncio.create_task(
+            self._produce_pages(
+                queue, symbol, timeframe, start_date, end_date, priority
+            )
+        )
+        try:
+            saved = await self._consume_pages(queue, symbol, timeframe)
+            await producer
+        finally:
+            if not producer.done():
+                # запись остановилась с ошибкой: загрузку отменяем и дожидаемся
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+        return saved
+
+    async def _produce_pages(
+        self,
+        queue: asyncio.Queue,
+        symbol: str,
+        timeframe: str,
+        start_date: int,
+        end_date: int,
+        priority: int,
+    ) -> None:
+        try:
+            async for page in self.fetcher.iter_historical_data(
+                symbol, timeframe, start_date, end_date, priority=priority
+            ):
+                await queue.put(page)
+        except asyncio.CancelledError:
+            # отменяют, когда потребитель уже остановлен: место в очереди
+            # никто не освободит, поэтому признак конца не кладем
+            raise
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _consume_pages(
+        self, queue: asyncio.Queue, symbol: str, timeframe: str
+    ) -> int:
+        """
+        копит страницы до batch_rows свечей, сохраняет их и двигает курсор
+        (без планировщика). курсор — последняя закрытая свеча: формирующаяся
+        при продолжении загрузки скачивается заново и перезаписывается
+        """
+        saved = 0
+        first_ts = last_ts = None
+        key = (symbol, timeframe)
+        batch: List[List[float]] = []
+        try:
+            while True:
+                page = await queue.get()
+                if page is not None:
+                    batch.extend(page)
+                if batch and (page is None or len(batch) >= self.batch_rows):
+                    await self.storage.save_historical_data(symbol, timeframe, batch)
+                    low = int(min(data[0] for data in batch))
+                    high = int(max(data[0] for data in batch))
+                    tracker = self.zigzag_tracker
+                    if tracker and key not in self.stale_pivots:
+                        if await tracker.behind(symbol, timeframe, low):
+                            self.stale_pivots.add(key)
+                        else:
+                            await tracker.update(symbol, timeframe, batch)
+                    if self.planner is None:
+                        await self._advance_cursor(symbol, timeframe, batch)
+                    first_ts = low if first_ts is None else min(first_ts, low)
+                    last_ts = high if last_ts is None else max(last_ts, high)
+                    saved += len(batch)
+                    batch = []
+                if page is None:
+                    return saved
+        finally:
+            # агрегаты и прочее — один раз на интервал, а не на каждую пачку;
+            # сохраненное до ошибки тоже учитывается
+            if first_ts is not None:
+                await self.storage.finish_historical_data(
+                    symbol, timeframe, first_ts, last_ts
+                )
+
+    async def _advance_cursor(
+        self, symbol: str, timeframe: str, batch: List[List[float]]
+    ) -> None:
+        width = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        closed_before = int(time.time() * 1000) - width
+        closed = [data[0] for data in batch if data[0] <= closed_before]
+        if closed:
+            await self.storage.set_fetch_cursor(symbol, timeframe, max(closed))
+
     async def process_realtime_data(
         self, symbols: List[str], timeframes: List[str]
     ) -> None:
         """
         Загружает и сохраняет данные в реальном времени.
+        Если биржа умеет watch_ohlcv_for_symbols, все пары идут через один диспетчер.
         """
+        if getattr(self.fetcher, "supports_multiplex", False):
+            pairs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+            await self._process_realtime_multiplexed(pairs)
+            return
+
         tasks = [
             asyncio.create_task(self._process_realtime_single(symbol, timeframe))
             for symbol in symbols
@@ -74,6 +239,27 @@ class DataProcessor:
         if tasks:
             await asyncio.gather(*tasks)
 
+    async def _process_realtime_multiplexed(self, pairs) -> None:
+        """единый диспетчер: раздает обновления всех пар в хранилище и индикаторы"""
+        max_retries = 10
+        retries = 0
+
+        while retries < max_retries:
+            try:
+                async for symbol, timeframe, data in self.fetcher.watch_many(pairs):
+                    await self._handle_realtime(symbol, timeframe, data)
+                    retries = 0
+            except Exception as e:
+                retries += 1
+                logger.error(
+                    f"Ошибка мультиплексированного WebSocket: {e}. Попытка {retries}/{max_retries}"
+                )
+                await asyncio.sleep(min(retries * 5, 60))
+
+        logger.error(
+            f"Мультиплексированный поток остановлен после {max_retries} ошибок."
+        )
+
     async def _process_realtime_single(self, symbol: str, timeframe: str) -> None:
         logger.info(f"Запуск WebSocket стрима: {symbol} {timeframe}")
         max_retries = 10
@@ -83,9 +269,7 @@ class DataProcessor:
             try:
                 data = await self.fetcher.fetch_realtime_data(symbol, timeframe)
                 if data:
-                    await self.storage.save_realtime_data(
-                        symbol, timeframe, data
-                    )  # Универсальный метод
+                    await self._handle_realtime(symbol, timeframe, data)
                     retries = 0  # СБРОС СЧЕТЧИКА после успеха
                     logger.debug(f"Обновлены данные для {symbol}")
             except Exception as e:
@@ -98,3 +282,35 @@ class DataProcessor:
         logger.error(
             f"Поток {symbol} {timeframe} окончательно остановлен после {max_retries} ошибок."
         )
+
+    async def _handle_realtime(
+        self, symbol: str, timeframe: str, data: List[List[float]]
+    ) -> None:
+        """сохраняет обновление и раздает его (и свернутые из него свечи) дальше"""
+        await self.storage.save_realtime_data(symbol, timeframe, data)
+        if self.zigzag_tracker:
+            await self.zigzag_tracker.update(symbol, timeframe, data)
+        for derived in self.derived.get(timeframe, ()):
+            resampler = await self._resampler(symbol, timeframe, derived, data)
+            bars = resampler.update(data)
+            await self.storage.publish_realtime_data(symbol, derived, bars)
+            if self.zigzag_tracker:
+                await self.zigzag_tracker.update(symbol, derived, bars)
+
+    async def _resampler(
+        self, symbol: str, timeframe: str, derived: str, data: List[List[float]]
+    ) -> IncrementalResampler:
+        """
+        свертка старшего таймфрейма; при создании в нее загружаются уже
+        сохраненные свечи текущего интервала, иначе его open и объем
+        считались бы только с момента запуска
+        """
+        key = (symbol, derived)
+        resampler = self.resamplers.get(key)
+        if resampler is None:
+            resampler = IncrementalResampler(timeframe_ms(derived), BUCKET_ORIGIN)
+            ts = int(data[0][0])
+            since = ts - (ts - BUCKET_ORIGIN) % resampler.interval
+            resampler.update(await self.storage.load_recent_data(symbol, timeframe, since))
+            self.resamplers[key] = resampler
+        return resampler
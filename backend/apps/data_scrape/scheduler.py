@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# приоритеты запросов: меньше — раньше
+PRIORITY_REALTIME = 0  # догрузка свежих дыр рядом с текущим временем
+PRIORITY_HISTORY = 10  # глубокая история
+
+
+class RequestScheduler:
+    """
+    общий для всех загрузчиков одной биржи планировщик запросов:
+    token bucket по весу запросов, очередь с приоритетами и лимит
+    одновременных запросов. все циклы загрузки берут слот через slot()
+    """
+
+    _registry: Dict[str, "RequestScheduler"] = {}
+
+    def __init__(
+        self,
+        weight_per_second: float,
+        burst: Optional[float] = None,
+        max_concurrency: int = 4,
+    ) -> None:
+        self.rate = weight_per_second
+        self.capacity = burst if burst is not None else weight_per_second
+        self.max_concurrency = max_concurrency
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+        self._waiters: List[list] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # метрики
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.throttle_seconds = 0.0
+
+    @classmethod
+    def for_exchange(cls, exchange, max_concurrency: int = 4) -> "RequestScheduler":
+        """
+        один планировщик на биржу; бюджет берется из rateLimit ccxt
+        (мс на единицу веса)
+        """
+        scheduler = cls._registry.get(exchange.id)
+        if scheduler is None:
+            scheduler = cls(
+                weight_per_second=1000 / exchange.rateLimit,
+                max_concurrency=max_concurrency,
+            )
+            cls._registry[exchange.id] = scheduler
+        return scheduler
+
+    @asynccontextmanager
+    async def slot(self, weight: float = 1, priority: int = PRIORITY_HISTORY):
+        await self.acquire(weight, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, weight: float = 1, priority: int = PRIORITY_HISTORY):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._counter), weight, future])
+        self.queued += 1
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # слот уже выдан, но ждущий отменен — возвращаем его
+                self.release()
+            raise
+        finally:
+            self.queued -= 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.completed += 1
+        self._wakeup.set()
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "throttle_seconds": round(self.throttle_seconds, 3),
+        }
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def _dispatch(self) -> None:
+        while True:
+            # выкидываем отмененных ждущих
+            while self._waiters and self._waiters[0][3].done():
+                heapq.heappop(self._waiters)
+
+            if not self._waiters or self.in_flight >= self.max_concurrency:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            _, _, weight, future = self._waiters[0]
+            self._refill()
+            # запрос тяжелее всего ведра ждет, пока ведро не наполнится целиком
+            needed = min(weight, self.capacity)
+            if self.tokens < needed:
+                delay = (needed - self.tokens) / self.rate
+                self.throttle_seconds += delay
+                await asyncio.sleep(delay)
+                continue
+
+            heapq.heappop(self._waiters)
+            self.tokens -= weight
+            self.in_flight += 1
+            future.set_result(None)
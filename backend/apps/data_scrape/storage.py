@@ -1,70 +1,433 @@
-from decimal import Decimal
-from django.db import connection
+import asyncio
+import io
+import logging
+import time
+from dataclasses import dataclass
+from itertools import islice
+import numpy as np
+from django.db import connection, transaction
 from asgiref.sync import sync_to_async
-from datetime import datetime
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 from .interfaces import IDataStorage
-from ..api.models import OHLCV
-from django.utils import timezone
+from ..api import aggregates, layout
+from ..api.models import FetchCursor
+from ..api.cache import candle_cache
+from ..api.pgcopy import encode_binary_copy, ms_to_pg_timestamp
+from ..api.readers import CANDLE_FIELDS, OHLCVReader
+from ..trading_tools.pivots import pivot_cache
 
+logger = logging.getLogger(__name__)
 
-class DatabaseStorage(IDataStorage):
-    @sync_to_async
-    def save_historical_data(
-        self, symbol: str, timeframe: str, ohlcv_data: [List[float]]
-    ) -> None:
-        """
-        Сохраняет исторические данные через bulk_create.
-        """
-        candles = [
-            OHLCV(
-                symbol=symbol,
-                timeframe=timeframe,
-                candle_time=timezone.make_aware(datetime.fromtimestamp(data[0] / 1000)),
-                open=Decimal(str(data[1])),
-                high=Decimal(str(data[2])),
-                low=Decimal(str(data[3])),
-                close=Decimal(str(data[4])),
-                volume=Decimal(str(data[5])),
-            )
-            for data in ohlcv_data
-        ]
-        OHLCV.objects.bulk_create(candles, ignore_conflicts=True)
+# колонки промежуточной таблицы для COPY (symbol/timeframe передаются при слиянии)
+STAGING_FIELDS = (
+    ("candle_time", "i8"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+)
 
-    @sync_to_async
-    def save_realtime_data(
-        self, symbol: str, timeframe: str, ohlcv_data: [List[float]]
+
+@dataclass
+class IngestStats:
+    rows: int
+    seconds: float
+    # диапазон времени загруженных свечей, мс
+    first_ts: Optional[int] = None
+    last_ts: Optional[int] = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class CopyIngestor(layout.CandleTable):
+    """
+    потоковая загрузка свечей в ohlcv или ohlcv_compact (apps.api.layout):
+    пачки фиксированного размера уходят через COPY FROM STDIN (binary) во
+    временную таблицу и сливаются в гипертаблицу одним INSERT ... ON CONFLICT.
+    память ограничена размером пачки.
+
+    upsert=True — уже сохраненные свечи перезаписываются: так исправляется
+    свеча, которая при прошлой загрузке еще формировалась
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 50_000,
+        table: Optional[str] = None,
+        compact: Optional[bool] = None,
+        upsert: bool = False,
     ) -> None:
+        super().__init__(table, compact)
+        self.batch_size = batch_size
+        self.upsert = upsert
+
+    def ingest(
+        self, symbol: str, timeframe: str, ohlcv_data: Iterable[List[float]]
+    ) -> IngestStats:
+        iterator = iter(ohlcv_data)
+
+        def batches():
+            while True:
+                batch = list(islice(iterator, self.batch_size))
+                if not batch:
+                    return
+                yield np.array([data[:6] for data in batch], dtype=np.float64)
+
+        return self.ingest_arrays(symbol, timeframe, batches())
+
+    def ingest_arrays(
+        self, symbol: str, timeframe: str, batches: Iterable[np.ndarray]
+    ) -> IngestStats:
         """
-        Сохраняет данные в реальном времени через сырой SQL.
+        колоночный вход без списков ccxt: пачки — матрицы (свечи × 6) float64
+        с временем в мс, open, high, low, close, volume
         """
+        started = time.perf_counter()
+        rows = 0
+        first_ts = last_ts = None
+
         with connection.cursor() as cursor:
-            for data in ohlcv_data:
-                timestamp_ms = data[0]
-                candle_time = timezone.make_aware(
-                    datetime.fromtimestamp(data[0] / 1000)
+            cursor.execute(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS ohlcv_staging (
+                    candle_time timestamptz NOT NULL,
+                    open float8 NOT NULL,
+                    high float8 NOT NULL,
+                    low float8 NOT NULL,
+                    close float8 NOT NULL,
+                    volume float8 NOT NULL
+                ) ON COMMIT DELETE ROWS;
+            """
+            )
+            for values in batches:
+                if not len(values):
+                    continue
+                rows += self._copy_batch(cursor, symbol, timeframe, values)
+                low, high = values[:, 0].min(), values[:, 0].max()
+                first_ts = low if first_ts is None else min(first_ts, low)
+                last_ts = high if last_ts is None else max(last_ts, high)
+
+        stats = IngestStats(
+            rows=rows,
+            seconds=time.perf_counter() - started,
+            first_ts=int(first_ts) if first_ts is not None else None,
+            last_ts=int(last_ts) if last_ts is not None else None,
+        )
+        logger.info(
+            f"COPY {symbol} {timeframe}: {stats.rows} строк за {stats.seconds:.2f} с "
+            f"({stats.rows_per_sec:.0f} строк/с)"
+        )
+        return stats
+
+    def _copy_batch(
+        self, cursor, symbol: str, timeframe: str, values: np.ndarray
+    ) -> int:
+        payload = encode_binary_copy(
+            {
+                "candle_time": ms_to_pg_timestamp(values[:, 0]),
+                "open": values[:, 1],
+                "high": values[:, 2],
+                "low": values[:, 3],
+                "close": values[:, 4],
+                "volume": values[:, 5],
+            },
+            STAGING_FIELDS,
+        )
+        on_conflict = "DO NOTHING"
+        if self.upsert:
+            on_conflict = (
+                "DO UPDATE SET open = EXCLUDED.open, high = EXCLUDED.high, "
+                "low = EXCLUDED.low, close = EXCLUDED.close, volume = EXCLUDED.volume"
+            )
+
+        with transaction.atomic():
+            # staging чистится и явно: во вложенной транзакции ON COMMIT не сработает
+            cursor.execute("TRUNCATE ohlcv_staging;")
+            cursor.copy_expert(
+                "COPY ohlcv_staging FROM STDIN WITH (FORMAT binary)",
+                io.BytesIO(payload),
+            )
+            if self.compact:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {self.table}
+                        (series_id, candle_time, open, high, low, close, volume)
+                    SELECT %s, candle_time, open, high, low, close, volume
+                    FROM ohlcv_staging
+                    ON CONFLICT (series_id, candle_time) {on_conflict};
+                """,
+                    [layout.series_id(symbol, timeframe)],
+                )
+            else:
+                # numeric(20, 8): float8 округляется до 8 знаков явно, как
+                # его записала бы биржа, а не хвостом двоичного представления
+                cursor.execute(
+                    f"""
+                    INSERT INTO {self.table} (symbol, timeframe, candle_time, open, high, low, close, volume)
+                    SELECT %s, %s, candle_time, round(open::numeric, 8),
+                           round(high::numeric, 8), round(low::numeric, 8),
+                           round(close::numeric, 8), round(volume::numeric, 8)
+                    FROM ohlcv_staging
+                    ON CONFLICT (symbol, timeframe, candle_time) {on_conflict};
+                """,
+                    [symbol, timeframe],
                 )
-                open_price, high_price, low_price, close_price, volume = data[1:6]
+        return len(values)
+
+
+def after_ingest(symbol: str, timeframe: str, first_ts: int, last_ts: int) -> None:
+    """
+    общий шаг после загрузки истории пачками (с биржи или из файла):
+    история базового таймфрейма материализуется в агрегатах (политики
+    обновляют только недавнее окно), кеши пары в этом процессе
+    перестраиваются — история могла измениться задним числом.
+    точки в zigzag_pivot пересчитывает build_zigzag_pivots
+    """
+    if aggregates.enabled() and timeframe == aggregates.BASE_TIMEFRAME:
+        aggregates.refresh(first_ts, last_ts)
+    candle_cache.invalidate(symbol)
+    pivot_cache.invalidate(symbol)
+
+
+class RealtimeWriteBuffer:
+    """
+    буфер отложенной записи realtime-свечей для всех потоков сразу.
+    хранит только последнюю версию каждой (symbol, timeframe, candle_time)
+    и сбрасывает накопленное одним многострочным upsert по размеру или по таймеру
+    """
+
+    def __init__(self, flush_interval: float = 0.5, max_rows: int = 5_000) -> None:
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.pending: Dict[Tuple[str, str, int], List[float]] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, symbol: str, timeframe: str, ohlcv_data: List[List[float]]) -> None:
+        for data in ohlcv_data:
+            # более новая версия свечи перезаписывает старую
+            self.pending[(symbol, timeframe, int(data[0]))] = data
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.pending) >= self.max_rows
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка сброса буфера realtime-свечей: {e}")
 
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self.pending:
+                return 0
+            items, self.pending = self.pending, {}
+            try:
+                await sync_to_async(self._write)(items)
+            except BaseException:
+                # возвращаем несохраненное (в том числе при отмене задачи), не затирая более свежие версии
+                for key, data in items.items():
+                    self.pending.setdefault(key, data)
+                raise
+            return len(items)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    @staticmethod
+    def _write(items: Dict[Tuple[str, str, int], List[float]]) -> None:
+        symbols, timeframes, times = zip(*items.keys())
+        values = list(zip(*(data[1:6] for data in items.values())))
+        if layout.compact():
+            ids = [
+                layout.series_id(symbol, timeframe)
+                for symbol, timeframe in zip(symbols, timeframes)
+            ]
+            with connection.cursor() as cursor:
                 cursor.execute(
-                    """
-                    INSERT INTO ohlcv (symbol, timeframe, candle_time, open, high, low, close, volume)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (symbol, timeframe, candle_time) DO UPDATE SET
+                    f"""
+                    INSERT INTO {layout.COMPACT_TABLE}
+                        (series_id, candle_time, open, high, low, close, volume)
+                    SELECT series_id, to_timestamp(ts / 1000.0), open, high, low, close, volume
+                    FROM unnest(
+                        %s::int2[], %s::int8[], %s::float8[], %s::float8[],
+                        %s::float8[], %s::float8[], %s::float8[]
+                    ) AS t(series_id, ts, open, high, low, close, volume)
+                    ON CONFLICT (series_id, candle_time) DO UPDATE SET
                         open = EXCLUDED.open,
                         high = EXCLUDED.high,
                         low = EXCLUDED.low,
                         close = EXCLUDED.close,
                         volume = EXCLUDED.volume;
                 """,
-                    [
-                        symbol,
-                        timeframe,
-                        candle_time,
-                        open_price,
-                        high_price,
-                        low_price,
-                        close_price,
-                        volume,
-                    ],
+                    [ids, list(times)] + [list(column) for column in values],
                 )
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO ohlcv (symbol, timeframe, candle_time, open, high, low, close, volume)
+                SELECT symbol, timeframe, to_timestamp(ts / 1000.0), open, high, low, close, volume
+                FROM unnest(
+                    %s::varchar[], %s::varchar[], %s::int8[], %s::numeric[],
+                    %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[]
+                ) AS t(symbol, timeframe, ts, open, high, low, close, volume)
+                ON CONFLICT (symbol, timeframe, candle_time) DO UPDATE SET
+                    open = EXCLUDED.open,
+                    high = EXCLUDED.high,
+                    low = EXCLUDED.low,
+                    close = EXCLUDED.close,
+                    volume = EXCLUDED.volume;
+            """,
+                [list(symbols), list(timeframes), list(times)]
+                + [list(column) for column in values],
+            )
+
+
+class DatabaseStorage(IDataStorage):
+    def __init__(
+        self,
+        copy_batch_size: int = 50_000,
+        flush_interval: float = 0.5,
+        flush_rows: int = 5_000,
+        publisher=None,
+        cache=None,
+    ) -> None:
+        # история с биржи главнее сохраненной: перезаписывает недоформированные свечи
+        self.ingestor = CopyIngestor(batch_size=copy_batch_size, upsert=True)
+        # публикация обновлений подписчикам (CandlePublisher), необязательно
+        self.publisher = publisher
+        # кеш последних свечей в shared memory (CandleCache), необязательно
+        self.cache = cache
+        self.write_buffer = RealtimeWriteBuffer(
+            flush_interval=flush_interval, max_rows=flush_rows
+        )
+
+    @sync_to_async
+    def save_historical_data(
+        self, symbol: str, timeframe: str, ohlcv_data: Iterable[List[float]]
+    ) -> IngestStats:
+        """
+        Сохраняет исторические данные потоково через бинарный COPY.
+        Агрегаты обновляются один раз на интервал (finish_historical_data).
+        """
+        return self.ingestor.ingest(symbol, timeframe, ohlcv_data)
+
+    @sync_to_async
+    def finish_historical_data(
+        self, symbol: str, timeframe: str, first_ts: int, last_ts: int
+    ) -> None:
+        """Завершает загрузку интервала истории [first_ts, last_ts] (мс)."""
+        after_ingest(symbol, timeframe, first_ts, last_ts)
+
+    async def save_realtime_data(
+        self, symbol: str, timeframe: str, ohlcv_data: List[List[float]]
+    ) -> None:
+        """
+        Кладет свечи в общий буфер; запись в БД идет пачками из RealtimeWriteBuffer.
+        Подписчики получают обновление сразу, не дожидаясь записи.
+        """
+        self.write_buffer.add(symbol, timeframe, ohlcv_data)
+        await self.publish_realtime_data(symbol, timeframe, ohlcv_data)
+        self.write_buffer.start()
+        if self.write_buffer.is_full:
+            await self.write_buffer.flush()
+
+    async def publish_realtime_data(
+        self, symbol: str, timeframe: str, ohlcv_data: List[List[float]]
+    ) -> None:
+        """
+        Обновляет кеш и рассылает свечи подписчикам без записи в БД —
+        так идут старшие таймфреймы, которые в БД строят агрегаты.
+        """
+        if self.cache is not None:
+            self.cache.update(symbol, timeframe, ohlcv_data)
+        if self.publisher:
+            # закрывшаяся и формирующаяся свечи; первый ответ биржи может нести весь кеш
+            await self.publisher.publish(symbol, timeframe, ohlcv_data[-2:])
+
+    async def load_recent_data(
+        self, symbol: str, timeframe: str, since: int
+    ) -> List[List[float]]:
+        """Свечи начиная с since (мс) в формате ccxt, с учетом еще не записанных."""
+        await self.write_buffer.flush()
+        columns = await sync_to_async(OHLCVReader().read)(
+            symbol, timeframe, after=since - 1
+        )
+        return np.column_stack(
+            [columns.candle_time.astype(np.float64)]
+            + [getattr(columns, name) for name, _ in CANDLE_FIELDS[1:]]
+        ).tolist()
+
+    @sync_to_async
+    def get_fetch_cursor(self, symbol: str, timeframe: str) -> Optional[int]:
+        cursor = FetchCursor.objects.filter(symbol=symbol, timeframe=timeframe).first()
+        return cursor.last_ts if cursor else None
+
+    @sync_to_async
+    def set_fetch_cursor(self, symbol: str, timeframe: str, last_ts: int) -> None:
+        FetchCursor.objects.update_or_create(
+            symbol=symbol, timeframe=timeframe, defaults={"last_ts": last_ts}
+        )
+
+    @sync_to_async
+    def get_coverage(
+        self, symbol: str, timeframe: str, start_date: int, end_date: int
+    ) -> Tuple[Optional[int], Optional[int], int]:
+        table, series = layout.candle_table(), layout.series_filter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT (extract(epoch FROM min(candle_time)) * 1000)::int8,
+                       (extract(epoch FROM max(candle_time)) * 1000)::int8,
+                       count(*)
+                FROM {table}
+                WHERE {series}
+                  AND candle_time >= to_timestamp(%s / 1000.0)
+                  AND candle_time < to_timestamp(%s / 1000.0);
+            """,
+                [symbol, timeframe, start_date, end_date],
+            )
+            first, last, count = cursor.fetchone()
+        return first, last, count
+
+    @sync_to_async
+    def find_gaps(
+        self, symbol: str, timeframe: str, first: int, last: int, step: int
+    ) -> List[Tuple[int, int]]:
+        table, series = layout.candle_table(), layout.series_filter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT prev_ms, next_ms FROM (
+                    SELECT (extract(epoch FROM candle_time) * 1000)::int8 AS prev_ms,
+                           (extract(epoch FROM lead(candle_time)
+                                OVER (ORDER BY candle_time)) * 1000)::int8 AS next_ms
+                    FROM {table}
+                    WHERE {series}
+                      AND candle_time >= to_timestamp(%s / 1000.0)
+                      AND candle_time <= to_timestamp(%s / 1000.0)
+                ) AS neighbours
+                WHERE next_ms - prev_ms > %s
+                ORDER BY prev_ms;
+            """,
+                [symbol, timeframe, first, last, step],
+            )
+            return cursor.fetchall()
+
+    async def close(self) -> None:
+        """Сбрасывает в БД все, что осталось в буфере."""
+        await self.write_buffer.close()
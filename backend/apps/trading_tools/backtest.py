@@ -0,0 +1,202 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+from apps.api.readers import CandleColumns
+from .indicators.zigzag_vectorized import find_pivots
+from .patterns.base import PatternDetector
+from .strategies.base import StrategyExecutor
+
+# сигналы стратегии -> целевая позиция
+POSITIONS = {"LONG": 1, "SHORT": -1}
+MS_PER_YEAR = 365 * 86_400_000
+
+
+@dataclass
+class BacktestResult:
+    """кривая капитала по закрытиям свечей, сделки колонками и сводка"""
+
+    times: np.ndarray
+    equity: np.ndarray
+    trades: Dict[str, np.ndarray]
+    stats: Dict[str, float] = field(default_factory=dict)
+
+
+class Backtester:
+    """
+    прогоняет стратегию по истории за один проход по свечам.
+
+    zigzag считается один раз по всем свечам (find_pivots), и для каждой
+    точки известна свеча, на которой она появилась. на этой свече стратегия
+    (и фильтр паттерна на входе, если задан) получает точки в том виде, в каком они
+    были видны тогда: окончательные предыдущие и новую с ценой на момент
+    появления. сигнал исполняется по open следующей свечи.
+
+    позиция — весь капитал в одну сторону (1 или -1), комиссия и
+    проскальзывание — доли от объема сделки на каждую сторону
+    """
+
+    def __init__(
+        self,
+        strategy: StrategyExecutor,
+        deviation: float = 0.01,
+        detector: Optional[PatternDetector] = None,
+        fee: float = 0.001,
+        slippage: float = 0.0005,
+        allow_short: bool = True,
+        lookback: int = 5,
+        initial_equity: float = 1.0,
+    ) -> None:
+        self.strategy = strategy
+        self.deviation = deviation
+        # вход из флэта исполняется, только если паттерн найден в тех же
+        # точках; выходы и развороты фильтр не задерживает
+        self.detector = detector
+        self.fee = fee
+        self.slippage = slippage
+        self.allow_short = allow_short
+        # сколько последних точек видит стратегия: полная история точек
+        # на каждом событии сделала бы прогон квадратичным
+        self.lookback = lookback
+        self.initial_equity = initial_equity
+
+    def run(self, columns: CandleColumns) -> BacktestResult:
+        if not len(columns):
+            return BacktestResult(columns.candle_time, np.empty(0), {})
+        fills, positions = self._signals(columns)
+        return self._simulate(columns, fills, positions)
+
+    def _signals(self, columns: CandleColumns):
+        """свечи исполнения (индексы) и позиция после каждого исполнения"""
+        n = len(columns)
+        if n < 2:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        births: List[int] = []
+        indices, prices, _ = find_pivots(
+            columns.high,
+            columns.low,
+            float(columns.close[0]),
+            self.deviation,
+            births=births,
+        )
+        # точки до новой окончательные: словари строятся один раз и
+        # переиспользуются во всех окнах (стратегия их не меняет)
+        final = [
+            {"time": point_time, "price": price}
+            for point_time, price in zip(
+                columns.candle_time[indices].tolist(), prices.tolist()
+            )
+        ]
+        born_at = np.asarray(births, dtype=np.int64)
+        rising = np.r_[False, np.diff(prices) > 0]
+        born_times = columns.candle_time[born_at].tolist()
+        born_prices = np.where(rising, columns.high[born_at], columns.low[born_at]).tolist()
+
+        fills: List[int] = []
+        positions: List[int] = []
+        position = 0
+        for k in range(1, len(indices)):
+            born = births[k]
+            if born + 1 >= n:
+                break
+            # новая точка на момент появления: экстремум свечи разворота
+            points = final[max(k - self.lookback + 1, 0) : k]
+            points.append({"time": born_times[k], "price": born_prices[k]})
+
+            target = POSITIONS.get(self.strategy.execute(points))
+            if target is None:
+                continue
+            if target < 0 and not self.allow_short:
+                target = 0
+            if target == position:
+                continue
+            entry = position == 0 and target != 0
+            if not entry or self.detector is None or self.detector.detect(points):
+                fills.append(born + 1)
+                positions.append(target)
+                position = target
+        return np.array(fills, dtype=np.int64), np.array(positions, dtype=np.int64)
+
+    def _simulate(
+        self, columns: CandleColumns, fills: np.ndarray, positions: np.ndarray
+    ) -> BacktestResult:
+        """
+        кривая капитала без цикла по свечам: каждая свеча относится к
+        отрезку между исполнениями, капитал внутри отрезка — переоценка
+        позиции от цены входа
+        """
+        n = len(columns)
+        opens, closes = columns.open, columns.close
+        sides = np.sign(positions)
+        # вход по open свечи исполнения с проскальзыванием против позиции
+        entries = opens[fills] * (1 + self.slippage * sides)
+
+        # выход отрезка — вход следующего (или последнее закрытие)
+        ends = np.append(fills[1:], n)[: len(fills)]
+        exits = np.empty(len(fills))
+        closed = ends < n
+        exits[closed] = opens[ends[closed]] * (1 - self.slippage * sides[closed])
+        exits[~closed] = closes[-1]
+
+        fee = self.fee * (sides != 0)
+        gross = 1 + positions * (exits / entries - 1)
+        growth = (1 - fee) * gross * (1 - fee * closed)
+        start_equity = self.initial_equity * np.concatenate(([1.0], np.cumprod(growth)[:-1]))
+
+        segment = np.searchsorted(fills, np.arange(n), side="right") - 1
+        equity = np.full(n, self.initial_equity, dtype=np.float64)
+        inside = segment >= 0
+        k = segment[inside]
+        equity[inside] = (
+            start_equity[k]
+            * (1 - fee[k])
+            * (1 + positions[k] * (closes[inside] / entries[k] - 1))
+        )
+
+        traded = sides != 0
+        trades = {
+            "entry_time": columns.candle_time[fills][traded],
+            "exit_time": columns.candle_time[np.minimum(ends, n - 1)][traded],
+            "direction": positions[traded],
+            "entry_price": entries[traded],
+            "exit_price": exits[traded],
+            "return": (growth - 1)[traded],
+            "closed": closed[traded],
+        }
+        result = BacktestResult(columns.candle_time, equity, trades)
+        result.stats = self._stats(result, segment, positions)
+        return result
+
+    def _stats(
+        self, result: BacktestResult, segment: np.ndarray, positions: np.ndarray
+    ) -> Dict[str, float]:
+        equity = result.equity
+        returns = result.trades["return"]
+        if not len(equity):
+            return {}
+        peaks = np.maximum.accumulate(equity)
+        step = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.empty(0)
+        exposure = (
+            float(np.count_nonzero(positions[segment[segment >= 0]])) / len(equity)
+            if len(positions)
+            else 0.0
+        )
+        span = result.times[-1] - result.times[0]
+        periods_per_year = (len(equity) - 1) * MS_PER_YEAR / span if span else 0.0
+        profit = returns[returns > 0].sum()
+        loss = -returns[returns < 0].sum()
+        return {
+            "total_return": float(equity[-1] / self.initial_equity - 1),
+            "max_drawdown": float((1 - equity / peaks).max()),
+            "trades": int(len(returns)),
+            "win_rate": float((returns > 0).mean()) if len(returns) else 0.0,
+            "avg_trade": float(returns.mean()) if len(returns) else 0.0,
+            # без убыточных сделок прибыль ничем не делится: inf, а не 0 —
+            # иначе при ранжировании по profit_factor такой прогон последний
+            "profit_factor": float(profit / loss)
+            if loss
+            else float("inf") if profit else 0.0,
+            "exposure": exposure,
+            "sharpe": float(step.mean() / step.std() * np.sqrt(periods_per_year))
+            if len(step) and step.std()
+            else 0.0,
+        }
@@ -0,0 +1,156 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from apps.api.readers import CANDLE_FIELDS, CandleColumns
+from .backtest import Backtester
+from .strategies.simple_strategy import SimpleStrategy
+
+# стратегии, доступные в сетке по имени (задание должно передаваться в процесс)
+STRATEGIES = {
+    "simple": SimpleStrategy,
+}
+
+# метрики, у которых лучше меньшее значение: по ним сортировка по возрастанию
+LOWER_IS_BETTER = {"max_drawdown"}
+
+
+class SharedCandles:
+    """
+    свечи нескольких пар в одном сегменте shared memory: колонки CANDLE_FIELDS
+    подряд, ряды пар склеены. процессы пула подключаются по имени и получают
+    представления numpy без копирования, в задания уходят только имена пар
+    """
+
+    def __init__(
+        self, name: str, length: int, spans: Dict[str, Tuple[int, int]]
+    ) -> None:
+        self.name = name
+        self.length = length
+        # пара -> (начало, конец) в склеенных колонках
+        self.spans = spans
+        self.shm: Optional[shared_memory.SharedMemory] = None
+
+    @classmethod
+    def create(cls, columns: Dict[str, CandleColumns]) -> "SharedCandles":
+        spans, start = {}, 0
+        for symbol, candles in columns.items():
+            spans[symbol] = (start, start + len(candles))
+            start += len(candles)
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(start, 1) * 8 * len(CANDLE_FIELDS)
+        )
+        shared = cls(shm.name, start, spans)
+        shared.shm = shm
+        table = shared._table()
+        for symbol, candles in columns.items():
+            first, last = spans[symbol]
+            for row, (name, _) in enumerate(CANDLE_FIELDS):
+                values = np.ascontiguousarray(getattr(candles, name))
+                table[row, first:last] = values.view(np.float64)
+        return shared
+
+    def __getstate__(self):
+        # в процесс пула передается только описание сегмента
+        return {
+            "name": self.name,
+            "length": self.length,
+            "spans": self.spans,
+            "shm": None,
+        }
+
+    def attach(self) -> None:
+        # процессы пула делят resource_tracker с создателем: повторная
+        # регистрация сегмента безопасна, удаляет его create-сторона
+        if self.shm is None:
+            self.shm = shared_memory.SharedMemory(name=self.name)
+
+    def _table(self) -> np.ndarray:
+        return np.ndarray(
+            (len(CANDLE_FIELDS), self.length), dtype=np.float64, buffer=self.shm.buf
+        )
+
+    def columns(self, symbol: str) -> CandleColumns:
+        first, last = self.spans[symbol]
+        table = self._table()
+        return CandleColumns(
+            **{
+                name: table[row, first:last].view(kind)
+                for row, (name, kind) in enumerate(CANDLE_FIELDS)
+            }
+        )
+
+    def close(self, unlink: bool = False) -> None:
+        if self.shm is not None:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+            self.shm = None
+
+
+_shared: Optional[SharedCandles] = None
+
+
+def _attach(shared: SharedCandles) -> None:
+    global _shared
+    shared.attach()
+    _shared = shared
+
+
+def _run_job(job: Tuple[str, Dict]) -> Dict:
+    symbol, params = job
+    options = dict(params)
+    strategy = STRATEGIES[options.pop("strategy", "simple")]()
+    result = Backtester(strategy, **options).run(_shared.columns(symbol))
+    return {"symbol": symbol, "params": params, "stats": result.stats}
+
+
+def expand_grid(grid: Dict[str, Sequence]) -> List[Dict]:
+    """декартово произведение значений параметров"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+class GridRunner:
+    """
+    бэктесты (пара × набор параметров) в пуле процессов. каждое задание
+    независимо, поэтому время почти линейно делится на число ядер;
+    свечи передаются через shared memory один раз на процесс
+    """
+
+    def __init__(self, workers: Optional[int] = None, metric: str = "sharpe") -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.metric = metric
+
+    def run(
+        self, columns: Dict[str, CandleColumns], grid: Dict[str, Sequence]
+    ) -> List[Dict]:
+        """все результаты, от лучшего значения метрики к худшему"""
+        jobs = [(symbol, params) for symbol in columns for params in expand_grid(grid)]
+        shared = SharedCandles.create(columns)
+        try:
+            if self.workers == 1:
+                _attach(shared)
+                results = list(map(_run_job, jobs))
+            else:
+                # задания идут пачками: накладные расходы пула на задание заметны
+                chunksize = max(len(jobs) // (self.workers * 4), 1)
+                with ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_attach, initargs=(shared,)
+                ) as pool:
+                    results = list(pool.map(_run_job, jobs, chunksize=chunksize))
+        finally:
+            shared.close(unlink=True)
+        return self.rank(results)
+
+    def rank(self, results: Iterable[Dict]) -> List[Dict]:
+        # прогоны без метрики (nan) в конце при любом направлении
+        sign = -1 if self.metric in LOWER_IS_BETTER else 1
+
+        def score(result: Dict) -> float:
+            value = result["stats"].get(self.metric, float("nan"))
+            return -np.inf if np.isnan(value) else sign * value
+
+        return sorted(results, key=score, reverse=True)
@@ -63,3 +63,159 @@ class ZigZagCalculator(Indicator):
                     zigzag_points.append(last_p)
 
         return zigzag_points
+
+
+class IncrementalZigZag(Indicator):
+    """
+    потоковый zigzag: хранит тренд, последнюю точку и список точек
+    и обрабатывает по одной свече за O(1).
+
+    свеча с тем же временем, что и последняя, считается обновлением
+    формирующейся свечи: состояние откатывается к моменту до неё и свеча
+    применяется заново. результат совпадает с ZigZagCalculator.calculate
+    """
+
+    def __init__(self, deviation: float = 0.05):
+        self.deviation = deviation
+        self.pivots: List[Dict] = []
+        self.trend = 0  # 1 - вверх, -1 - вниз, 0 - ожидание
+        self.last_time = None  # время формирующейся (последней) свечи
+        # снимок состояния до применения формирующейся свечи
+        self._prev_trend = 0
+        self._prev_count = 0
+        self._prev_last = None
+
+    def calculate(self, data: List[Dict]) -> List[Dict]:
+        for candle in data:
+            self.update(candle)
+        return self.pivots
+
+    def update(self, candle: Dict) -> bool:
+        """
+        применяет свечу и возвращает True, если изменился список точек
+        """
+        return self.update_values(
+            candle["candle_time"],
+            float(candle["high"]),
+            float(candle["low"]),
+            float(candle["close"]),
+        )
+
+    def update_values(self, time, high: float, low: float, close: float) -> bool:
+        if self.last_time is not None:
+            if time == self.last_time:
+                # обновление формирующейся свечи — откатываем её прошлую версию
+                self._rollback()
+            elif time < self.last_time:
+                # запоздавшая закрытая свеча уже учтена
+                return False
+            else:
+                self._commit()
+        self.last_time = time
+
+        count = len(self.pivots)
+        last = self.pivots[-1] if count else None
+        before = (last["time"], last["price"]) if last else None
+
+        self._apply(time, high, low, close)
+
+        if len(self.pivots) != count:
+            return True
+        last = self.pivots[-1]
+        return (last["time"], last["price"]) != before
+
+    def _commit(self) -> None:
+        self._prev_trend = self.trend
+        self._prev_count = len(self.pivots)
+        self._prev_last = dict(self.pivots[-1]) if self.pivots else None
+
+    def _rollback(self) -> None:
+        self.trend = self._prev_trend
+        del self.pivots[self._prev_count :]
+        if self._prev_last is not None:
+            self.pivots[-1] = dict(self._prev_last)
+
+    def _apply(self, time, high: float, low: float, close: float) -> None:
+        if not self.pivots:
+            # Инициализируем первой свечой
+            self.pivots.append({"time": time, "price": close})
+            return
+
+        last_p = self.pivots[-1]
+        dev_up = (high - last_p["price"]) / last_p["price"]
+        dev_down = (last_p["price"] - low) / last_p["price"]
+
+        if self.trend == 0:
+            if dev_up >= self.deviation:
+                self.trend = 1
+                self.pivots.append({"time": time, "price": high})
+            elif dev_down >= self.deviation:
+                self.trend = -1
+                self.pivots.append({"time": time, "price": low})
+
+        elif self.trend == 1:
+            if high > last_p["price"]:
+                last_p["price"] = high
+                last_p["time"] = time
+            elif dev_down >= self.deviation:
+                self.trend = -1
+                self.pivots.append({"time": time, "price": low})
+
+        elif self.trend == -1:
+            if low < last_p["price"]:
+                last_p["price"] = low
+                last_p["time"] = time
+            elif dev_up >= self.deviation:
+                self.trend = 1
+                self.pivots.append({"time": time, "price": high})
+
+    @property
+    def tail_start(self) -> int:
+        """
+        индекс первой точки, которая еще может измениться: последняя точка
+        до формирующейся свечи двигается вслед за экстремумом, остальные
+        после нее добавила сама формирующаяся свеча
+        """
+        return max(self._prev_count - 1, 0)
+
+    def trim(self, keep: int) -> int:
+        """
+        отбрасывает окончательные точки из начала списка, оставляя не меньше
+        keep последних (например, когда точки уже сохранены в БД).
+        возвращает число отброшенных точек
+        """
+        drop = min(len(self.pivots) - keep, self.tail_start - 1)
+        if drop <= 0:
+            return 0
+        del self.pivots[:drop]
+        self._prev_count -= drop
+        return drop
+
+    def to_state(self) -> Dict:
+        """
+        сериализует состояние в json-совместимый словарь
+        (время точек должно быть сериализуемым, например мс)
+        """
+        return {
+            "deviation": self.deviation,
+            "trend": self.trend,
+            "last_time": self.last_time,
+            "pivots": [dict(p) for p in self.pivots],
+            "prev_trend": self._prev_trend,
+            "prev_count": self._prev_count,
+            "prev_last": self._prev_last,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "IncrementalZigZag":
+        """
+        восстанавливает движок из словаря to_state без повторного прогона истории
+        """
+        zigzag = cls(deviation=state["deviation"])
+        zigzag.trend = state["trend"]
+        zigzag.last_time = state["last_time"]
+        zigzag.pivots = [dict(p) for p in state["pivots"]]
+        zigzag._prev_trend = state["prev_trend"]
+        zigzag._prev_count = state["prev_count"]
+        zigzag._prev_last = state["prev_last"]
+        return zigzag
@@ -0,0 +1,83 @@
+from typing import List, Dict, Sequence
+
+
+class ZigZagSweep:
+    """
+    считает zigzag сразу для нескольких отклонений за один проход по свечам.
+    свечи декодируются один раз, цикл по данным общий для всех отклонений;
+    для каждого отклонения результат совпадает с ZigZagCalculator.calculate
+    """
+
+    def __init__(self, deviations: Sequence[float]):
+        self.deviations = list(deviations)
+
+    def calculate(self, data: List[Dict]) -> Dict[float, List[Dict]]:
+        if not data:
+            return {deviation: [] for deviation in self.deviations}
+
+        times = [candle["candle_time"] for candle in data]
+        highs = [float(candle["high"]) for candle in data]
+        lows = [float(candle["low"]) for candle in data]
+        return self.calculate_arrays(times, highs, lows, float(data[0]["close"]))
+
+    def calculate_arrays(
+        self,
+        times: Sequence,
+        highs: Sequence[float],
+        lows: Sequence[float],
+        first_close: float,
+    ) -> Dict[float, List[Dict]]:
+        """
+        принимает уже декодированные колонки (списки или массивы numpy)
+        """
+        if len(times) == 0:
+            return {deviation: [] for deviation in self.deviations}
+        if hasattr(highs, "tolist"):
+            highs = highs.tolist()
+            lows = lows.tolist()
+        if hasattr(times, "tolist"):
+            times = times.tolist()
+
+        count = len(self.deviations)
+        deviations = self.deviations
+        trends = [0] * count  # 1 - вверх, -1 - вниз, 0 - ожидание
+        last_points = [
+            {"time": times[0], "price": float(first_close)} for _ in range(count)
+        ]
+        results = [[point] for point in last_points]
+        states = list(range(count))
+
+        for time, high, low in zip(times[1:], highs[1:], lows[1:]):
+            for k in states:
+                last_p = last_points[k]
+                price = last_p["price"]
+                trend = trends[k]
+
+                if trend == 1:
+                    if high > price:
+                        last_p["price"] = high
+                        last_p["time"] = time
+                    elif (price - low) / price >= deviations[k]:
+                        trends[k] = -1
+                        last_points[k] = {"time": time, "price": low}
+                        results[k].append(last_points[k])
+
+                elif trend == -1:
+                    if low < price:
+                        last_p["price"] = low
+                        last_p["time"] = time
+                    elif (high - price) / price >= deviations[k]:
+                        trends[k] = 1
+                        last_points[k] = {"time": time, "price": high}
+                        results[k].append(last_points[k])
+
+                elif (high - price) / price >= deviations[k]:
+                    trends[k] = 1
+                    last_points[k] = {"time": time, "price": high}
+                    results[k].append(last_points[k])
+                elif (price - low) / price >= deviations[k]:
+                    trends[k] = -1
+                    last_points[k] = {"time": time, "price": low}
+                    results[k].append(last_points[k])
+
+        return dict(zip(deviations, results))
@@ -0,0 +1,244 @@
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from .base import Indicator
+
+# начальный размер блока для поиска разворота; растет вдвое внутри длинных трендов
+DEFAULT_CHUNK = 64
+# сколько свечей тренда проверяется простым циклом до перехода на numpy:
+# короткие тренды дешевле пройти по списку float, чем платить за вызовы numpy
+SCALAR_PROBE = 24
+
+
+def _probe_trend(
+    extremes: List[float],
+    opposite: List[float],
+    pos: int,
+    end: int,
+    price: float,
+    trend: int,
+    deviation: float,
+) -> Tuple[int, int, float]:
+    """скалярный вариант _scan_trend для первых свечей тренда"""
+    ext_index = -1
+    for j in range(pos, end):
+        value = extremes[j]
+        if trend == 1:
+            if value > price:
+                price = value
+                ext_index = j
+            elif (price - opposite[j]) / price >= deviation:
+                return j, ext_index, price
+        else:
+            if value < price:
+                price = value
+                ext_index = j
+            elif (opposite[j] - price) / price >= deviation:
+                return j, ext_index, price
+    return -1, ext_index, price
+
+
+def _scan_trend(
+    extremes: np.ndarray,
+    opposite: np.ndarray,
+    pos: int,
+    price: float,
+    trend: int,
+    deviation: float,
+    chunk: int,
+) -> Tuple[int, int, float]:
+    """
+    ищет конец тренда начиная с pos.
+
+    extremes - high для тренда вверх (low для тренда вниз), opposite - наоборот.
+    возвращает (индекс свечи разворота или -1, индекс последнего обновления
+    экстремума или -1, цена экстремума)
+    """
+    n = len(extremes)
+    ext_index = -1
+    size = chunk
+    accumulate = np.maximum.accumulate if trend == 1 else np.minimum.accumulate
+    combine = np.maximum if trend == 1 else np.minimum
+
+    while pos < n:
+        end = min(n, pos + size)
+        block = extremes[pos:end]
+        other = opposite[pos:end]
+
+        # цена последней точки перед каждой свечой блока
+        prev = np.empty_like(block)
+        prev[0] = price
+        combine(accumulate(block[:-1]), price, out=prev[1:])
+
+        if trend == 1:
+            updated = block > prev
+            reversed_ = (prev - other) / prev >= deviation
+        else:
+            updated = block < prev
+            reversed_ = (other - prev) / prev >= deviation
+        # как в эталоне: разворот проверяется только если экстремум не обновлен
+        reversed_ &= ~updated
+
+        hits = np.flatnonzero(reversed_)
+        stop = hits[0] if hits.size else end - pos
+        updates = np.flatnonzero(updated[:stop])
+        if updates.size:
+            ext_index = pos + int(updates[-1])
+            price = float(block[updates[-1]])
+        if hits.size:
+            return pos + int(stop), ext_index, price
+
+        pos = end
+        size *= 2
+
+    return -1, ext_index, price
+
+
+def find_pivots(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    first_price: float,
+    deviation: float,
+    chunk: int = DEFAULT_CHUNK,
+    start_trend: Optional[int] = None,
+    births: Optional[List[int]] = None,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    находит точки zigzag по массивам high/low.
+
+    :param start_trend: продолжение расчета с предыдущего участка: first_price —
+        цена последней точки до массивов, start_trend — тренд на тот момент.
+        эта точка возвращается первой с индексом -1, пока экстремум не обновлен
+    :param births: если передан, в него пишется индекс свечи, на которой
+        появилась каждая точка (свеча разворота) — момент, когда точка стала
+        известна без заглядывания вперед
+    :return: (индексы свечей точек, цены точек, текущий тренд)
+    """
+    highs = np.ascontiguousarray(highs, dtype=np.float64)
+    lows = np.ascontiguousarray(lows, dtype=np.float64)
+    n = len(highs)
+    if n == 0:
+        if start_trend is not None:
+            return np.array([-1]), np.array([float(first_price)]), start_trend
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), 0
+
+    if start_trend is None:
+        indices = [0]
+        trend = 0
+        pos = 1
+    else:
+        indices = [-1]
+        trend = start_trend
+        pos = 0
+    prices = [float(first_price)]
+    if births is not None:
+        births.append(indices[0])
+
+    # ожидание первого движения от цены закрытия первой свечи
+    price = prices[0]
+    size = chunk
+    while trend == 0 and pos < n:
+        end = min(n, pos + size)
+        up = (highs[pos:end] - price) / price >= deviation
+        down = (price - lows[pos:end]) / price >= deviation
+        hits = np.flatnonzero(up | down)
+        if hits.size:
+            j = pos + int(hits[0])
+            if up[hits[0]]:
+                trend = 1
+                prices.append(float(highs[j]))
+            else:
+                trend = -1
+                prices.append(float(lows[j]))
+            indices.append(j)
+            if births is not None:
+                births.append(j)
+            pos = j + 1
+            break
+        pos = end
+        size *= 2
+
+    high_list = highs.tolist()
+    low_list = lows.tolist()
+    while trend != 0 and pos < n:
+        if trend == 1:
+            arrays = (highs, lows)
+            lists = (high_list, low_list)
+        else:
+            arrays = (lows, highs)
+            lists = (low_list, high_list)
+
+        probe_end = min(n, pos + SCALAR_PROBE)
+        reversal, ext_index, ext_price = _probe_trend(
+            *lists, pos, probe_end, prices[-1], trend, deviation
+        )
+        if reversal < 0 and probe_end < n:
+            reversal, long_index, ext_price = _scan_trend(
+                *arrays, probe_end, ext_price, trend, deviation, chunk
+            )
+            if long_index >= 0:
+                ext_index = long_index
+        if ext_index >= 0:
+            indices[-1] = ext_index
+            prices[-1] = ext_price
+        if reversal < 0:
+            break
+
+        trend = -trend
+        indices.append(reversal)
+        prices.append(float(highs[reversal] if trend == 1 else lows[reversal]))
+        if births is not None:
+            births.append(reversal)
+        pos = reversal + 1
+
+    return (
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(prices, dtype=np.float64),
+        trend,
+    )
+
+
+class VectorizedZigZagCalculator(Indicator):
+    """
+    zigzag по колоночным массивам float64 на numpy.
+    результат совпадает с ZigZagCalculator.calculate
+    """
+
+    def __init__(self, deviation: float = 0.05):
+        self.deviation = deviation
+
+    def calculate(self, data: List[Dict]) -> List[Dict]:
+        if not data:
+            return []
+        times = [candle["candle_time"] for candle in data]
+        highs = np.fromiter((float(c["high"]) for c in data), np.float64, len(data))
+        lows = np.fromiter((float(c["low"]) for c in data), np.float64, len(data))
+        return self._to_points(
+            times, *find_pivots(highs, lows, float(data[0]["close"]), self.deviation)
+        )
+
+    def calculate_arrays(
+        self,
+        times: np.ndarray,
+        highs: np.ndarray,
+        lows: np.ndarray,
+        closes: np.ndarray,
+    ) -> List[Dict]:
+        """
+        принимает колонки свечей (время, high, low, close) одинаковой длины
+        """
+        if len(highs) == 0:
+            return []
+        return self._to_points(
+            times, *find_pivots(highs, lows, float(closes[0]), self.deviation)
+        )
+
+    @staticmethod
+    def _to_points(times, indices: np.ndarray, prices: np.ndarray, trend: int):
+        if isinstance(times, np.ndarray):
+            point_times = times[indices].tolist()
+        else:
+            point_times = [times[i] for i in indices.tolist()]
+        return [
+            {"time": time, "price": price}
+            for time, price in zip(point_times, prices.tolist())
+        ]
@@ -0,0 +1,71 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from ...indicators.zigzag import ZigZagCalculator
+from ...indicators.zigzag_sweep import ZigZagSweep
+
+
+def generate_candles(count: int, volatility: float = 0.003, seed: int = 1):
+    """синтетические свечи в формате ответа API (цены — строки, как у Decimal)"""
+    rnd = random.Random(seed)
+    price = 100.0
+    candles = []
+    for i in range(count):
+        open_price = price
+        close_price = price * (1 + rnd.gauss(0, volatility))
+        high = max(open_price, close_price) * (1 + abs(rnd.gauss(0, volatility / 3)))
+        low = min(open_price, close_price) * (1 - abs(rnd.gauss(0, volatility / 3)))
+        candles.append(
+            {
+                "candle_time": i * 900_000,
+                "open": f"{open_price:.8f}",
+                "high": f"{high:.8f}",
+                "low": f"{low:.8f}",
+                "close": f"{close_price:.8f}",
+            }
+        )
+        price = close_price
+    return candles
+
+
+class Command(BaseCommand):
+    help = "Сравнивает N отдельных вызовов ZigZagCalculator.calculate с ZigZagSweep."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--candles", type=int, default=35_000)
+        parser.add_argument(
+            "--deviations",
+            default="0.0025,0.005,0.0075,0.01,0.015,0.02,0.03,0.05",
+            help="список отклонений через запятую",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        deviations = [float(d) for d in options["deviations"].split(",")]
+        candles = generate_candles(options["candles"])
+        self.stdout.write(
+            f"свечей: {len(candles)}, отклонений: {len(deviations)}, повторов: {options['repeat']}"
+        )
+
+        separate_time = sweep_time = float("inf")
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            separate = {
+                deviation: ZigZagCalculator(deviation=deviation).calculate(candles)
+                for deviation in deviations
+            }
+            separate_time = min(separate_time, time.perf_counter() - started)
+
+            started = time.perf_counter()
+            swept = ZigZagSweep(deviations=deviations).calculate(candles)
+            sweep_time = min(sweep_time, time.perf_counter() - started)
+
+        if swept != separate:
+            self.stdout.write(self.style.ERROR("Результаты не совпадают!"))
+            return
+
+        self.stdout.write(f"N x calculate: {separate_time * 1000:.1f} мс")
+        self.stdout.write(f"ZigZagSweep:   {sweep_time * 1000:.1f} мс")
+        self.stdout.write(
+            self.style.SUCCESS(f"ускорение: x{separate_time / sweep_time:.2f}")
+        )
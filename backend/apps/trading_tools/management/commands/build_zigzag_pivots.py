@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from ...pivots import pivot_store
+from ...tracker import ZigZagTracker
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает точки zigzag по всей истории пары в таблицу zigzag_pivot "
+        "и сбрасывает состояние потокового zigzag, чтобы дальше таблицу "
+        "вел ZigZagTracker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--symbols", default="BTC/USDT,ETH/USDT")
+        parser.add_argument("--timeframes", default="1h,15m")
+        parser.add_argument("--deviation", type=float, default=0.01)
+        parser.add_argument(
+            "--keep", type=int, default=16, help="сколько точек оставить в состоянии"
+        )
+
+    def handle(self, *args, **options):
+        tracker = ZigZagTracker(
+            deviation=options["deviation"], store=pivot_store, keep=options["keep"]
+        )
+        for symbol in options["symbols"].split(","):
+            for timeframe in options["timeframes"].split(","):
+                _, count = tracker.rebuild_sync(symbol, timeframe)
+                self.stdout.write(
+                    self.style.SUCCESS(f"{symbol} {timeframe}: {count} точек zigzag")
+                )
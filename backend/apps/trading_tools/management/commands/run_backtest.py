@@ -0,0 +1,60 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.api.management.commands.bench_wire_format import generate_columns
+from apps.api.archive import CandleArchive
+from apps.api.readers import OHLCVReader
+from ...backtest import Backtester
+from ...patterns.head_and_shoulders import HeadAndShouldersDetector
+from ...strategies.simple_strategy import SimpleStrategy
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет SimpleStrategy на точках zigzag по истории пары "
+        "(или по синтетическим свечам) и печатает сводку сделок."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--symbol", default="BTC/USDT")
+        parser.add_argument("--timeframe", default="1h")
+        parser.add_argument("--deviation", type=float, default=0.01)
+        parser.add_argument("--fee", type=float, default=0.001)
+        parser.add_argument("--slippage", type=float, default=0.0005)
+        parser.add_argument("--long-only", action="store_true")
+        parser.add_argument(
+            "--pattern", action="store_true", help="входить только на голове и плечах"
+        )
+        parser.add_argument(
+            "--archive", action="store_true", help="свечи из CANDLE_ARCHIVE без БД"
+        )
+        parser.add_argument(
+            "--synthetic", type=int, default=0, help="N синтетических свечей вместо БД"
+        )
+
+    def handle(self, *args, **options):
+        if options["synthetic"]:
+            columns = generate_columns(options["synthetic"])
+        elif options["archive"]:
+            columns = CandleArchive().read(options["symbol"], options["timeframe"])
+        else:
+            columns = OHLCVReader().read(options["symbol"], options["timeframe"])
+        backtester = Backtester(
+            SimpleStrategy(),
+            deviation=options["deviation"],
+            detector=HeadAndShouldersDetector() if options["pattern"] else None,
+            fee=options["fee"],
+            slippage=options["slippage"],
+            allow_short=not options["long_only"],
+        )
+
+        started = time.perf_counter()
+        result = backtester.run(columns)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"свечей: {len(columns)} за {elapsed:.3f} с "
+            f"({len(columns) / elapsed if elapsed else 0:.0f} свечей/с)"
+        )
+        for name, value in result.stats.items():
+            if isinstance(value, float):
+                value = f"{value:.4f}"
+            self.stdout.write(self.style.SUCCESS(f"  {name}: {value}"))
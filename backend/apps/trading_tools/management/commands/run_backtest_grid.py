@@ -0,0 +1,81 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.api.management.commands.bench_wire_format import generate_columns
+from apps.api.archive import CandleArchive
+from apps.api.readers import OHLCVReader
+from ...grid import STRATEGIES, GridRunner
+
+
+def floats(value: str):
+    return [float(v) for v in value.split(",") if v]
+
+
+class Command(BaseCommand):
+    help = (
+        "Перебирает сетку параметров бэктеста (отклонение zigzag, комиссия, "
+        "проскальзывание) по парам в пуле процессов и печатает рейтинг."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--symbols", default="BTC/USDT,ETH/USDT")
+        parser.add_argument("--timeframe", default="1h")
+        parser.add_argument("--deviations", default="0.005,0.01,0.02,0.03,0.05")
+        parser.add_argument("--fees", default="0.001")
+        parser.add_argument("--slippages", default="0.0005")
+        parser.add_argument("--strategies", default="simple", help=f"из {list(STRATEGIES)}")
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--metric", default="sharpe")
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument(
+            "--archive", action="store_true", help="свечи из CANDLE_ARCHIVE без БД"
+        )
+        parser.add_argument(
+            "--synthetic", type=int, default=0, help="N синтетических свечей на пару"
+        )
+
+    def handle(self, *args, **options):
+        symbols = options["symbols"].split(",")
+        if options["synthetic"]:
+            columns = {
+                symbol: generate_columns(options["synthetic"], seed=seed)
+                for seed, symbol in enumerate(symbols)
+            }
+        elif options["archive"]:
+            archive = CandleArchive()
+            columns = {
+                symbol: archive.read(symbol, options["timeframe"]) for symbol in symbols
+            }
+        else:
+            reader = OHLCVReader()
+            columns = {
+                symbol: reader.read(symbol, options["timeframe"]) for symbol in symbols
+            }
+        grid = {
+            "strategy": options["strategies"].split(","),
+            "deviation": floats(options["deviations"]),
+            "fee": floats(options["fees"]),
+            "slippage": floats(options["slippages"]),
+        }
+
+        runner = GridRunner(workers=options["workers"], metric=options["metric"])
+        started = time.perf_counter()
+        results = runner.run(columns, grid)
+        elapsed = time.perf_counter() - started
+        total = sum(len(c) for c in columns.values())
+        candles = total * len(results) // max(len(columns), 1)
+        self.stdout.write(
+            f"заданий: {len(results)}, процессов: {runner.workers}, {elapsed:.2f} с "
+            f"({candles / elapsed if elapsed else 0:.0f} свечей/с)"
+        )
+
+        metric = options["metric"]
+        for place, result in enumerate(results[: options["top"]], 1):
+            stats = result["stats"]
+            params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{place:3}. {result['symbol']} {params}: {metric} "
+                    f"{stats.get(metric, float('nan')):.3f}, доходность "
+                    f"{stats.get('total_return', 0.0):.2%}, сделок {stats.get('trades', 0)}"
+                )
+            )
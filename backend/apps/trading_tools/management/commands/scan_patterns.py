@@ -0,0 +1,47 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from ...patterns.scanner import PatternScanner
+from ...pivots import pivot_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Ищет паттерны по всей истории точек zigzag (таблица zigzag_pivot) "
+        "сразу по всем парам таймфрейма и печатает число совпадений."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--timeframe", default="1h")
+        parser.add_argument("--deviation", type=float, default=0.01)
+        parser.add_argument("--symbols", help="пары через запятую, по умолчанию все")
+        parser.add_argument(
+            "--last", type=int, default=0, help="показать последние N совпадений"
+        )
+
+    def handle(self, *args, **options):
+        symbols = options["symbols"].split(",") if options["symbols"] else None
+        started = time.perf_counter()
+        names, offsets, times, prices = pivot_store.history(
+            options["timeframe"], options["deviation"], symbols
+        )
+        loaded = time.perf_counter() - started
+
+        started = time.perf_counter()
+        matches = PatternScanner().scan(prices, offsets)
+        scanned = time.perf_counter() - started
+        self.stdout.write(
+            f"пар: {len(names)}, точек: {len(prices)}; "
+            f"чтение {loaded:.2f} с, сканирование {scanned:.3f} с"
+        )
+
+        for name, indices in matches.items():
+            self.stdout.write(self.style.SUCCESS(f"  {name}: {len(indices)}"))
+            for row in indices[-options["last"] :] if options["last"] else []:
+                # индексы в склеенном массиве -> индексы в ряду пары
+                pair = int(np.searchsorted(offsets, row[0], side="right")) - 1
+                first, last = row[0] - offsets[pair], row[-1] - offsets[pair]
+                points = ", ".join(
+                    f"{int(times[i])}:{prices[i]:.8g}" for i in row.tolist()
+                )
+                self.stdout.write(f"    {names[pair]} [{first}..{last}] {points}")
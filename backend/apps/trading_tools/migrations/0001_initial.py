@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZigZagState',
+            fields=[
+                ('pk', models.CompositePrimaryKey('symbol', 'timeframe', 'deviation', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('symbol', models.CharField(max_length=20)),
+                ('timeframe', models.CharField(max_length=10)),
+                ('deviation', models.FloatField()),
+                ('state', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'zigzag_state',
+            },
+        ),
+    ]
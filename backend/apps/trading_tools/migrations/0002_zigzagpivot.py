@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading_tools', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZigZagPivot',
+            fields=[
+                ('pk', models.CompositePrimaryKey('symbol', 'timeframe', 'deviation', 'pivot_time', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('symbol', models.CharField(max_length=20)),
+                ('timeframe', models.CharField(max_length=10)),
+                ('deviation', models.FloatField()),
+                ('pivot_time', models.DateTimeField()),
+                ('price', models.FloatField()),
+                ('direction', models.SmallIntegerField()),
+            ],
+            options={
+                'db_table': 'zigzag_pivot',
+            },
+        ),
+        # гипертаблица по времени точки; ключ уже содержит pivot_time
+        migrations.RunSQL(
+            sql="""
+                SELECT create_hypertable(
+                    'zigzag_pivot',
+                    'pivot_time',
+                    chunk_time_interval => INTERVAL '1 year',
+                    if_not_exists => true
+                );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,3 +1,42 @@
 from django.db import models
 
-# Create your models here.
+
+class ZigZagState(models.Model):
+    """сохраненное состояние потокового zigzag для продолжения после рестарта"""
+
+    pk = models.CompositePrimaryKey("symbol", "timeframe", "deviation")
+    symbol = models.CharField(max_length=20)
+    timeframe = models.CharField(max_length=10)
+    deviation = models.FloatField()
+
+    state = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "zigzag_state"
+
+    def __str__(self):
+        return f"zigzag монета:{self.symbol} таймфрейм:{self.timeframe} отклонение: {self.deviation}"
+
+
+class ZigZagPivot(models.Model):
+    """
+    точка zigzag. таблица — гипертаблица timescaledb по pivot_time;
+    меняться может только хвост ряда (последние точки)
+    """
+
+    pk = models.CompositePrimaryKey("symbol", "timeframe", "deviation", "pivot_time")
+    symbol = models.CharField(max_length=20)
+    timeframe = models.CharField(max_length=10)
+    deviation = models.FloatField()
+    pivot_time = models.DateTimeField()
+
+    price = models.FloatField()
+    # 1 — максимум, -1 — минимум, 0 — стартовая точка ряда
+    direction = models.SmallIntegerField()
+
+    class Meta:
+        db_table = "zigzag_pivot"
+
+    def __str__(self):
+        return f"точка zigzag монета:{self.symbol} таймфрейм:{self.timeframe} время: {self.pivot_time}"
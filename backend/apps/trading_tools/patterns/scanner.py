@@ -0,0 +1,208 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _alternating(windows: np.ndarray) -> np.ndarray:
+    """точки окна чередуются: максимум, минимум, максимум..."""
+    steps = np.diff(windows, axis=1)
+    return (steps[:, :-1] * steps[:, 1:] < 0).all(axis=1)
+
+
+def _close(a: np.ndarray, b: np.ndarray, tolerance: float) -> np.ndarray:
+    """a и b отличаются не больше чем на tolerance от их среднего уровня"""
+    return np.abs(a - b) <= tolerance * np.abs(a + b) / 2
+
+
+class WindowPattern(ABC):
+    """
+    паттерн из size подряд идущих точек zigzag. mask получает все окна ряда
+    сразу (матрица окна × точки) и отвечает массивом bool по окнам
+    """
+
+    name: str
+    size: int
+
+    @abstractmethod
+    def mask(self, windows: np.ndarray) -> np.ndarray:
+        pass
+
+
+class HeadAndShoulders(WindowPattern):
+    """
+    плечо, шея, голова, шея, плечо: голова выше плеч, плечи и шея
+    примерно на одном уровне. inverse=True — перевернутый (по минимумам)
+    """
+
+    size = 5
+
+    def __init__(
+        self,
+        shoulder_tolerance: float = 0.03,
+        neckline_tolerance: float = 0.03,
+        inverse: bool = False,
+    ) -> None:
+        self.shoulder_tolerance = shoulder_tolerance
+        self.neckline_tolerance = neckline_tolerance
+        self.inverse = inverse
+        self.name = "inverse head and shoulders" if inverse else "head and shoulders"
+
+    def mask(self, windows: np.ndarray) -> np.ndarray:
+        # перевернутый паттерн — тот же паттерн на ценах с обратным знаком
+        w = -windows if self.inverse else windows
+        left, neck_left, head, neck_right, right = w.T
+        return (
+            _alternating(w)
+            & (left > neck_left)
+            & (head > np.maximum(left, right))
+            & (np.minimum(left, right) > np.maximum(neck_left, neck_right))
+            & _close(left, right, self.shoulder_tolerance)
+            & _close(neck_left, neck_right, self.neckline_tolerance)
+        )
+
+
+class DoubleTop(WindowPattern):
+    """
+    две вершины на одном уровне с откатом между ними не меньше min_depth.
+    inverse=True — двойное дно
+    """
+
+    size = 3
+
+    def __init__(
+        self, tolerance: float = 0.01, min_depth: float = 0.0, inverse: bool = False
+    ) -> None:
+        self.tolerance = tolerance
+        self.min_depth = min_depth
+        self.inverse = inverse
+        self.name = "double bottom" if inverse else "double top"
+
+    def mask(self, windows: np.ndarray) -> np.ndarray:
+        w = -windows if self.inverse else windows
+        first, middle, second = w.T
+        level = np.minimum(first, second)
+        return (
+            (first > middle)
+            & (second > middle)
+            & _close(first, second, self.tolerance)
+            & (level - middle >= self.min_depth * np.abs(level))
+        )
+
+
+class Triangle(WindowPattern):
+    """
+    сужение по size чередующимся точкам (по size/2 максимумов и минимумов):
+    symmetric — максимумы снижаются, минимумы растут; ascending — максимумы
+    на одном уровне, минимумы растут; descending — максимумы снижаются,
+    минимумы на одном уровне. шаг меньше tolerance считается ровным
+    """
+
+    KINDS = ("symmetric", "ascending", "descending")
+
+    def __init__(
+        self, kind: str = "symmetric", tolerance: float = 0.005, size: int = 6
+    ) -> None:
+        if kind not in self.KINDS:
+            raise ValueError(f"неизвестный треугольник: {kind}")
+        if size < 4 or size % 2:
+            raise ValueError("треугольник строится по четному числу точек, не меньше 4")
+        self.kind = kind
+        self.tolerance = tolerance
+        self.size = size
+        self.name = f"{kind} triangle"
+
+    def mask(self, windows: np.ndarray) -> np.ndarray:
+        starts_high = (windows[:, 0] > windows[:, 1])[:, None]
+        even, odd = windows[:, 0::2], windows[:, 1::2]
+        highs = np.where(starts_high, even, odd)
+        lows = np.where(starts_high, odd, even)
+        level = np.abs(windows).mean(axis=1, keepdims=True) * self.tolerance
+
+        high_steps, low_steps = np.diff(highs, axis=1), np.diff(lows, axis=1)
+        falling = (high_steps < -level).all(axis=1)
+        rising = (low_steps > level).all(axis=1)
+        if self.kind == "symmetric":
+            shape = falling & rising
+        elif self.kind == "ascending":
+            shape = (np.abs(high_steps) <= level).all(axis=1) & rising
+        else:
+            shape = falling & (np.abs(low_steps) <= level).all(axis=1)
+        return _alternating(windows) & shape
+
+
+def default_patterns() -> List[WindowPattern]:
+    return [
+        HeadAndShoulders(),
+        HeadAndShoulders(inverse=True),
+        DoubleTop(),
+        DoubleTop(inverse=True),
+        Triangle("symmetric"),
+        Triangle("ascending"),
+        Triangle("descending"),
+    ]
+
+
+class PatternScanner:
+    """
+    ищет паттерны по всему ряду точек zigzag: для каждого размера окна
+    строится одно представление sliding_window_view без копирования,
+    паттерн проверяется сравнениями массивов по всем окнам сразу.
+
+    несколько рядов (пар) сканируются одним вызовом: они склеиваются в один
+    массив, а окна, пересекающие границу рядов, отбрасываются
+    """
+
+    def __init__(self, patterns: Optional[Sequence[WindowPattern]] = None) -> None:
+        self.patterns = list(patterns) if patterns is not None else default_patterns()
+
+    def scan(
+        self, prices: np.ndarray, offsets: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        :param prices: цены точек zigzag по порядку
+        :param offsets: начала рядов в prices, если рядов несколько
+        :return: имя паттерна -> индексы точек каждого совпадения (совпадения × точки)
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        series = None
+        if offsets is not None and len(offsets) > 1:
+            series = np.zeros(len(prices), dtype=np.int64)
+            series[np.asarray(offsets[1:], dtype=np.int64)] = 1
+            series = np.cumsum(series)
+
+        windows: Dict[int, np.ndarray] = {}
+        matches: Dict[str, np.ndarray] = {}
+        for pattern in self.patterns:
+            size = pattern.size
+            if len(prices) < size:
+                matches[pattern.name] = np.empty((0, size), dtype=np.int64)
+                continue
+            if size not in windows:
+                windows[size] = sliding_window_view(prices, size)
+            mask = pattern.mask(windows[size])
+            if series is not None:
+                mask &= series[: len(mask)] == series[size - 1 :]
+            starts = np.flatnonzero(mask)
+            matches[pattern.name] = starts[:, None] + np.arange(size)
+        return matches
+
+    def matches(self, times: Sequence, prices: np.ndarray) -> List[Dict]:
+        """
+        совпадения одного ряда по порядку начала: паттерн, индексы и точки.
+        times — время точек в любом виде (мс или строки ISO)
+        """
+        times = list(times)
+        price_list = np.asarray(prices, dtype=np.float64).tolist()
+        found = []
+        for name, indices in self.scan(prices).items():
+            for row in indices.tolist():
+                found.append(
+                    {
+                        "pattern": name,
+                        "indices": row,
+                        "points": [{"time": times[i], "price": price_list[i]} for i in row],
+                    }
+                )
+        found.sort(key=lambda match: (match["indices"][0], match["pattern"]))
+        return found
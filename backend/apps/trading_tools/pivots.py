@@ -0,0 +1,489 @@
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from django.db import connection, transaction
+from apps.api.pgcopy import decode_binary_copy
+from apps.api.readers import CandleColumns, OHLCVReader, iso_times, ms_to_datetime
+from .indicators.zigzag_vectorized import find_pivots
+from .models import ZigZagPivot
+
+logger = logging.getLogger(__name__)
+
+
+class PivotSeries:
+    """
+    точки zigzag одной пары по всей истории в массивах numpy.
+
+    в массивах учтены все свечи, кроме последней: она может еще
+    формироваться, поэтому применяется к копии хвоста при каждом запросе
+    """
+
+    def __init__(self, deviation: float) -> None:
+        self.deviation = deviation
+        self.times = np.empty(0, dtype=np.int64)
+        self.prices = np.empty(0, dtype=np.float64)
+        self.trend = 0
+        # время последней учтенной (закрытой) свечи
+        self.closed_time: Optional[int] = None
+        # последняя свеча пары: время, high, low, close
+        self.forming: Optional[Tuple[int, float, float, float]] = None
+
+    def extend(self, columns: CandleColumns) -> None:
+        """
+        добавляет свечи не старше формирующейся (ее обновленная версия
+        приходит первой); последняя свеча снова считается формирующейся
+        """
+        if not len(columns):
+            return
+        if self.forming is not None and columns.candle_time[0] > self.forming[0]:
+            # прошлая формирующаяся свеча закрылась
+            forming_time, high, low, close = self.forming
+            self._apply(
+                np.array([forming_time]), np.array([high]), np.array([low]), close
+            )
+        if len(columns) > 1:
+            self._apply(
+                columns.candle_time[:-1],
+                columns.high[:-1],
+                columns.low[:-1],
+                float(columns.close[0]),
+            )
+        self.forming = (
+            int(columns.candle_time[-1]),
+            float(columns.high[-1]),
+            float(columns.low[-1]),
+            float(columns.close[-1]),
+        )
+
+    def _apply(self, times, highs, lows, first_close: float) -> None:
+        if not len(self.times):
+            indices, prices, self.trend = find_pivots(
+                highs, lows, first_close, self.deviation
+            )
+            self.times = np.asarray(times)[indices]
+            self.prices = prices
+        else:
+            indices, prices, self.trend = find_pivots(
+                highs, lows, self.prices[-1], self.deviation, start_trend=self.trend
+            )
+            if indices[0] >= 0:
+                # экстремум последней точки сдвинулся внутрь новых свечей
+                self.times = self.times.copy()
+                self.prices = self.prices.copy()
+                self.times[-1] = times[indices[0]]
+                self.prices[-1] = prices[0]
+            if len(indices) > 1:
+                self.times = np.concatenate([self.times, np.asarray(times)[indices[1:]]])
+                self.prices = np.concatenate([self.prices, prices[1:]])
+        self.closed_time = int(times[-1])
+
+    def _tail(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        последняя точка и точки после нее с учетом формирующейся свечи;
+        все точки до нее окончательные
+        """
+        if self.forming is None:
+            return self.times[-1:], self.prices[-1:]
+        forming_time, high, low, close = self.forming
+        if not len(self.times):
+            return np.array([forming_time]), np.array([close])
+        indices, prices, _ = find_pivots(
+            np.array([high]),
+            np.array([low]),
+            self.prices[-1],
+            self.deviation,
+            start_trend=self.trend,
+        )
+        times = np.where(indices >= 0, forming_time, self.times[-1])
+        return times.astype(np.int64), prices
+
+    def points(self) -> Tuple[np.ndarray, np.ndarray]:
+        """все точки ряда с учетом формирующейся свечи"""
+        tail_times, tail_prices = self._tail()
+        return (
+            np.concatenate([self.times[:-1], tail_times]),
+            np.concatenate([self.prices[:-1], tail_prices]),
+        )
+
+    def window(self, start: int, end: int) -> List[Dict]:
+        """
+        точки со временем в [start, end] и последняя точка перед start —
+        состояние, с которым zigzag входит в окно
+        """
+        final_times, final_prices = self.times[:-1], self.prices[:-1]
+        tail_times, tail_prices = self._tail()
+        lo = max(int(np.searchsorted(final_times, start)) - 1, 0)
+        hi = int(np.searchsorted(final_times, end, side="right"))
+        times = np.concatenate([final_times[lo:hi], tail_times])
+        prices = np.concatenate([final_prices[lo:hi], tail_prices])
+
+        first = max(int(np.searchsorted(times, start)) - 1, 0)
+        last = int(np.searchsorted(times, end, side="right"))
+        return [
+            {"time": point_time, "price": price}
+            for point_time, price in zip(
+                iso_times(times[first:last]).tolist(), prices[first:last].tolist()
+            )
+        ]
+
+
+class PivotCache:
+    """
+    точки zigzag по всей истории пары (symbol, timeframe) в памяти процесса,
+    сразу для нескольких отклонений: ряды пары лежат в одной записи и
+    пополняются одним чтением свечей на всех. первый запрос строит ряды за
+    один проход по гипертаблице пачками, дальше читаются только свечи новее
+    учтенных. раз в rebuild_after секунд ряды пары пересобираются в фоне,
+    запросы тем временем отвечают по прежним
+    """
+
+    def __init__(
+        self,
+        max_series: int = 64,
+        batch_size: int = 500_000,
+        rebuild_after: float = 3600.0,
+        max_deviations: int = 16,
+    ) -> None:
+        self.max_series = max_series
+        self.batch_size = batch_size
+        # дозагруженная задним числом история видна только после пересборки
+        self.rebuild_after = rebuild_after
+        # сколько отклонений держится на пару (давно не запрошенные вытесняются)
+        self.max_deviations = max_deviations
+        # (symbol, timeframe) -> (отклонение -> ряд, время постройки)
+        self.series: "OrderedDict[tuple, Tuple[OrderedDict, float]]" = OrderedDict()
+        self.reader = OHLCVReader()
+        self._lock = threading.Lock()
+        self._locks: Dict[tuple, threading.Lock] = {}
+        # пары, ряды которых сейчас пересобираются в фоне
+        self._rebuilding: Set[tuple] = set()
+
+    def _series_lock(self, key: tuple) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def invalidate(self, symbol: str) -> None:
+        """ряды пары строятся заново: история изменилась задним числом"""
+        with self._lock:
+            for key in [key for key in self.series if key[0] == symbol]:
+                del self.series[key]
+
+    def window(
+        self, symbol: str, timeframe: str, deviation: float, start: int, end: int
+    ) -> List[Dict]:
+        """точки ряда в окне [start, end] (мс) вместе с точкой перед окном"""
+        return self.windows(symbol, timeframe, [deviation], start, end)[deviation]
+
+    def windows(
+        self,
+        symbol: str,
+        timeframe: str,
+        deviations: Sequence[float],
+        start: int,
+        end: int,
+    ) -> Dict[float, List[Dict]]:
+        """окно [start, end] (мс) для каждого отклонения; ряды строятся вместе"""
+        key = (symbol, timeframe)
+        with self._series_lock(key):
+            group = self._refresh(key, deviations)
+            return {
+                deviation: group[deviation].window(start, end) for deviation in deviations
+            }
+
+    def _refresh(self, key: tuple, deviations: Sequence[float]) -> "OrderedDict":
+        """
+        дочитывает свечи новее учтенных (поиск по индексу) одним запросом
+        для всех рядов пары; недостающие отклонения строятся одним проходом
+        """
+        symbol, timeframe = key
+        cached = self.series.get(key)
+        if cached is None:
+            cached = (OrderedDict(), time.monotonic())
+        elif time.monotonic() - cached[1] > self.rebuild_after:
+            self._rebuild_later(key, cached)
+        group = cached[0]
+        if group:
+            # формирующаяся свеча перечитывается: она могла измениться
+            marks = {
+                deviation: series.forming[0] if series.forming else series.closed_time
+                for deviation, series in group.items()
+            }
+            known = [mark for mark in marks.values() if mark is not None]
+            columns = self.reader.read(
+                symbol, timeframe, after=min(known) - 1 if known else None
+            )
+            for deviation, series in group.items():
+                since = marks[deviation]
+                first = 0
+                if since is not None:
+                    first = int(np.searchsorted(columns.candle_time, since))
+                series.extend(columns[first:])
+
+        missing = [
+            deviation for deviation in dict.fromkeys(deviations) if deviation not in group
+        ]
+        if missing:
+            group.update(self.build(symbol, timeframe, missing))
+        for deviation in deviations:
+            group.move_to_end(deviation)
+        while len(group) > max(self.max_deviations, len(set(deviations))):
+            group.popitem(last=False)
+
+        with self._lock:
+            self.series[key] = cached
+            self.series.move_to_end(key)
+            while len(self.series) > self.max_series:
+                self.series.popitem(last=False)
+        return group
+
+    def _rebuild_later(self, key: tuple, cached: tuple) -> None:
+        with self._lock:
+            if key in self._rebuilding:
+                return
+            self._rebuilding.add(key)
+        threading.Thread(
+            target=self._rebuild, args=(key, list(cached[0]), cached[1]), daemon=True
+        ).start()
+
+    def _rebuild(self, key: tuple, deviations: List[float], built_at: float) -> None:
+        """
+        полная пересборка рядов пары в фоновом потоке: подменяет запись,
+        только если ее не сбросили и не пересобрали за это время
+        """
+        try:
+            fresh = OrderedDict(self.build(*key, deviations))
+            with self._series_lock(key):
+                cached = self.series.get(key)
+                if cached is None or cached[1] != built_at:
+                    return
+                # отклонения, добавленные во время сборки, берутся как есть
+                for deviation, series in cached[0].items():
+                    fresh.setdefault(deviation, series)
+                    fresh.move_to_end(deviation)
+                with self._lock:
+                    if key in self.series:
+                        self.series[key] = (fresh, time.monotonic())
+        except Exception:
+            logger.exception(f"Ошибка пересборки точек zigzag {key}")
+        finally:
+            # у потока свое соединение с БД
+            connection.close()
+            with self._lock:
+                self._rebuilding.discard(key)
+
+    def build(
+        self, symbol: str, timeframe: str, deviations: Sequence[float]
+    ) -> Dict[float, PivotSeries]:
+        """
+        ряды для всех отклонений за один проход по свечам пары (без кеша:
+        так же строит таблицу zigzag_pivot пересборка по всей истории)
+        """
+        group = {deviation: PivotSeries(deviation) for deviation in deviations}
+        after = None
+        while True:
+            columns = self.reader.read(
+                symbol, timeframe, limit=self.batch_size, after=after
+            )
+            for series in group.values():
+                series.extend(columns)
+            if len(columns) < self.batch_size:
+                return group
+            after = int(columns.candle_time[-1])
+
+
+pivot_cache = PivotCache()
+
+
+def pivot_directions(prices: np.ndarray) -> np.ndarray:
+    """
+    1 — максимум, -1 — минимум (по предыдущей точке);
+    у первой точки предыдущей нет, она считается стартовой (0)
+    """
+    directions = np.zeros(len(prices), dtype=np.int16)
+    if len(prices) > 1:
+        directions[1:] = np.sign(np.diff(prices))
+    return directions
+
+
+class PivotStore:
+    """
+    точки zigzag в гипертаблице zigzag_pivot. при обновлении переписывается
+    только хвост: строки после последней окончательной точки
+    """
+
+    @transaction.atomic
+    def sync(
+        self,
+        symbol: str,
+        timeframe: str,
+        deviation: float,
+        pivots: List[Dict],
+        after: Optional[int],
+    ) -> int:
+        """
+        pivots — точки с временем в мс. строки до after (мс) включительно
+        окончательные; все, что позже, заменяется точками из pivots.
+        after=None — ряд переписывается целиком
+        """
+        rows = ZigZagPivot.objects.filter(
+            symbol=symbol, timeframe=timeframe, deviation=deviation
+        )
+        if after is not None:
+            rows = rows.filter(pivot_time__gt=ms_to_datetime(after))
+        rows.delete()
+
+        first = 0
+        if after is not None:
+            while first < len(pivots) and pivots[first]["time"] <= after:
+                first += 1
+        # предыдущая точка нужна, чтобы определить направление первой новой
+        context = pivots[max(first - 1, 0) :]
+        offset = 1 if first > 0 else 0
+        prices = np.array([p["price"] for p in context], dtype=np.float64)
+        directions = pivot_directions(prices)
+        ZigZagPivot.objects.bulk_create(
+            ZigZagPivot(
+                symbol=symbol,
+                timeframe=timeframe,
+                deviation=deviation,
+                pivot_time=ms_to_datetime(point["time"]),
+                price=point["price"],
+                direction=int(direction),
+            )
+            for point, direction in zip(context[offset:], directions[offset:])
+        )
+        return len(context) - offset
+
+    @transaction.atomic
+    def replace(
+        self,
+        symbol: str,
+        timeframe: str,
+        deviation: float,
+        times: np.ndarray,
+        prices: np.ndarray,
+        batch_size: int = 10_000,
+    ) -> None:
+        """полностью перезаписывает ряд (пересборка по всей истории)"""
+        ZigZagPivot.objects.filter(
+            symbol=symbol, timeframe=timeframe, deviation=deviation
+        ).delete()
+        directions = pivot_directions(prices)
+        ZigZagPivot.objects.bulk_create(
+            (
+                ZigZagPivot(
+                    symbol=symbol,
+                    timeframe=timeframe,
+                    deviation=deviation,
+                    pivot_time=ms_to_datetime(point_time),
+                    price=price,
+                    direction=direction,
+                )
+                for point_time, price, direction in zip(
+                    times.tolist(), prices.tolist(), directions.tolist()
+                )
+            ),
+            batch_size=batch_size,
+        )
+
+    def window(
+        self,
+        symbol: str,
+        timeframe: str,
+        deviation: float,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        точки в [start, end] (мс) и последняя точка перед start.
+        возвращает (время в мс, цены, направления)
+        """
+        key = "symbol = %s AND timeframe = %s AND deviation = %s"
+        select = (
+            "SELECT (extract(epoch FROM pivot_time) * 1000)::int8, price, direction "
+            "FROM zigzag_pivot WHERE " + key
+        )
+        params: list = [symbol, timeframe, deviation]
+        query = select
+        if start is not None:
+            query += " AND pivot_time >= %s"
+            params.append(ms_to_datetime(start))
+        if end is not None:
+            query += " AND pivot_time <= %s"
+            params.append(ms_to_datetime(end))
+        if start is not None:
+            query = (
+                f"({select} AND pivot_time < %s ORDER BY pivot_time DESC LIMIT 1) "
+                f"UNION ALL ({query})"
+            )
+            params = [symbol, timeframe, deviation, ms_to_datetime(start)] + params
+        query = f"SELECT * FROM ({query}) AS points ORDER BY 1"
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        if not rows:
+            return (
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.float64),
+                np.empty(0, dtype=np.int16),
+            )
+        times, prices, directions = zip(*rows)
+        return (
+            np.array(times, dtype=np.int64),
+            np.array(prices, dtype=np.float64),
+            np.array(directions, dtype=np.int16),
+        )
+
+    def history(
+        self,
+        timeframe: str,
+        deviation: float,
+        symbols: Optional[List[str]] = None,
+    ) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        точки всех пар (или symbols) одним чтением для сканирования истории:
+        ряды пар подряд по порядку symbol, время — по возрастанию.
+        возвращает (пары, начала их рядов, время в мс, цены)
+        """
+        where = "timeframe = %s AND deviation = %s"
+        params: list = [timeframe, deviation]
+        if symbols is not None:
+            where += " AND symbol = ANY(%s)"
+            params.append(list(symbols))
+
+        buffer = io.BytesIO()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT symbol, count(*) FROM zigzag_pivot WHERE {where} "
+                "GROUP BY symbol ORDER BY symbol",
+                params,
+            )
+            counts = cursor.fetchall()
+            sql = cursor.mogrify(
+                "SELECT (extract(epoch FROM pivot_time) * 1000)::int8, price "
+                f"FROM zigzag_pivot WHERE {where} ORDER BY symbol, pivot_time",
+                params,
+            )
+            if isinstance(sql, bytes):
+                sql = sql.decode()
+            cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT binary)", buffer)
+
+        columns = decode_binary_copy(
+            buffer.getbuffer(), (("pivot_time", "i8"), ("price", "f8"))
+        )
+        sizes = np.array([count for _, count in counts], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        return (
+            [symbol for symbol, _ in counts],
+            offsets,
+            columns["pivot_time"],
+            columns["price"],
+        )
+
+
+pivot_store = PivotStore()
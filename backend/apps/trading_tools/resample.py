@@ -0,0 +1,151 @@
+import re
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+# единицы таймфреймов в нотации ccxt, мс
+TIMEFRAME_UNITS = {
+    "m": 60_000,
+    "h": 3_600_000,
+    "d": 86_400_000,
+    "w": 604_800_000,
+}
+
+
+def timeframe_ms(timeframe: str) -> int:
+    """длительность таймфрейма вида 7m, 2h, 3d в мс"""
+    match = re.fullmatch(r"(\d+)([mhdw])", timeframe)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"неверный таймфрейм: {timeframe}")
+    return int(match.group(1)) * TIMEFRAME_UNITS[match.group(2)]
+
+
+def bucket_times(times: np.ndarray, interval: int, origin: int = 0) -> np.ndarray:
+    """начало интервала для каждой свечи (как time_bucket в timescaledb)"""
+    times = np.asarray(times, dtype=np.int64)
+    return times - (times - origin) % interval
+
+
+def resample_arrays(
+    times: np.ndarray,
+    opens: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    volumes: np.ndarray,
+    interval: int,
+    origin: int = 0,
+) -> Tuple[np.ndarray, ...]:
+    """
+    сворачивает свечи (по возрастанию времени) в интервалы interval мс
+    одним проходом reduceat по границам интервалов.
+
+    :return: (время, open, high, low, close, volume) новых свечей
+    """
+    n = len(times)
+    if n == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return np.empty(0, dtype=np.int64), empty, empty, empty, empty, empty
+    buckets = bucket_times(times, interval, origin)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return (
+        buckets[starts],
+        np.asarray(opens, dtype=np.float64)[starts],
+        np.maximum.reduceat(np.asarray(highs, dtype=np.float64), starts),
+        np.minimum.reduceat(np.asarray(lows, dtype=np.float64), starts),
+        np.asarray(closes, dtype=np.float64)[ends],
+        np.add.reduceat(np.asarray(volumes, dtype=np.float64), starts),
+    )
+
+
+class IncrementalResampler:
+    """
+    формирующаяся свеча произвольного интервала, обновляемая по тикам
+    (сделкам) или по свечам базового таймфрейма формата ccxt — один
+    экземпляр работает в одном из режимов.
+
+    обновление формирующейся базовой свечи (то же время) заменяет ее прошлую
+    версию, а не добавляется к ней: объем не задваивается
+    """
+
+    def __init__(self, interval: int, origin: int = 0) -> None:
+        self.interval = interval
+        self.origin = origin
+        self.bucket: Optional[int] = None
+        # свертка закрытых базовых свечей интервала: open, high, low, close, volume
+        self._closed: Optional[List[float]] = None
+        # последняя (формирующаяся) базовая свеча интервала и ее время
+        self._forming: Optional[List[float]] = None
+        self._forming_ts: Optional[int] = None
+
+    @property
+    def bar(self) -> Optional[List[float]]:
+        """текущая свеча интервала [ts, open, high, low, close, volume]"""
+        if self.bucket is None:
+            return None
+        parts = [p for p in (self._closed, self._forming) if p is not None]
+        return [
+            self.bucket,
+            parts[0][0],
+            max(p[1] for p in parts),
+            min(p[2] for p in parts),
+            parts[-1][3],
+            sum(p[4] for p in parts),
+        ]
+
+    def update(self, ohlcv_data: Sequence[Sequence[float]]) -> List[List[float]]:
+        """
+        применяет базовые свечи [ts, open, high, low, close, volume] и
+        возвращает измененные свечи интервала: закрывшиеся и текущую
+        """
+        changed: List[List[float]] = []
+        for data in ohlcv_data:
+            ts = int(data[0])
+            bucket = ts - (ts - self.origin) % self.interval
+            if self.bucket is not None and bucket < self.bucket:
+                continue  # запоздавшая свеча уже закрытого интервала
+            if bucket != self.bucket:
+                if self.bucket is not None:
+                    changed.append(self.bar)
+                self.bucket = bucket
+                self._closed = None
+                self._forming = None
+            elif self._forming is not None and ts > self._forming_ts:
+                self._closed = self._merge(self._closed, self._forming)
+            elif self._forming is not None and ts < self._forming_ts:
+                continue
+            self._forming_ts = ts
+            self._forming = [float(v) for v in data[1:6]]
+        if self.bucket is not None and (not changed or changed[-1][0] != self.bucket):
+            changed.append(self.bar)
+        return changed
+
+    def update_trade(self, ts: int, price: float, amount: float) -> List[List[float]]:
+        """применяет сделку (тик) как базовую свечу из одной цены"""
+        ts = int(ts)
+        bucket = ts - (ts - self.origin) % self.interval
+        if self.bucket is not None and bucket < self.bucket:
+            return []
+        changed: List[List[float]] = []
+        if bucket != self.bucket:
+            if self.bucket is not None:
+                changed.append(self.bar)
+            self.bucket = bucket
+            self._closed = None
+            self._forming = None
+        trade = [price, price, price, price, amount]
+        self._closed = self._merge(self._closed, trade)
+        changed.append(self.bar)
+        return changed
+
+    @staticmethod
+    def _merge(first: Optional[List[float]], second: List[float]) -> List[float]:
+        if first is None:
+            return list(second)
+        return [
+            first[0],
+            max(first[1], second[1]),
+            min(first[2], second[2]),
+            second[3],
+            first[4] + second[4],
+        ]
@@ -1,3 +1,421 @@
-from django.test import TestCase
+import pickle
+import time
+import numpy as np
+from django.test import SimpleTestCase
+from apps.api.tests import FakeReader
+from apps.api.readers import CANDLE_FIELDS, CandleColumns, iso_times
+from .backtest import Backtester
+from .grid import GridRunner, SharedCandles
+from .indicators.zigzag import IncrementalZigZag, ZigZagCalculator
+from .indicators.zigzag_vectorized import VectorizedZigZagCalculator, find_pivots
+from .patterns.base import PatternDetector
+from .patterns.scanner import DoubleTop, HeadAndShoulders, PatternScanner, Triangle
+from .pivots import PivotCache, PivotSeries
+from .resample import IncrementalResampler, resample_arrays
+from .strategies.simple_strategy import SimpleStrategy
 
-# Create your tests here.
+
+def make_columns(count: int, volatility: float = 0.003, seed: int = 1) -> CandleColumns:
+    """синтетические свечи случайного блуждания"""
+    rnd = np.random.default_rng(seed)
+    close = 100.0 * np.cumprod(1 + rnd.normal(0, volatility, count))
+    open_price = np.concatenate(([100.0], close[:-1]))
+    spread = np.abs(rnd.normal(0, volatility / 3, count))
+    return CandleColumns(
+        candle_time=1_700_000_000_000 + np.arange(count, dtype=np.int64) * 60_000,
+        open=open_price,
+        high=np.maximum(open_price, close) * (1 + spread),
+        low=np.minimum(open_price, close) * (1 - spread),
+        close=close,
+        volume=rnd.uniform(1, 100, count),
+    )
+
+
+def to_dicts(columns: CandleColumns):
+    return [
+        {"candle_time": t, "open": o, "high": h, "low": l, "close": c}
+        for t, o, h, l, c in zip(
+            columns.candle_time.tolist(),
+            columns.open.tolist(),
+            columns.high.tolist(),
+            columns.low.tolist(),
+            columns.close.tolist(),
+        )
+    ]
+
+
+def reference_pivots(columns: CandleColumns, deviation: float):
+    return ZigZagCalculator(deviation=deviation).calculate(to_dicts(columns))
+
+
+class ZigZagTests(SimpleTestCase):
+    deviations = (0.002, 0.01, 0.05)
+
+    def test_vectorized_matches_reference(self):
+        for seed in (1, 2, 3):
+            columns = make_columns(3000, seed=seed)
+            for deviation in self.deviations:
+                expected = reference_pivots(columns, deviation)
+                calculator = VectorizedZigZagCalculator(deviation=deviation)
+                self.assertEqual(calculator.calculate(to_dicts(columns)), expected)
+                self.assertEqual(
+                    calculator.calculate_arrays(
+                        columns.candle_time, columns.high, columns.low, columns.close
+                    ),
+                    expected,
+                )
+
+    def test_find_pivots_continues_across_chunks(self):
+        columns = make_columns(3000, seed=4)
+        for deviation in self.deviations:
+            whole, whole_prices, whole_trend = find_pivots(
+                columns.high, columns.low, float(columns.close[0]), deviation
+            )
+            split = 1234
+            head, head_prices, trend = find_pivots(
+                columns.high[:split],
+                columns.low[:split],
+                float(columns.close[0]),
+                deviation,
+            )
+            tail, tail_prices, tail_trend = find_pivots(
+                columns.high[split:],
+                columns.low[split:],
+                head_prices[-1],
+                deviation,
+                start_trend=trend,
+            )
+            if tail[0] >= 0:
+                # экстремум последней точки сдвинулся во второй участок
+                head[-1], head_prices[-1] = tail[0] + split, tail_prices[0]
+            indices = np.concatenate([head, tail[1:] + split])
+            prices = np.concatenate([head_prices, tail_prices[1:]])
+            np.testing.assert_array_equal(indices, whole)
+            np.testing.assert_array_equal(prices, whole_prices)
+            self.assertEqual(tail_trend, whole_trend)
+
+    def test_incremental_matches_reference_with_forming_updates(self):
+        columns = make_columns(2000, seed=5)
+        data = to_dicts(columns)
+        for deviation in self.deviations:
+            zigzag = IncrementalZigZag(deviation=deviation)
+            for candle in data:
+                # сначала неокончательная версия свечи, затем закрытая
+                forming = dict(
+                    candle,
+                    high=(candle["open"] + candle["high"]) / 2,
+                    low=(candle["open"] + candle["low"]) / 2,
+                    close=candle["open"],
+                )
+                zigzag.update(forming)
+                zigzag.update(candle)
+            self.assertEqual(zigzag.pivots, reference_pivots(columns, deviation))
+
+
+class PivotSeriesTests(SimpleTestCase):
+    def test_window_matches_reference(self):
+        columns = make_columns(1500, seed=6)
+        deviation = 0.005
+        series = PivotSeries(deviation)
+        # последняя свеча каждой пачки формируется и приходит снова в следующей
+        for lo, hi in ((0, 400), (399, 401), (400, 1100), (1099, 1500)):
+            series.extend(columns[lo:hi])
+
+        reference = reference_pivots(columns, deviation)
+        times = np.array([point["time"] for point in reference], dtype=np.int64)
+        prices = [point["price"] for point in reference]
+        for start, end in (
+            (columns.candle_time[0], columns.candle_time[-1]),
+            (columns.candle_time[300], columns.candle_time[900]),
+            (columns.candle_time[1400], columns.candle_time[-1] + 1),
+        ):
+            first = max(int(np.searchsorted(times, start)) - 1, 0)
+            last = int(np.searchsorted(times, end, side="right"))
+            expected = [
+                {"time": point_time, "price": price}
+                for point_time, price in zip(
+                    iso_times(times[first:last]).tolist(), prices[first:last]
+                )
+            ]
+            self.assertEqual(series.window(int(start), int(end)), expected)
+
+
+class PivotCacheTests(SimpleTestCase):
+    deviations = [0.004, 0.01, 0.02]
+
+    def test_windows_match_separate_builds(self):
+        columns = make_columns(2000, seed=9)
+        cache = PivotCache(batch_size=300)
+        cache.reader = FakeReader(columns[:1200])
+        cache.windows("A/B", "1m", self.deviations[:1], 0, 1)
+        # остальные отклонения строятся вместе, ряды дочитывают новые свечи
+        cache.reader.columns = columns
+        start, end = int(columns.candle_time[500]), int(columns.candle_time[-1])
+        windows = cache.windows("A/B", "1m", self.deviations, start, end)
+        for deviation in self.deviations:
+            series = PivotSeries(deviation)
+            series.extend(columns)
+            self.assertEqual(windows[deviation], series.window(start, end))
+
+    def test_stale_series_rebuilt_in_background(self):
+        columns = make_columns(1500, seed=10)
+        cache = PivotCache()
+        cache.reader = FakeReader(columns)
+        deviation = self.deviations[0]
+        start, end = int(columns.candle_time[0]), int(columns.candle_time[-1])
+        before = cache.window("A/B", "1m", deviation, start, end)
+
+        # история изменилась задним числом: видно только после пересборки
+        changed = columns[:]
+        changed.high = changed.high.copy()
+        changed.high[100] *= 1.5
+        cache.reader = FakeReader(changed)
+        cache.rebuild_after = 0
+        self.assertEqual(cache.window("A/B", "1m", deviation, start, end), before)
+        deadline = time.monotonic() + 10
+        while cache._rebuilding and time.monotonic() < deadline:
+            time.sleep(0.01)
+        cache.rebuild_after = 3600
+        series = PivotSeries(deviation)
+        series.extend(changed)
+        after = cache.window("A/B", "1m", deviation, start, end)
+        self.assertEqual(after, series.window(start, end))
+        self.assertNotEqual(after, before)
+
+
+class PatternScannerTests(SimpleTestCase):
+    # паттерн, его перевернутая пара (None — ее нет) и точки, где он есть
+    cases = [
+        (HeadAndShoulders(), HeadAndShoulders(inverse=True), [1, 0.5, 1.5, 0.5, 1]),
+        (HeadAndShoulders(inverse=True), HeadAndShoulders(), [1, 1.5, 0.5, 1.5, 1]),
+        (DoubleTop(), DoubleTop(inverse=True), [1, 0.8, 1]),
+        (DoubleTop(inverse=True), DoubleTop(), [1, 1.2, 1]),
+        (Triangle("symmetric"), None, [2, 1, 1.8, 1.2, 1.6, 1.4]),
+        (Triangle("ascending"), None, [2, 1, 2, 1.2, 2, 1.4]),
+        (Triangle("descending"), None, [2, 1, 1.8, 1, 1.6, 1]),
+    ]
+
+    def test_patterns_on_built_points(self):
+        for pattern, inverse, prices in self.cases:
+            patterns = [pattern] + ([inverse] if inverse else [])
+            found = PatternScanner(patterns).scan(np.array(prices) * 100)
+            self.assertEqual(found[pattern.name].tolist(), [list(range(len(prices)))])
+            if inverse:
+                self.assertEqual(len(found[inverse.name]), 0)
+
+    def test_triangle_kinds_exclusive(self):
+        scanner = PatternScanner([Triangle(kind) for kind in Triangle.KINDS])
+        for pattern, _, prices in self.cases[4:]:
+            found = {name: len(m) for name, m in scanner.scan(prices).items()}
+            expected = {name: int(name == pattern.name) for name in found}
+            self.assertEqual(found, expected)
+
+    def test_triangle_arguments(self):
+        with self.assertRaises(ValueError):
+            Triangle("flag")
+        with self.assertRaises(ValueError):
+            Triangle(size=5)
+
+    def test_windows_across_offsets_dropped(self):
+        scanner = PatternScanner([DoubleTop()])
+        prices = np.array([1, 0.8, 1, 0.8, 1])
+        self.assertEqual(
+            scanner.scan(prices)["double top"].tolist(), [[0, 1, 2], [2, 3, 4]]
+        )
+        # второй ряд начинается с индекса 2: первое окно захватывает оба
+        found = scanner.scan(prices, offsets=np.array([0, 2]))
+        self.assertEqual(found["double top"].tolist(), [[2, 3, 4]])
+        found = scanner.scan(prices, offsets=np.array([0, 1, 4]))
+        self.assertEqual(len(found["double top"]), 0)
+
+    def test_matches_ordered_by_start(self):
+        times = [1000, 2000, 3000, 4000, 5000]
+        found = PatternScanner().matches(times, [1, 0.5, 1.5, 0.5, 1])
+        self.assertEqual(
+            [(match["pattern"], match["indices"]) for match in found],
+            [("head and shoulders", [0, 1, 2, 3, 4]), ("double bottom", [1, 2, 3])],
+        )
+        self.assertEqual(
+            found[1]["points"],
+            [
+                {"time": 2000, "price": 0.5},
+                {"time": 3000, "price": 1.5},
+                {"time": 4000, "price": 0.5},
+            ],
+        )
+
+
+class ResampleTests(SimpleTestCase):
+    def test_incremental_matches_resample_arrays(self):
+        columns = make_columns(1000, seed=7)
+        interval = 15 * 60_000
+        expected = np.column_stack(
+            resample_arrays(
+                columns.candle_time,
+                columns.open,
+                columns.high,
+                columns.low,
+                columns.close,
+                columns.volume,
+                interval,
+            )
+        )
+        resampler = IncrementalResampler(interval)
+        bars = {}
+        for row in zip(
+            columns.candle_time.tolist(),
+            columns.open.tolist(),
+            columns.high.tolist(),
+            columns.low.tolist(),
+            columns.close.tolist(),
+            columns.volume.tolist(),
+        ):
+            # формирующаяся версия свечи заменяется закрытой, объем не задваивается
+            forming = [row[0], row[1], row[1], row[1], row[1], row[5] / 2]
+            for bar in resampler.update([forming]) + resampler.update([row]):
+                bars[bar[0]] = bar
+        np.testing.assert_allclose(
+            np.array([bars[ts] for ts in sorted(bars)]), expected, rtol=1e-12
+        )
+
+    def test_trades_match_resample_arrays(self):
+        rnd = np.random.default_rng(8)
+        times = np.sort(rnd.integers(0, 3_600_000, 500))
+        prices = 100 + rnd.normal(0, 1, 500).cumsum()
+        amounts = rnd.uniform(0.1, 2, 500)
+        interval = 5 * 60_000
+        expected = np.column_stack(
+            resample_arrays(times, prices, prices, prices, prices, amounts, interval)
+        )
+        resampler = IncrementalResampler(interval)
+        bars = {}
+        for ts, price, amount in zip(times.tolist(), prices.tolist(), amounts.tolist()):
+            for bar in resampler.update_trade(ts, price, amount):
+                bars[bar[0]] = bar
+        np.testing.assert_allclose(
+            np.array([bars[ts] for ts in sorted(bars)]), expected, rtol=1e-12
+        )
+
+
+class BacktesterTests(SimpleTestCase):
+    deviation, fee, slippage = 0.01, 0.001, 0.0005
+
+    def naive_equity(self, data):
+        """
+        эталон: на каждой свече zigzag пересчитывается по всему префиксу,
+        сигнал на появлении точки исполняется по open следующей свечи
+        """
+        position, equity, entry, start = 0, 1.0, None, 1.0
+        curve, fills, seen = [], [], 0
+        for t, candle in enumerate(data):
+            if fills and fills[-1][0] == t:
+                target = fills[-1][1]
+                if position:
+                    exit_price = candle["open"] * (1 - self.slippage * position)
+                    equity = (
+                        start
+                        * (1 - self.fee)
+                        * (1 + position * (exit_price / entry - 1))
+                        * (1 - self.fee)
+                    )
+                if target:
+                    entry = candle["open"] * (1 + self.slippage * target)
+                    start = equity
+                position = target
+            if position:
+                curve.append(
+                    start
+                    * (1 - self.fee)
+                    * (1 + position * (candle["close"] / entry - 1))
+                )
+            else:
+                curve.append(equity)
+            points = ZigZagCalculator(deviation=self.deviation).calculate(data[: t + 1])
+            if len(points) > seen and len(points) >= 2 and t + 1 < len(data):
+                signal = SimpleStrategy().execute(points[-5:])
+                target = {"LONG": 1, "SHORT": -1}.get(signal)
+                if target is not None and target != (fills[-1][1] if fills else 0):
+                    fills.append((t + 1, target))
+            seen = len(points)
+        return np.array(curve)
+
+    def test_equity_matches_prefix_recompute(self):
+        for seed in (1, 2, 3):
+            columns = make_columns(400, seed=seed)
+            result = Backtester(
+                SimpleStrategy(),
+                deviation=self.deviation,
+                fee=self.fee,
+                slippage=self.slippage,
+            ).run(columns)
+            expected = self.naive_equity(to_dicts(columns))
+            self.assertGreater(result.stats["trades"], 0)
+            np.testing.assert_allclose(result.equity, expected, rtol=0, atol=1e-12)
+
+    def test_detector_gates_only_entries(self):
+        class FirstOnly(PatternDetector):
+            calls = 0
+
+            def detect(self, data):
+                self.calls += 1
+                return self.calls == 1
+
+        columns = make_columns(400, seed=1)
+        detector = FirstOnly()
+        backtester = Backtester(SimpleStrategy(), detector=detector, allow_short=False)
+        _, positions = backtester._signals(columns)
+        # единственный разрешенный вход и выход по следующему сигналу
+        self.assertEqual(positions.tolist(), [1, 0])
+        self.assertGreater(detector.calls, 1)
+
+    def test_profit_factor_without_losses(self):
+        columns = make_columns(50)
+        backtester = Backtester(SimpleStrategy())
+        result = backtester.run(columns)
+        result.trades["return"] = np.array([0.01, 0.02])
+        segment = np.zeros(len(columns), dtype=np.int64)
+        stats = backtester._stats(result, segment, np.ones(1))
+        self.assertEqual(stats["profit_factor"], float("inf"))
+
+
+class GridTests(SimpleTestCase):
+    def test_shared_candles_round_trip(self):
+        columns = {"A/B": make_columns(300, seed=1), "C/D": make_columns(50, seed=4)}
+        shared = SharedCandles.create(columns)
+        try:
+            attached = pickle.loads(pickle.dumps(shared))
+            attached.attach()
+            for symbol, candles in columns.items():
+                restored = attached.columns(symbol)
+                for name, _ in CANDLE_FIELDS:
+                    np.testing.assert_array_equal(
+                        getattr(restored, name), getattr(candles, name)
+                    )
+                    self.assertEqual(
+                        getattr(restored, name).dtype, getattr(candles, name).dtype
+                    )
+            attached.close()
+        finally:
+            shared.close(unlink=True)
+
+    def test_results_match_direct_backtests(self):
+        columns = {"A/B": make_columns(400, seed=2), "C/D": make_columns(400, seed=3)}
+        grid = {"deviation": [0.005, 0.01], "allow_short": [True, False]}
+        for workers in (1, 2):
+            results = GridRunner(workers=workers).run(columns, grid)
+            self.assertEqual(len(results), 8)
+            for result in results:
+                direct = Backtester(SimpleStrategy(), **result["params"]).run(
+                    columns[result["symbol"]]
+                )
+                self.assertEqual(result["stats"], direct.stats)
+
+    def test_rank_direction(self):
+        results = [
+            {"stats": {"sharpe": 1.0, "max_drawdown": 0.3}},
+            {"stats": {}},
+            {"stats": {"sharpe": 2.0, "max_drawdown": 0.1}},
+        ]
+        for metric, order in (("sharpe", [2.0, 1.0]), ("max_drawdown", [0.1, 0.3])):
+            ranked = GridRunner(metric=metric).rank(results)
+            self.assertEqual([r["stats"].get(metric) for r in ranked], order + [None])
@@ -0,0 +1,176 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from .indicators.zigzag import IncrementalZigZag
+from .models import ZigZagState
+from .pivots import PivotCache
+
+logger = logging.getLogger(__name__)
+
+
+class ZigZagTracker:
+    """
+    держит потоковые zigzag по каждой паре (symbol, timeframe) и сохраняет
+    их состояние в БД при закрытии свечи, чтобы после рестарта не
+    пересчитывать историю
+    """
+
+    def __init__(
+        self,
+        deviation: float = 0.01,
+        store=None,
+        keep: int = 16,
+        timeframes: Optional[Sequence[str]] = None,
+    ) -> None:
+        self.deviation = deviation
+        # таймфреймы, по которым ведется zigzag (None — все)
+        self.timeframes = set(timeframes) if timeframes is not None else None
+        self.engines: Dict[Tuple[str, str], IncrementalZigZag] = {}
+        # время последней окончательной точки, записанной в zigzag_pivot
+        self.synced_until: Dict[Tuple[str, str], Optional[int]] = {}
+        # PivotStore: точки пишутся в zigzag_pivot, в состоянии остается
+        # только keep последних, необязательно
+        self.store = store
+        self.keep = keep
+
+    async def get_engine(self, symbol: str, timeframe: str) -> IncrementalZigZag:
+        key = (symbol, timeframe)
+        engine = self.engines.get(key)
+        if engine is None:
+            engine = await self._load_state(symbol, timeframe)
+            self.engines[key] = engine
+        return engine
+
+    async def update(
+        self, symbol: str, timeframe: str, ohlcv_data: List[List[float]]
+    ) -> bool:
+        """
+        применяет свечи формата ccxt [ts, open, high, low, close, volume]
+        и возвращает True, если изменились точки zigzag
+        """
+        if self.timeframes is not None and timeframe not in self.timeframes:
+            return False
+        engine = await self.get_engine(symbol, timeframe)
+        last_time = engine.last_time
+        changed = False
+
+        for data in ohlcv_data:
+            changed |= engine.update_values(
+                data[0], float(data[2]), float(data[3]), float(data[4])
+            )
+
+        # состояние сохраняем только когда закрылась свеча, а не на каждый тик
+        if last_time is None or (
+            engine.last_time is not None and engine.last_time > last_time
+        ):
+            await self._save_state(symbol, timeframe, engine)
+        return changed
+
+    async def behind(self, symbol: str, timeframe: str, ts: int) -> bool:
+        """
+        свеча ts старше последней учтенной: zigzag ее пропустит (точки идут
+        только вперед), и пару нужно пересобрать через rebuild
+        """
+        if self.timeframes is not None and timeframe not in self.timeframes:
+            return False
+        engine = await self.get_engine(symbol, timeframe)
+        return engine.last_time is not None and ts < engine.last_time
+
+    async def rebuild(self, symbol: str, timeframe: str) -> int:
+        """
+        пересчитывает zigzag пары по всей истории из БД (после догрузки
+        старых свечей): точки в zigzag_pivot и состояние движка.
+        возвращает число точек
+        """
+        engine, count = await sync_to_async(self.rebuild_sync)(symbol, timeframe)
+        self.engines[(symbol, timeframe)] = engine
+        return count
+
+    def rebuild_sync(
+        self, symbol: str, timeframe: str
+    ) -> Tuple[IncrementalZigZag, int]:
+        key = (symbol, timeframe)
+        series = PivotCache().build(symbol, timeframe, [self.deviation])[self.deviation]
+        times, prices = series.points()
+        # с таблицей точек в состоянии остаются только последние keep
+        first = max(len(series.times) - self.keep, 0) if self.store is not None else 0
+        engine = IncrementalZigZag.from_state(
+            {
+                "deviation": self.deviation,
+                "trend": series.trend,
+                "last_time": series.closed_time,
+                "pivots": [
+                    {"time": t, "price": p}
+                    for t, p in zip(
+                        series.times[first:].tolist(), series.prices[first:].tolist()
+                    )
+                ],
+                "prev_trend": series.trend,
+                "prev_count": 0,
+                "prev_last": None,
+            }
+        )
+        if series.forming is not None:
+            forming_time, high, low, close = series.forming
+            engine.update_values(forming_time, high, low, close)
+
+        with transaction.atomic():
+            self.synced_until[key] = None
+            if self.store is not None:
+                self.store.replace(symbol, timeframe, self.deviation, times, prices)
+                # окончательные точки уже в таблице
+                tail_start = engine.tail_start
+                if tail_start > 0:
+                    self.synced_until[key] = engine.pivots[tail_start - 1]["time"]
+            state = engine.to_state()
+            state["synced_until"] = self.synced_until[key]
+            ZigZagState.objects.update_or_create(
+                symbol=symbol,
+                timeframe=timeframe,
+                deviation=self.deviation,
+                defaults={"state": state},
+            )
+        return engine, len(times)
+
+    @sync_to_async
+    def _load_state(self, symbol: str, timeframe: str) -> IncrementalZigZag:
+        saved = ZigZagState.objects.filter(
+            symbol=symbol, timeframe=timeframe, deviation=self.deviation
+        ).first()
+        if saved is None:
+            return IncrementalZigZag(deviation=self.deviation)
+        self.synced_until[(symbol, timeframe)] = saved.state.get("synced_until")
+        logger.info(
+            f"Восстановлено состояние zigzag для {symbol} {timeframe}: {len(saved.state['pivots'])} точек"
+        )
+        return IncrementalZigZag.from_state(saved.state)
+
+    @sync_to_async
+    @transaction.atomic
+    def _save_state(
+        self, symbol: str, timeframe: str, engine: IncrementalZigZag
+    ) -> None:
+        key = (symbol, timeframe)
+        if self.store is not None:
+            # окончательные точки уже в таблице, переписываем только то,
+            # что могло измениться с прошлой записи
+            self.store.sync(
+                symbol,
+                timeframe,
+                self.deviation,
+                engine.pivots,
+                self.synced_until.get(key),
+            )
+            tail_start = engine.tail_start
+            if tail_start > 0:
+                self.synced_until[key] = engine.pivots[tail_start - 1]["time"]
+            engine.trim(self.keep)
+        state = engine.to_state()
+        state["synced_until"] = self.synced_until.get(key)
+        ZigZagState.objects.update_or_create(
+            symbol=symbol,
+            timeframe=timeframe,
+            deviation=self.deviation,
+            defaults={"state": state},
+        )
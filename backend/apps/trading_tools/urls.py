@@ -1,7 +1,17 @@
 # trading_tools/urls.py
 from django.urls import path
-from .views import ZigZagView
+from .views import PatternScanView, PivotRangeView, ZigZagView
 
 urlpatterns = [
     path("zigzag/", ZigZagView.as_view(), name="zigzag"),
+    path(
+        "pivots/<str:symbol_encoded>/<str:timeframe>/",
+        PivotRangeView.as_view(),
+        name="zigzag-pivots",
+    ),
+    path(
+        "patterns/<str:symbol_encoded>/<str:timeframe>/",
+        PatternScanView.as_view(),
+        name="zigzag-patterns",
+    ),
 ]
@@ -1,19 +1,114 @@
+from datetime import datetime, timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from apps.api.readers import iso_times
 from .indicators.zigzag import ZigZagCalculator
+from .indicators.zigzag_sweep import ZigZagSweep
 from .patterns.head_and_shoulders import HeadAndShouldersDetector
+from .patterns.scanner import PatternScanner
 from .strategies.simple_strategy import SimpleStrategy
+from .pivots import pivot_store
 
 
 class ZigZagView(APIView):
     def post(self, request):
         """
-        принимает ohlcv и возвращает точки zigzag
+        принимает ohlcv и возвращает точки zigzag.
+        если передан список deviations — возвращает точки для каждого отклонения
         """
         data = request.data.get("data")
         deviation = request.data.get("deviation", 0.01)
+        deviations = request.data.get("deviations")
+
+        # строка тоже итерируема — ее символы не должны стать отклонениями
+        try:
+            deviation = float(deviation)
+            if deviations and not isinstance(deviations, list):
+                raise TypeError
+            deviations = [float(d) for d in deviations or []]
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "deviation должен быть числом, deviations — списком чисел"},
+                status=400,
+            )
+
+        if deviations:
+            sweep = ZigZagSweep(deviations=deviations)
+            results = sweep.calculate(data)
+            return Response(
+                {"zigzag": {str(dev): points for dev, points in results.items()}}
+            )
 
         zigzag_calculator = ZigZagCalculator(deviation=deviation)
         zigzag_points = zigzag_calculator.calculate(data)
 
         return Response({"zigzag": zigzag_points})
+
+
+class PivotRangeView(APIView):
+    def get(self, request, symbol_encoded: str, timeframe: str):
+        """
+        сохраненные точки zigzag за период (start_date/end_date в ISO 8601)
+        вместе с последней точкой перед началом периода
+        """
+        symbol = symbol_encoded.replace("-", "/")
+        try:
+            deviation = float(request.query_params.get("deviation", 0.01))
+            bounds = []
+            for name in ("start_date", "end_date"):
+                value = request.query_params.get(name)
+                if value:
+                    moment = datetime.fromisoformat(value)
+                    if moment.tzinfo is None:
+                        moment = moment.replace(tzinfo=timezone.utc)
+                    value = int(moment.timestamp() * 1000)
+                bounds.append(value or None)
+        except ValueError:
+            return Response(
+                {"detail": "Неверный формат deviation или даты (ISO 8601)"},
+                status=400,
+            )
+
+        times, prices, directions = pivot_store.window(
+            symbol, timeframe, deviation, *bounds
+        )
+        return Response(
+            {
+                "pivots": [
+                    {"time": time, "price": price, "direction": direction}
+                    for time, price, direction in zip(
+                        iso_times(times).tolist(), prices.tolist(), directions.tolist()
+                    )
+                ]
+            }
+        )
+
+
+class PatternScanView(APIView):
+    def get(self, request, symbol_encoded: str, timeframe: str):
+        """
+        все паттерны по сохраненным точкам zigzag пары (или за период
+        start_date/end_date): имя паттерна, индексы точек и сами точки
+        """
+        symbol = symbol_encoded.replace("-", "/")
+        try:
+            deviation = float(request.query_params.get("deviation", 0.01))
+            bounds = []
+            for name in ("start_date", "end_date"):
+                value = request.query_params.get(name)
+                if value:
+                    moment = datetime.fromisoformat(value)
+                    if moment.tzinfo is None:
+                        moment = moment.replace(tzinfo=timezone.utc)
+                    value = int(moment.timestamp() * 1000)
+                bounds.append(value or None)
+        except ValueError:
+            return Response(
+                {"detail": "Неверный формат deviation или даты (ISO 8601)"},
+                status=400,
+            )
+
+        times, prices, _ = pivot_store.window(symbol, timeframe, deviation, *bounds)
+        return Response(
+            {"patterns": PatternScanner().matches(iso_times(times).tolist(), prices)}
+        )
@@ -1,6 +1,56 @@
 # apps/websocket/consumers.py
 import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+import numpy as np
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from ..api.cache import candle_cache
+from ..api.readers import CandleColumns
+from ..api.wire import KIND_SNAPSHOT, SUBPROTOCOL, encode_candles, encode_rows
+from ..trading_tools.indicators.zigzag_vectorized import VectorizedZigZagCalculator
+from .publisher import group_name
+
+# сколько последних свечей отдается при подписке
+SNAPSHOT_SIZE = 500
+ZIGZAG_DEVIATION = 0.01
+
+# точки zigzag последнего снимка по паре: пересчет только при новой свече
+# или изменении формирующейся, а не на каждого подписчика
+_zigzag_cache: Dict[Tuple[str, str], Tuple[tuple, List[Dict]]] = {}
+
+
+def parse_since(value) -> Optional[int]:
+    """since из сообщения subscribe: мс unix-времени или строка ISO 8601"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def snapshot_zigzag(symbol: str, timeframe: str, columns: CandleColumns) -> List[Dict]:
+    if not len(columns):
+        return []
+    version = (
+        len(columns),
+        int(columns.candle_time[0]),
+        int(columns.candle_time[-1]),
+        float(columns.high[-1]),
+        float(columns.low[-1]),
+    )
+    cached = _zigzag_cache.get((symbol, timeframe))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    zigzag = VectorizedZigZagCalculator(deviation=ZIGZAG_DEVIATION).calculate_arrays(
+        columns.iso_times(), columns.high, columns.low, columns.close
+    )
+    _zigzag_cache[(symbol, timeframe)] = (version, zigzag)
+    return zigzag
 
 
 class OHLCVConsumer(AsyncWebsocketConsumer):
@@ -15,7 +65,12 @@ class OHLCVConsumer(AsyncWebsocketConsumer):
 
         self.symbol = symbol
         self.timeframe = timeframe
-        self.room_group_name = f'ohlcv_{symbol.replace("/", "_")}_{timeframe}'
+        self.room_group_name = group_name(symbol, timeframe)
+        # бинарные кадры (apps.api.wire) по подпротоколу или ?format=binary
+        subprotocols = self.scope.get("subprotocols", [])
+        subprotocol = SUBPROTOCOL if SUBPROTOCOL in subprotocols else None
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.binary = subprotocol is not None or query.get("format") == ["binary"]
 
         print(
             f"Symbol param: {symbol_param}, Processed symbol: {symbol}, Timeframe: {timeframe}"
@@ -25,7 +80,7 @@ class OHLCVConsumer(AsyncWebsocketConsumer):
         try:
             # Присоединяемся к группе
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-            await self.accept()
+            await self.accept(subprotocol=subprotocol)
             print("=== WebSocket accepted! ===")
         except Exception as e:
             print(f"=== Connection error: {e} ===")
@@ -50,17 +105,50 @@ class OHLCVConsumer(AsyncWebsocketConsumer):
 
             if action == "subscribe":
                 print("=== Subscribe action received ===")
-                # Здесь можно вернуть последние данные из БД
-                await self.send(
-                    text_data=json.dumps(
-                        {"type": "initial_data", "candles": [], "zigzag": []}
+                try:
+                    since = parse_since(data.get("since"))
+                except (ValueError, OverflowError):
+                    # непонятный since — клиент получает полный снимок
+                    since = None
+                snapshot = await self.get_snapshot(since)
+                if self.binary:
+                    await self.send(bytes_data=snapshot)
+                else:
+                    await self.send(
+                        text_data=json.dumps({"type": "initial_data", **snapshot})
                     )
-                )
         except Exception as e:
             print(f"=== Receive error: {e} ===")
 
+    @database_sync_to_async
+    def get_snapshot(self, since: Optional[int] = None):
+        """
+        последние свечи и текущие точки zigzag из кеша свечей.
+        при переподключении с since отдаются только недостающие свечи;
+        since старше окна снимка — отдается снимок, дельта не больше него
+        """
+        columns = candle_cache.get_latest(self.symbol, self.timeframe, SNAPSHOT_SIZE)
+        zigzag = snapshot_zigzag(self.symbol, self.timeframe, columns)
+        candles, mode = columns, "snapshot"
+        if since is not None and len(columns) and since >= columns.candle_time[0]:
+            # свеча since у клиента могла быть еще не закрыта — отдается и она
+            candles = columns[int(np.searchsorted(columns.candle_time, since)) :]
+            mode = "delta"
+        if self.binary:
+            return encode_candles(
+                candles, KIND_SNAPSHOT, {"mode": mode, "zigzag": zigzag}
+            )
+        return {
+            "mode": mode,
+            "candles": candles.to_records(self.symbol, self.timeframe),
+            "zigzag": zigzag,
+        }
+
     async def ohlcv_update(self, event):
         try:
+            if self.binary and "data" in event:
+                await self.send(bytes_data=encode_rows([event["data"]]))
+                return
             await self.send(
                 text_data=json.dumps(
                     {"type": "candle_update", "candle": event["candle"]}
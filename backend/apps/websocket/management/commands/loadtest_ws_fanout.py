@@ -0,0 +1,134 @@
+import asyncio
+import statistics
+import time
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from apps.api import layout
+from apps.data_scrape.storage import DatabaseStorage
+from ...publisher import CandlePublisher, group_name
+
+SYMBOL, TIMEFRAME = "LOAD/TEST", "1m"
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест пути записи realtime-свечей: обновления идут через "
+        "DatabaseStorage.save_realtime_data, проверяются доставка всем "
+        "подписчикам и число запросов к БД на сброс буфера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--subscribers",
+            default="1,10,100,500",
+            help="числа подписчиков через запятую",
+        )
+        parser.add_argument("--updates", type=int, default=50)
+        parser.add_argument(
+            "--flush-every",
+            type=int,
+            default=10,
+            help="сброс буфера через N обновлений",
+        )
+
+    def handle(self, *args, **options):
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        self.stdout.write(
+            "подписчиков | обновлений | доставлено | p50 мс | p99 мс | "
+            "запросов вне сброса | запросов на сброс"
+        )
+        try:
+            # async_to_sync, а не asyncio.run: запись буфера (sync_to_async)
+            # идет в этом потоке, и счетчик запросов ее видит
+            with connection.execute_wrapper(count_queries):
+                for subscribers in options["subscribers"].split(","):
+                    self.run_round(
+                        int(subscribers),
+                        options["updates"],
+                        options["flush_every"],
+                        queries,
+                    )
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {layout.candle_table()} WHERE {layout.series_filter()}",
+                    [SYMBOL, TIMEFRAME],
+                )
+
+    def run_round(self, subscribers: int, updates: int, flush_every: int, queries):
+        delivered, latencies, outside, per_flush = async_to_sync(self.publish_round)(
+            subscribers, updates, flush_every, queries
+        )
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f"{subscribers:>11} | {updates:>10} | {delivered:>10} | "
+            f"{statistics.median(latencies) * 1000:>6.2f} | {p99 * 1000:>6.2f} | "
+            f"{outside:>19} | {','.join(map(str, sorted(set(per_flush))))}"
+        )
+        if delivered != subscribers * updates:
+            raise CommandError(
+                f"доставлено {delivered} из {subscribers * updates} обновлений"
+            )
+        if outside:
+            raise CommandError(f"{outside} запросов к БД вне сброса буфера")
+        if any(count != 1 for count in per_flush):
+            raise CommandError(f"запросов на сброс буфера: {per_flush}, ожидается 1")
+
+    async def publish_round(
+        self, subscribers: int, updates: int, flush_every: int, queries
+    ):
+        # буфер сбрасывается только явно: таймер не должен смешивать сбросы
+        storage = DatabaseStorage(
+            publisher=CandlePublisher(feed_cache=False), flush_interval=3600
+        )
+        layer = storage.publisher.channel_layer
+        group = group_name(SYMBOL, TIMEFRAME)
+        base = int(time.time() // 60) * 60_000 - updates * 60_000
+
+        # первый сброс регистрирует пару (ohlcv_series) — в замер не входит
+        warmup = [base - 60_000, 1.0, 1.0, 1.0, 1.0, 1.0]
+        await storage.save_realtime_data(SYMBOL, TIMEFRAME, [warmup])
+        await storage.write_buffer.flush()
+
+        channels = [await layer.new_channel() for _ in range(subscribers)]
+        for channel in channels:
+            await layer.group_add(group, channel)
+
+        sent_at = {}
+        latencies = []
+
+        async def subscriber(channel):
+            for _ in range(updates):
+                message = await layer.receive(channel)
+                ts = message["candle"]["candle_time"]
+                latencies.append(time.perf_counter() - sent_at[ts])
+
+        receivers = [asyncio.create_task(subscriber(c)) for c in channels]
+        queries.clear()
+        outside = 0
+        per_flush = []
+        for i in range(updates):
+            candle = [base + 60_000 * i, 1.0, 2.0, 0.5, 1.5, 10.0]
+            ts = time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime(candle[0] / 1000))
+            sent_at[ts] = time.perf_counter()
+            await storage.save_realtime_data(SYMBOL, TIMEFRAME, [candle])
+            await asyncio.sleep(0)
+            if (i + 1) % flush_every == 0 or i == updates - 1:
+                outside += len(queries)
+                queries.clear()
+                await storage.write_buffer.flush()
+                per_flush.append(len(queries))
+                queries.clear()
+
+        await asyncio.wait_for(asyncio.gather(*receivers), timeout=60)
+        await storage.close()
+        for channel in channels:
+            await layer.group_discard(group, channel)
+        return len(latencies), latencies, outside, per_flush
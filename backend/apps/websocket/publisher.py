@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import List
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from ..api.readers import format_candle
+
+logger = logging.getLogger(__name__)
+
+# группа веб-процессов, которые держат у себя кеш свечей (CandleCache)
+CACHE_GROUP = "ohlcv_cache"
+
+
+def group_name(symbol: str, timeframe: str) -> str:
+    """имя группы channels для пары; символ может прийти как BTC/USDT или BTC-USDT"""
+    return f"ohlcv_{symbol.replace('/', '_').replace('-', '_')}_{timeframe}"
+
+
+def shared_channel_layer() -> bool:
+    """channel layer общий для процессов (не InMemory): через него идет фид кеша"""
+    channel_layer = get_channel_layer()
+    return channel_layer is not None and not isinstance(
+        channel_layer, InMemoryChannelLayer
+    )
+
+
+class CandlePublisher:
+    """
+    рассылает обновления свечей подписчикам прямо из пути записи,
+    без опроса БД. процесс загрузки и веб-процессы должны делить
+    общий channel layer (Redis); InMemory работает только внутри процесса
+    """
+
+    def __init__(self, feed_cache: bool = True) -> None:
+        self.channel_layer = get_channel_layer()
+        # кеш веб-процессов обновляется через channel layer; в режиме
+        # shared memory процесс загрузки пишет в кеш сам
+        self.feed_cache = feed_cache
+
+    async def publish(
+        self, symbol: str, timeframe: str, ohlcv_data: List[List[float]]
+    ) -> None:
+        if self.channel_layer is None or not ohlcv_data:
+            return
+        group = group_name(symbol, timeframe)
+        try:
+            if self.feed_cache:
+                await self.channel_layer.group_send(
+                    CACHE_GROUP,
+                    {
+                        "type": "cache.update",
+                        "symbol": symbol,
+                        "timeframe": timeframe,
+                        "candles": [list(map(float, data)) for data in ohlcv_data],
+                    },
+                )
+            for data in ohlcv_data:
+                await self.channel_layer.group_send(
+                    group,
+                    {
+                        "type": "ohlcv_update",
+                        "candle": format_candle(symbol, timeframe, data),
+                        # сырые значения для бинарных подписчиков
+                        "data": list(map(float, data[:6])),
+                    },
+                )
+        except Exception as e:
+            # рассылка не должна ломать запись свечей
+            logger.error(f"Ошибка рассылки свечи {symbol} {timeframe}: {e}")
+
+
+class CandleCacheFeed:
+    """
+    фоновый поток веб-процесса: получает из channel layer обновления,
+    которые рассылает CandlePublisher, и применяет их к кешу свечей
+    """
+
+    def __init__(self, cache, refresh_interval: float = 60.0) -> None:
+        self.cache = cache
+        # членство в группе истекает (group_expiry), поэтому его продлеваем
+        self.refresh_interval = refresh_interval
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=asyncio.run, args=(self._run(),), daemon=True
+            )
+            self._thread.start()
+
+    async def _run(self) -> None:
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        while True:
+            try:
+                await self._listen(channel_layer)
+            except Exception as e:
+                logger.error(f"Ошибка получения обновлений кеша свечей: {e}")
+                await asyncio.sleep(1)
+
+    async def _listen(self, channel_layer) -> None:
+        channel = await channel_layer.new_channel()
+        joined = 0.0
+        while True:
+            if time.monotonic() - joined >= self.refresh_interval:
+                await channel_layer.group_add(CACHE_GROUP, channel)
+                joined = time.monotonic()
+            try:
+                message = await asyncio.wait_for(
+                    channel_layer.receive(channel), timeout=self.refresh_interval
+                )
+            except asyncio.TimeoutError:
+                continue
+            self.cache.update(message["symbol"], message["timeframe"], message["candles"])
@@ -1,3 +1,122 @@
-from django.test import TestCase
+from unittest import mock
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+from apps.api.cache import CandleCache
+from apps.api.management.commands.bench_wire_format import generate_columns
+from apps.api.wire import KIND_SNAPSHOT, SUBPROTOCOL, decode_candles, decode_rows
+from apps.trading_tools.indicators.zigzag_vectorized import VectorizedZigZagCalculator
+from . import consumers
+from .publisher import CandlePublisher
+from .routing import websocket_urlpatterns
 
-# Create your tests here.
+SYMBOL, TIMEFRAME = "BTC/USDT", "1m"
+URL = "/ws/ohlcv/BTC-USDT/1m/"
+
+
+def ccxt_rows(columns):
+    return [
+        list(row)
+        for row in zip(
+            columns.candle_time.tolist(),
+            columns.open.tolist(),
+            columns.high.tolist(),
+            columns.low.tolist(),
+            columns.close.tolist(),
+            columns.volume.tolist(),
+        )
+    ]
+
+
+class ParseSinceTests(SimpleTestCase):
+    def test_formats(self):
+        self.assertIsNone(consumers.parse_since(None))
+        self.assertEqual(consumers.parse_since(1_700_000_000_000), 1_700_000_000_000)
+        for value in ("2023-11-14T22:13:20Z", "2023-11-14T22:13:20"):
+            self.assertEqual(consumers.parse_since(value), 1_700_000_000_000)
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class BinaryConsumerTests(SimpleTestCase):
+    def setUp(self):
+        # снимок читается из кеша свечей: буфер заполнен, в БД не ходим
+        self.columns = generate_columns(800)
+        cache = CandleCache(capacity=600)
+        cache.update(SYMBOL, TIMEFRAME, ccxt_rows(self.columns))
+        patcher = mock.patch.object(consumers, "candle_cache", cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        consumers._zigzag_cache.clear()
+
+    async def connect(self, url=URL, subprotocols=(SUBPROTOCOL,)):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), url, subprotocols=list(subprotocols)
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, subprotocols[0] if subprotocols else None)
+        return communicator
+
+    async def test_snapshot_frame(self):
+        communicator = await self.connect()
+        await communicator.send_json_to({"action": "subscribe"})
+        kind, columns, meta = decode_candles(await communicator.receive_from())
+        await communicator.disconnect()
+
+        expected = self.columns[-consumers.SNAPSHOT_SIZE :]
+        self.assertEqual(kind, KIND_SNAPSHOT)
+        self.assertEqual(meta["mode"], "snapshot")
+        self.assertEqual(columns.candle_time.tolist(), expected.candle_time.tolist())
+        self.assertEqual(columns.close.tolist(), expected.close.tolist())
+        calculator = VectorizedZigZagCalculator(deviation=consumers.ZIGZAG_DEVIATION)
+        zigzag = calculator.calculate_arrays(
+            expected.iso_times(), expected.high, expected.low, expected.close
+        )
+        self.assertEqual(meta["zigzag"], zigzag)
+
+    async def test_delta_frame(self):
+        communicator = await self.connect()
+        since = int(self.columns.candle_time[-10])
+        await communicator.send_json_to({"action": "subscribe", "since": since})
+        _, columns, meta = decode_candles(await communicator.receive_from())
+        await communicator.disconnect()
+
+        self.assertEqual(meta["mode"], "delta")
+        self.assertEqual(
+            columns.candle_time.tolist(), self.columns.candle_time[-10:].tolist()
+        )
+
+    async def test_since_falls_back_to_snapshot(self):
+        # since старше окна снимка и непонятный since — полный снимок
+        older = int(self.columns.candle_time[-consumers.SNAPSHOT_SIZE - 1])
+        for since in (older, "not a date", float("nan")):
+            communicator = await self.connect()
+            await communicator.send_json_to({"action": "subscribe", "since": since})
+            _, columns, meta = decode_candles(await communicator.receive_from())
+            await communicator.disconnect()
+            self.assertEqual(meta["mode"], "snapshot")
+            self.assertEqual(len(columns), consumers.SNAPSHOT_SIZE)
+
+    async def test_binary_query_parameter(self):
+        for query, binary in (("format=binary", True), ("format=binary2", False)):
+            communicator = await self.connect(f"{URL}?{query}", subprotocols=())
+            await communicator.send_json_to({"action": "subscribe"})
+            if binary:
+                kind, _, _ = decode_candles(await communicator.receive_from())
+                self.assertEqual(kind, KIND_SNAPSHOT)
+            else:
+                self.assertEqual(
+                    (await communicator.receive_json_from())["type"], "initial_data"
+                )
+            await communicator.disconnect()
+
+    async def test_update_frame(self):
+        communicator = await self.connect()
+        candle = [1_700_000_000_000, 1.5, 2.0, 1.0, 1.75, 10.0]
+        # обновление идет тем же путем, что из записи свечей
+        await CandlePublisher(feed_cache=False).publish(SYMBOL, TIMEFRAME, [candle])
+        _, rows = decode_rows(await communicator.receive_from())
+        await communicator.disconnect()
+        self.assertEqual(rows, [candle])
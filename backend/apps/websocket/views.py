@@ -1,5 +1,6 @@
-from ..api.serializers import OHLCVSerializer
-from ..api.models import OHLCV
+from ..api.cache import candle_cache
+from ..api.readers import CANDLE_FIELDS
+from .publisher import group_name
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.http import JsonResponse
@@ -13,10 +14,14 @@ class OHLCVBroadcaster:
     def __init__(self):
         self.channel_layer = get_channel_layer()
 
-    def broadcast_candle(self, symbol: str, timeframe: str, candle_data: dict):
-        group_name = f"ohlcv_{symbol}_{timeframe}"
+    def broadcast_candle(
+        self, symbol: str, timeframe: str, candle_data: dict, data=None
+    ):
+        event = {"type": "ohlcv_update", "candle": candle_data}
+        if data is not None:
+            event["data"] = data
         async_to_sync(self.channel_layer.group_send)(
-            group_name, {"type": "ohlcv_update", "candle": candle_data}
+            group_name(symbol, timeframe), event
         )
 
 
@@ -27,19 +32,17 @@ class OHLCVTriggerView(View):
     def post(self, request, symbol, timeframe):
         """Ручной триггер обновления через POST запрос"""
 
-        candle = (
-            OHLCV.objects.filter(symbol=symbol, timeframe=timeframe)
-            .order_by("-candle_time")
-            .first()
-        )
+        columns = candle_cache.get_latest(symbol, timeframe, 1)
 
-        if not candle:
+        if not len(columns):
             return JsonResponse({"error": "Candle not found"}, status=404)
 
-        # Сериализация
-        serializer = OHLCVSerializer(candle)
-
         # Отправка через сервис
-        self.broadcaster.broadcast_candle(symbol, timeframe, serializer.data)
+        self.broadcaster.broadcast_candle(
+            symbol,
+            timeframe,
+            columns.to_records(symbol, timeframe)[0],
+            data=[float(getattr(columns, name)[0]) for name, _ in CANDLE_FIELDS],
+        )
 
         return JsonResponse({"status": "updated", "symbol": symbol})
@@ -9,6 +9,13 @@ django.setup()
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from apps.websocket.routing import websocket_urlpatterns
+from apps.websocket.publisher import CandleCacheFeed, shared_channel_layer
+from apps.api.cache import candle_cache
+
+if not candle_cache.shared_memory and shared_channel_layer():
+    # без shared memory кеш свечей процесса обновляется через channel layer.
+    # InMemory layer не связан с процессом загрузки: фиду нечего получать
+    CandleCacheFeed(candle_cache).start()
 
 application = ProtocolTypeRouter(
     {
@@ -190,3 +190,35 @@ else:
             },
         },
     }
+
+# кеш последних свечей (apps.api.cache): SHARED_MEMORY=True, когда веб-процессы
+# и процесс загрузки работают на одной машине — тогда кеш пишет процесс загрузки
+CANDLE_CACHE = {
+    "CAPACITY": 1000,
+    "SHARED_MEMORY": False,
+    "STALE_AFTER": 60.0,
+}
+
+# таймфреймы, загружаемые с биржи; остальные интервалы собираются
+# из них на лету (apps.trading_tools.resample)
+CANDLE_TIMEFRAMES = ["1h", "15m"]
+
+# раскладка таблицы свечей (apps.api.layout): COMPACT=True — ohlcv_compact с ценами
+# float8, словарем пар ohlcv_series и одним первичным ключом. перед включением
+# история переносится manage.py migrate_ohlcv_compact; агрегаты есть только у ohlcv
+CANDLE_STORAGE = {
+    "COMPACT": False,
+}
+
+# локальный архив закрытых свечей в memory-mapped файлах (apps.api.archive),
+# дописывается manage.py sync_candle_archive
+CANDLE_ARCHIVE = {
+    "PATH": BASE_DIR / "candle_archive",
+}
+
+# старшие таймфреймы из continuous aggregates (apps.api.aggregates): при
+# ENABLED=True 5m/15m/1h/4h/1d читаются из агрегатов по 1m, а
+# run_data_processor --derive загружает с биржи только 1m
+CANDLE_AGGREGATES = {
+    "ENABLED": False,
+}